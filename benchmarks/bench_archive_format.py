@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方归档基准测试 - 对比 JSON（indent=2）、NDJSON.gz 与二进制归档的文件大小、导出耗时、完整加载耗时和单个配方读取耗时
+
+用法: python benchmarks/bench_archive_format.py [--recipes 20000] [--compositions 20] [--lookups 200]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.database_manager import DatabaseManager
+from database.migrations import MigrationEngine
+from utils.data_import_export import DataImportExport
+from utils.recipe_archive import RecipeArchive
+
+
+def populate(db_path: str, recipe_count: int, compositions_per_recipe: int,
+             material_count: int = 500) -> None:
+    """生成测试数据（每个配方两条版本历史）"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    MigrationEngine().migrate(conn)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO materials (id, name, category, price_per_ml, density) VALUES (?, ?, ?, ?, ?)',
+        [(i, f'材料_{i}', '果香', round(rng.uniform(0.1, 5.0), 2), 1.0) for i in range(1, material_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipes (id, name, total_volume_ml, pg_ratio, vg_ratio, designer_name) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [(i, f'配方_{i}', 30.0, 50.0, 50.0, '设计师') for i in range(1, recipe_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipe_compositions (recipe_id, material_id, percentage, weight_grams) VALUES (?, ?, ?, ?)',
+        ((recipe_id, material_id, round(100.0 / compositions_per_recipe, 2),
+          round(30.0 / compositions_per_recipe, 2))
+         for recipe_id in range(1, recipe_count + 1)
+         for material_id in rng.sample(range(1, material_count + 1), compositions_per_recipe))
+    )
+    conn.executemany(
+        'INSERT INTO version_history (recipe_id, version, change_type, change_description, created_by) '
+        'VALUES (?, ?, ?, ?, ?)',
+        ((recipe_id, version, 'updated', '调整比例', '设计师')
+         for recipe_id in range(1, recipe_count + 1) for version in (1, 2))
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def export_json(db_manager: DatabaseManager, file_path: str) -> None:
+    """与 export_recipe_to_json 相同的编码（indent=2, ensure_ascii=False），全部配方写在一个文件中"""
+    importer = DataImportExport()
+    recipes = list(importer._attach_version_history(db_manager, db_manager.iter_recipe_dicts(), 1000))
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'metadata': {'format_version': '1.0'}, 'recipes': recipes}, f, indent=2, ensure_ascii=False)
+
+
+def load_json(file_path: str) -> int:
+    """完整加载 JSON"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return len(json.load(f)['recipes'])
+
+
+def load_ndjson(file_path: str) -> int:
+    """完整加载 NDJSON.gz（跳过元数据行）"""
+    with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+        f.readline()
+        return sum(1 for line in f if json.loads(line))
+
+
+def load_archive(file_path: str) -> int:
+    """完整加载归档"""
+    with RecipeArchive(file_path) as archive:
+        return sum(1 for _ in archive.iter_recipes())
+
+
+def lookup_json(file_path: str, recipe_ids: list) -> None:
+    """JSON 没有索引，读取单个配方需要解析整个文件"""
+    for recipe_id in recipe_ids:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            next(recipe for recipe in json.load(f)['recipes'] if recipe['id'] == recipe_id)
+
+
+def lookup_archive(file_path: str, recipe_ids: list) -> None:
+    """每次读取都重新打开归档（只读索引和一个块）"""
+    for recipe_id in recipe_ids:
+        with RecipeArchive(file_path) as archive:
+            archive.get(recipe_id)
+
+
+def timed(func, *args) -> float:
+    """执行并返回耗时(秒)"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='配方归档格式基准测试')
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument('--compositions', type=int, default=20)
+    parser.add_argument('--lookups', type=int, default=200, help='随机读取单个配方的次数')
+    parser.add_argument('--block-size', type=int, default=256)
+    args = parser.parse_args()
+    
+    importer = DataImportExport()
+    rng = random.Random(7)
+    lookup_ids = [rng.randint(1, args.recipes) for _ in range(args.lookups)]
+    # JSON 每次读取都要解析整个文件，只测少量次数
+    json_lookup_ids = lookup_ids[:max(1, min(5, args.lookups))]
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        populate(db_path, args.recipes, args.compositions)
+        db_manager = DatabaseManager(db_path, read_only=True)
+        paths = {
+            'json': os.path.join(tmp_dir, 'library.json'),
+            'ndjson.gz': os.path.join(tmp_dir, 'library.ndjson.gz'),
+            'archive': os.path.join(tmp_dir, 'library.fsa')
+        }
+        
+        export_time = {
+            'json': timed(export_json, db_manager, paths['json']),
+            'ndjson.gz': timed(importer.export_library_to_ndjson, db_manager, paths['ndjson.gz']),
+            'archive': timed(importer.export_library_to_archive, db_manager, paths['archive'],
+                             True, args.block_size)
+        }
+        load_time = {
+            'json': timed(load_json, paths['json']),
+            'ndjson.gz': timed(load_ndjson, paths['ndjson.gz']),
+            'archive': timed(load_archive, paths['archive'])
+        }
+        lookup_time = {
+            'json': timed(lookup_json, paths['json'], json_lookup_ids) / len(json_lookup_ids),
+            'archive': timed(lookup_archive, paths['archive'], lookup_ids) / len(lookup_ids)
+        }
+        sizes = {name: os.path.getsize(path) / 1024 / 1024 for name, path in paths.items()}
+        with RecipeArchive(paths['archive']) as archive:
+            codec = f"{archive.metadata['codec']}/{archive.metadata['serializer']}"
+        db_manager.close()
+    
+    print(f"数据规模: {args.recipes} 配方 × {args.compositions} 组成，每个配方 2 条版本历史；归档: {codec}")
+    print(f"{'格式':<12}{'大小(MB)':>10}{'导出(s)':>10}{'完整加载(s)':>14}{'单个读取(ms)':>14}")
+    for name in paths:
+        lookup = f"{lookup_time[name] * 1000:>14.2f}" if name in lookup_time else f"{'-':>14}"
+        print(f"{name:<12}{sizes[name]:>10.2f}{export_time[name]:>10.2f}{load_time[name]:>14.2f}{lookup}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excel导出基准测试 - 对比 pandas DataFrame 导出与游标流式导出在 100 万行配方组成下的耗时和峰值内存
+
+每种导出方式在单独的子进程中运行，峰值内存取子进程的 ru_maxrss
+
+用法: python benchmarks/bench_excel_export.py [--recipes 50000] [--compositions 20] [--sidecar csv]
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrations import MigrationEngine
+
+
+def populate(db_path: str, recipe_count: int, compositions_per_recipe: int,
+             material_count: int = 500) -> None:
+    """生成测试数据"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    MigrationEngine().migrate(conn)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO materials (id, name, category, price_per_ml) VALUES (?, ?, ?, ?)',
+        [(i, f'material_{i}', 'flavor', rng.uniform(0.1, 5.0)) for i in range(1, material_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipes (id, name, total_volume_ml, designer_name) VALUES (?, ?, ?, ?)',
+        [(i, f'recipe_{i}', 30.0, 'bench') for i in range(1, recipe_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipe_compositions (recipe_id, material_id, percentage, weight_grams) '
+        'VALUES (?, ?, ?, ?)',
+        ((recipe_id, material_id, 100.0 / compositions_per_recipe, 30.0 / compositions_per_recipe)
+         for recipe_id in range(1, recipe_count + 1)
+         for material_id in rng.sample(range(1, material_count + 1), compositions_per_recipe))
+    )
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def export_pandas(db_path: str, file_path: str) -> int:
+    """原导出方式：读出全部配方字典，构建 DataFrame 后用 openpyxl 写出"""
+    import pandas as pd
+    from database.database_manager import DatabaseManager
+    from utils.data_import_export import COMPOSITION_HEADERS, RECIPE_EXPORT_FIELDS, RECIPE_HEADERS
+    
+    db_manager = DatabaseManager(db_path, read_only=True)
+    recipe_rows = []
+    composition_rows = []
+    for recipe in db_manager.iter_recipe_dicts():
+        recipe_rows.append(dict(zip(RECIPE_HEADERS, (recipe.get(field) for field in RECIPE_EXPORT_FIELDS))))
+        for comp in recipe.get('compositions', []):
+            composition_rows.append(dict(zip(COMPOSITION_HEADERS, (
+                recipe.get('id'), recipe.get('name'), comp.get('material_id'), comp.get('material_name', ''),
+                comp.get('percentage', 0.0), comp.get('weight_grams', 0.0)
+            ))))
+    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+        pd.DataFrame(recipe_rows).to_excel(writer, sheet_name='配方列表', index=False)
+        pd.DataFrame(composition_rows).to_excel(writer, sheet_name='配方组成', index=False)
+    db_manager.close()
+    return len(recipe_rows) + len(composition_rows)
+
+
+def export_streaming(db_path: str, file_path: str, engine: str, sidecar: str) -> int:
+    """流式导出：数据库游标逐行写入只写工作簿"""
+    from database.database_manager import DatabaseManager
+    from utils.data_import_export import DataImportExport
+    
+    db_manager = DatabaseManager(db_path, read_only=True)
+    stats = DataImportExport().export_library_to_excel(db_manager, file_path, sidecar=sidecar or None,
+                                                       engine=engine)
+    db_manager.close()
+    if stats is None:
+        raise RuntimeError('流式导出失败')
+    return stats['recipes'] + stats['compositions']
+
+
+def run_child(args: argparse.Namespace) -> None:
+    """子进程：执行一种导出方式并以 JSON 输出结果"""
+    start = time.perf_counter()
+    if args.child == 'pandas':
+        rows = export_pandas(args.db, args.output)
+    else:
+        rows = export_streaming(args.db, args.output, args.engine, args.sidecar)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'rows': rows,
+        'seconds': elapsed,
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'size_mb': os.path.getsize(args.output) / 1024 / 1024
+    }))
+
+
+def measure(mode: str, db_path: str, output: str, args: argparse.Namespace) -> dict:
+    """在子进程中运行一种导出方式"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', mode, '--db', db_path,
+               '--output', output, '--engine', args.engine, '--sidecar', args.sidecar]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Excel导出基准测试')
+    parser.add_argument('--recipes', type=int, default=50000)
+    parser.add_argument('--compositions', type=int, default=20)
+    parser.add_argument('--engine', default='auto', choices=['auto', 'openpyxl', 'xlsxwriter'])
+    parser.add_argument('--sidecar', default='', choices=['', 'csv', 'parquet'])
+    parser.add_argument('--skip-pandas', action='store_true', help='不运行 pandas 导出（数据量很大时较慢）')
+    parser.add_argument('--child', choices=['pandas', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        run_child(args)
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        start = time.perf_counter()
+        populate(db_path, args.recipes, args.compositions)
+        print(f"数据规模: {args.recipes} 配方 × {args.compositions} 组成 = "
+              f"{args.recipes * args.compositions} 行组成 (生成 {time.perf_counter() - start:.1f}s)")
+        
+        modes = ['streaming'] if args.skip_pandas else ['pandas', 'streaming']
+        print(f"{'导出方式':<12}{'耗时(s)':>10}{'行/秒':>12}{'峰值内存(MB)':>14}{'文件(MB)':>10}")
+        for mode in modes:
+            result = measure(mode, db_path, os.path.join(tmp_dir, f'{mode}.xlsx'), args)
+            print(f"{mode:<12}{result['seconds']:>10.1f}{result['rows'] / result['seconds']:>12.0f}"
+                  f"{result['peak_mb']:>14.1f}{result['size_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
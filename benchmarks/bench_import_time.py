@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时基准测试 - 在全新解释器中逐个导入模块，统计 -X importtime 的累计耗时，
+并检查导入过程没有创建数据库或读写配置文件
+
+用法: python benchmarks/bench_import_time.py [--max-ms 150]
+超过阈值或导入时产生了文件时以非零状态退出，可作为启动延迟的回归检查
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 无界面脚本使用的模块
+HEADLESS_MODULES = [
+    'config.project_config',
+    'database.migrations',
+    'database.database_manager',
+    'models.recipe',
+    'services.recipe_analyzer',
+    'utils.data_import_export'
+]
+
+# 应用入口（依赖 PyQt6，未安装时跳过）
+APP_MODULES = ['main']
+
+IMPORTTIME_PATTERN = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\S+)')
+
+
+def measure(module: str, repeat: int) -> dict:
+    """在临时工作目录中导入模块，返回最小累计耗时及导入后产生的文件"""
+    best_us = None
+    created_files = []
+    error = None
+    
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as work_dir:
+            env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, PYTHONDONTWRITEBYTECODE='1')
+            proc = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                cwd=work_dir, env=env, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else '导入失败'
+                break
+            
+            for line in proc.stderr.splitlines():
+                match = IMPORTTIME_PATTERN.match(line)
+                if match and match.group(3) == module:
+                    cumulative = int(match.group(2))
+                    best_us = cumulative if best_us is None else min(best_us, cumulative)
+            
+            for root, _, files in os.walk(work_dir):
+                created_files.extend(os.path.relpath(os.path.join(root, name), work_dir)
+                                     for name in files)
+    
+    return {'module': module, 'us': best_us, 'created_files': created_files, 'error': error}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='模块导入耗时基准测试')
+    parser.add_argument('--max-ms', type=float, default=150.0,
+                        help='无界面模块的导入耗时上限(毫秒)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--with-app', action='store_true', help='同时测量应用入口模块')
+    args = parser.parse_args()
+    
+    modules = HEADLESS_MODULES + (APP_MODULES if args.with_app else [])
+    failed = False
+    
+    print(f"{'模块':<32}{'耗时(ms)':>10}  结果")
+    for module in modules:
+        result = measure(module, args.repeat)
+        if result['error']:
+            print(f"{module:<32}{'-':>10}  跳过: {result['error']}")
+            continue
+        
+        elapsed_ms = result['us'] / 1000
+        status = 'OK'
+        if module in HEADLESS_MODULES and elapsed_ms > args.max_ms:
+            status = f'超过上限 {args.max_ms:.0f}ms'
+            failed = True
+        if result['created_files']:
+            status = f"导入时创建了文件: {', '.join(sorted(set(result['created_files'])))}"
+            failed = True
+        print(f"{module:<32}{elapsed_ms:>10.1f}  {status}")
+    
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内存基准测试 - 比较 10 万条组成在三种表示下的内存占用：
+字典行（旧的数据传递方式）、RecipeComposition 数据类对象、列式 CompositionTable
+
+用法: python benchmarks/bench_model_memory.py [--rows 100000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.recipe import Recipe, RecipeComposition, Material, DATACLASS_OPTIONS
+from models.composition_table import CompositionTable
+
+
+COMPOSITIONS_PER_RECIPE = 30
+
+
+def generate_rows(row_count: int, material_count: int = 200):
+    """生成 (recipe_id, material_id, percentage, weight_grams) 测试行"""
+    rng = random.Random(42)
+    return [
+        (i // COMPOSITIONS_PER_RECIPE + 1, rng.randint(1, material_count),
+         round(rng.uniform(0.1, 10.0), 3), round(rng.uniform(0.1, 5.0), 3))
+        for i in range(row_count)
+    ]
+
+
+def measure(label: str, build):
+    """测量构建结果在内存中的净占用"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<36}{current / 1024 / 1024:>10.2f} MB{peak / 1024 / 1024:>12.2f} MB")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='配方模型内存基准测试')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+    
+    rows = generate_rows(args.rows)
+    materials = {i: Material(id=i, name=f'material_{i}', category='flavor', price_per_ml=1.0)
+                 for i in range(1, 201)}
+    created_at = datetime.now()
+    
+    print(f"组成行数: {args.rows}，数据类 slots: {bool(DATACLASS_OPTIONS.get('slots'))}")
+    print(f"{'表示':<36}{'占用':>13}{'峰值':>15}")
+    
+    def build_dicts():
+        return [
+            {'recipe_id': r, 'material_id': m, 'percentage': p, 'weight_grams': w,
+             'created_at': created_at.isoformat(), 'material_name': materials[m].name,
+             'price_per_ml': materials[m].price_per_ml}
+            for r, m, p, w in rows
+        ]
+    
+    def build_recipes():
+        recipes = {}
+        for i, (r, m, p, w) in enumerate(rows):
+            recipe = recipes.get(r)
+            if recipe is None:
+                recipe = recipes[r] = Recipe(id=r, name=f'recipe_{r}', created_at=created_at)
+            recipe.compositions.append(RecipeComposition(
+                id=i + 1, recipe_id=r, material_id=m, percentage=p, weight_grams=w,
+                created_at=created_at, material=materials[m]
+            ))
+        return recipes
+    
+    measure('字典行', build_dicts)
+    recipes = measure('Recipe / RecipeComposition 对象', build_recipes)
+    table = measure('CompositionTable (NumPy 列式)', lambda: CompositionTable.from_rows(rows))
+    
+    print(f"CompositionTable 数组本身: {table.nbytes / 1024 / 1024:.2f} MB，"
+          f"{len(table)} 个配方 / {table.row_count} 行")
+    assert table.row_count == sum(len(r.compositions) for r in recipes.values())
+
+
+if __name__ == '__main__':
+    main()
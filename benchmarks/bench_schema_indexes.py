@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引基准测试 - 对比 v1（无索引）与最新表结构在 10k 配方 × 30 组成下的查询延迟
+
+用法: python benchmarks/bench_schema_indexes.py [--recipes 10000] [--compositions 30]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.migrations import MigrationEngine
+
+
+QUERIES = {
+    '加载配方组成': (
+        'SELECT material_id, percentage, weight_grams FROM recipe_compositions WHERE recipe_id = ?',
+        'recipe_id'
+    ),
+    '查找子版本': ('SELECT id, version FROM recipes WHERE parent_recipe_id = ?', 'recipe_id'),
+    '版本历史': ('SELECT * FROM version_history WHERE recipe_id = ? ORDER BY version', 'recipe_id'),
+    '按名称查找': ('SELECT id FROM recipes WHERE name = ?', 'name'),
+    '使用某材料的配方': (
+        'SELECT recipe_id, percentage FROM recipe_compositions WHERE material_id = ?',
+        'material_id'
+    )
+}
+
+
+def populate(conn: sqlite3.Connection, recipe_count: int, compositions_per_recipe: int,
+             material_count: int = 200) -> None:
+    """生成测试数据"""
+    rng = random.Random(42)
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO materials (id, name, category, price_per_ml) VALUES (?, ?, ?, ?)',
+        [(i, f'material_{i}', 'flavor', rng.uniform(0.1, 5.0)) for i in range(1, material_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipes (id, name, version, parent_recipe_id, total_volume_ml) VALUES (?, ?, ?, ?, ?)',
+        [(i, f'recipe_{i // 3}', i % 3 + 1, (i - 1) if i % 3 else None, 30.0)
+         for i in range(1, recipe_count + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO recipe_compositions (recipe_id, material_id, percentage) VALUES (?, ?, ?)',
+        ((recipe_id, material_id, 100.0 / compositions_per_recipe)
+         for recipe_id in range(1, recipe_count + 1)
+         for material_id in rng.sample(range(1, material_count + 1), compositions_per_recipe))
+    )
+    conn.executemany(
+        'INSERT INTO version_history (recipe_id, version, change_type) VALUES (?, ?, ?)',
+        ((recipe_id, version, 'updated')
+         for recipe_id in range(1, recipe_count + 1) for version in (1, 2))
+    )
+    conn.execute('COMMIT')
+
+
+def run_queries(conn: sqlite3.Connection, recipe_count: int, iterations: int) -> dict:
+    """执行各类查询，返回平均延迟(毫秒)"""
+    rng = random.Random(7)
+    params = {
+        'recipe_id': lambda: (rng.randint(1, recipe_count),),
+        'name': lambda: (f'recipe_{rng.randint(0, recipe_count // 3)}',),
+        'material_id': lambda: (rng.randint(1, 200),)
+    }
+    results = {}
+    for label, (query, param_kind) in QUERIES.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            conn.execute(query, params[param_kind]()).fetchall()
+        results[label] = (time.perf_counter() - start) / iterations * 1000
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='表结构索引基准测试')
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--compositions', type=int, default=30)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    
+    engine = MigrationEngine()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(os.path.join(tmp_dir, 'bench.db'), isolation_level=None)
+        engine.migrate(conn, target_version=1)
+        populate(conn, args.recipes, args.compositions)
+        
+        before = run_queries(conn, args.recipes, args.iterations)
+        start = time.perf_counter()
+        engine.migrate(conn)
+        migrate_time = time.perf_counter() - start
+        after = run_queries(conn, args.recipes, args.iterations)
+        conn.close()
+    
+    print(f"数据规模: {args.recipes} 配方 × {args.compositions} 组成")
+    print(f"迁移到 v{engine.latest_version} 耗时: {migrate_time:.2f}s")
+    print(f"{'查询':<12}{'v1 (ms)':>12}{'v' + str(engine.latest_version) + ' (ms)':>12}{'加速':>10}")
+    for label in QUERIES:
+        speedup = before[label] / after[label] if after[label] > 0 else float('inf')
+        print(f"{label:<12}{before[label]:>12.3f}{after[label]:>12.3f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,14 @@
 
 import json
 import os
+import threading
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 
+# 配置文件中的值整体替换默认值而不是逐键合并的配置项，用于删除默认关键词
+REPLACED_CONFIG_KEYS = ('analysis/flavor_keywords', 'analysis/persistence_keywords')
+
 class ProjectConfig:
     """项目配置管理类"""
     
@@ -24,7 +28,13 @@ class ProjectConfig:
             'database': {
                 'path': 'database/db_files/flavor_lab.db',
                 'backup_interval': 3600,  # 1小时
-                'max_backups': 10
+                'max_backups': 10,
+                'max_readers': 8,  # 读连接上限
+                'statement_cache_size': 256,  # 每个连接缓存的预编译语句数
+                'pragma_profile': 'balanced',  # legacy/safe/balanced/performance
+                'pragmas': {},  # 覆盖配置档中的单项PRAGMA
+                'checkpoint_interval': 300,  # WAL检查点间隔(秒)，0表示关闭
+                'checkpoint_mode': 'PASSIVE'
             },
             'ui': {
                 'stylesheet_enabled': True,
@@ -46,7 +56,33 @@ class ProjectConfig:
             'analysis': {
                 'cost_calculation_enabled': True,
                 'flavor_balance_analysis': True,
-                'persistence_prediction': True
+                'persistence_prediction': True,
+                # 成本计算的基准货币，以及 1 单位外币折合多少基准货币
+                'currency': 'CNY',
+                'exchange_rates': {
+                    'CNY': 1.0
+                },
+                # 关键词 → 香调分类（top/middle/base/other），材料名称同时包含多个关键词时靠前的优先；
+                # 配置文件中的关键词表整体替换默认表，删除的关键词不会被默认值补回
+                'flavor_keywords': {
+                    'citrus': 'top',
+                    'fruit': 'top',
+                    'berry': 'top',
+                    'mint': 'top',
+                    'floral': 'middle',
+                    'spice': 'middle',
+                    'nut': 'middle',
+                    'cream': 'middle',
+                    'tobacco': 'base',
+                    'vanilla': 'base',
+                    'caramel': 'base',
+                    'chocolate': 'base'
+                },
+                # 增加(base)或降低(top)持久性的关键词，同样整体替换
+                'persistence_keywords': {
+                    'base': ['tobacco', 'vanilla', 'caramel', 'chocolate'],
+                    'top': ['citrus', 'mint']
+                }
             }
         }
     
@@ -62,11 +98,13 @@ class ProjectConfig:
                 pass  # 使用默认配置
     
     def _merge_configs(self, new_config: Dict[str, Any]) -> None:
-        """合并配置"""
-        def merge_dicts(base: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+        """合并配置（字典逐键合并，只能增加或修改键；REPLACED_CONFIG_KEYS 中的配置项整体替换）"""
+        def merge_dicts(base: Dict[str, Any], update: Dict[str, Any], prefix: str = '') -> Dict[str, Any]:
             for key, value in update.items():
-                if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                    base[key] = merge_dicts(base[key], value)
+                path = f"{prefix}{key}"
+                if key in base and isinstance(base[key], dict) and isinstance(value, dict) \
+                        and path not in REPLACED_CONFIG_KEYS:
+                    base[key] = merge_dicts(base[key], value, f"{path}/")
                 else:
                     base[key] = value
             return base
@@ -111,5 +149,23 @@ class ProjectConfig:
             pass  # 忽略保存错误
 
 
-# 全局配置实例
-config = ProjectConfig()
\ No newline at end of file
+# 全局配置实例，首次使用时才读取配置文件
+_config: Optional[ProjectConfig] = None
+_config_lock = threading.Lock()
+
+
+def get_config() -> ProjectConfig:
+    """获取全局配置实例"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = ProjectConfig()
+    return _config
+
+
+def __getattr__(name: str) -> Any:
+    """兼容 from config.project_config import config 的旧用法"""
+    if name == 'config':
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
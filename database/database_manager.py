@@ -6,23 +6,354 @@
 
 import sqlite3
 import logging
+import itertools
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator, Iterable
 from datetime import datetime
 
+from database.migrations import MigrationEngine
+from models.recipe import ChangeType
+
+
+# 命名PRAGMA配置档，可通过 ProjectConfig 的 database/pragma_profile 选择，
+# database/pragmas 中的同名键会覆盖所选配置档中的值
+PRAGMA_PROFILES: Dict[str, Dict[str, Any]] = {
+    # 旧版行为：回滚日志模式，写入时阻塞读取
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000
+    },
+    # 数据安全优先：WAL 模式下每次提交仍然完整同步
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -8000,        # 8MB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000
+    },
+    # 默认配置：WAL + NORMAL 同步，掉电最多丢失最近的提交但不会损坏数据库
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -32000,       # 32MB
+        'mmap_size': 134217728,     # 128MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000
+    },
+    # 大型配方库分析：更大的缓存和内存映射
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -131072,      # 128MB
+        'mmap_size': 1073741824,    # 1GB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+        'wal_autocheckpoint': 4000
+    }
+}
+
+DEFAULT_PRAGMA_PROFILE = 'balanced'
+
+# 数据库级别的PRAGMA，只需在写连接上设置一次
+DATABASE_PRAGMAS = ('journal_mode',)
+
+# 允许通过配置设置的PRAGMA及其取值：int 表示整数，元组为允许的关键字；
+# PRAGMA 不支持参数绑定，取值校验通过后才会拼接进SQL
+ALLOWED_PRAGMAS: Dict[str, Any] = {
+    'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'),
+    'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+    'cache_size': int,
+    'mmap_size': int,
+    'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+    'busy_timeout': int,
+    'wal_autocheckpoint': int,
+    'cache_spill': ('ON', 'OFF'),
+    'locking_mode': ('NORMAL', 'EXCLUSIVE')
+}
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+# execute_query/iter_query 支持的行格式：
+#   dict   - 字典（默认，兼容旧代码）
+#   tuple  - 普通元组，不创建任何行对象，开销最小
+#   record - 按列名生成的轻量命名元组（无 __dict__），可按属性或下标访问
+ROW_MODES = ('dict', 'tuple', 'record')
+
+DEFAULT_STATEMENT_CACHE_SIZE = 256
+DEFAULT_FETCH_BATCH_SIZE = 1000
+
+# IN (...) 查询每批的参数个数，低于 SQLite 默认的 999 个变量上限
+MAX_IN_PARAMS = 500
+
+
+@lru_cache(maxsize=256)
+def record_type(columns: Tuple[str, ...]) -> type:
+    """按列名返回（并缓存）对应的命名元组行类型"""
+    return namedtuple('Record', columns, rename=True)
+
+
+# 配方表可写字段及其默认值
+RECIPE_COLUMNS: Dict[str, Any] = {
+    'name': None,
+    'version': 1,
+    'parent_recipe_id': None,
+    'description': None,
+    'total_volume_ml': 0.0,
+    'nicotine_strength_mg': 0.0,
+    'pg_ratio': 0.0,
+    'vg_ratio': 0.0,
+    'flavor_ratio': 0.0,
+    'designer_name': None,
+    'customer_name': None
+}
+
+# 按名称创建材料时未提供分类使用的默认分类
+DEFAULT_MATERIAL_CATEGORY = '未分类'
+
+
+class ConnectionPool:
+    """连接池 - 读连接借出后在 reader() 退出时归还空闲队列，所有写操作共享一个写连接"""
+    
+    def __init__(self, connection_factory: Callable[[], sqlite3.Connection],
+                 max_readers: int = 8, acquire_timeout: float = 30.0):
+        self._factory = connection_factory
+        self.max_readers = max(1, max_readers)
+        self.acquire_timeout = acquire_timeout
+        self.logger = logging.getLogger(__name__)
+        
+        # 当前线程借出的读连接 [代数, 连接, 嵌套深度]，同一线程嵌套借出时复用同一个连接
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._idle: List[sqlite3.Connection] = []
+        self._open_readers = 0
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+        # close_all() 之后递增，借出中的旧连接归还时直接关闭
+        self._generation = 0
+        
+        # 使用统计
+        self._active_readers = 0
+        self._peak_readers = 0
+        self._reader_waits = 0
+        self._writer_acquisitions = 0
+        self._writer_waits = 0
+        self._writer_wait_time = 0.0
+    
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """借出读连接：优先使用空闲连接，未达上限时新建，否则等待其他线程归还"""
+        held = getattr(self._local, 'reader', None)
+        if held is not None:
+            held[2] += 1
+            return held[1]
+        
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            waited = False
+            while not self._idle and self._open_readers >= self.max_readers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        f"获取读连接超时: 已达到连接上限 {self.max_readers}"
+                    )
+                waited = True
+                self._condition.wait(remaining)
+            
+            if waited:
+                self._reader_waits += 1
+            
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = self._factory()
+                self._open_readers += 1
+                self._peak_readers = max(self._peak_readers, self._open_readers)
+            self._active_readers += 1
+            self._local.reader = [self._generation, conn, 1]
+        
+        return conn
+    
+    def _release_reader(self) -> None:
+        """归还当前线程借出的读连接（嵌套借出时只在最外层归还）"""
+        held = self._local.reader
+        held[2] -= 1
+        if held[2] > 0:
+            return
+        self._local.reader = None
+        generation, conn, _ = held
+        with self._condition:
+            self._active_readers -= 1
+            if generation == self._generation:
+                self._idle.append(conn)
+            else:
+                conn.close()
+                self._open_readers -= 1
+            self._condition.notify()
+    
+    def _get_writer(self) -> sqlite3.Connection:
+        """获取写连接（调用方需持有 _writer_lock）"""
+        if self._writer is None:
+            self._writer = self._factory()
+        return self._writer
+    
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """借出读连接，退出时归还连接池"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._release_reader()
+    
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """独占借出写连接"""
+        start = time.perf_counter()
+        waited = not self._writer_lock.acquire(blocking=False)
+        if waited:
+            self._writer_lock.acquire()
+        # 统计计数在持有写锁时更新
+        if waited:
+            self._writer_waits += 1
+        self._writer_wait_time += time.perf_counter() - start
+        self._writer_acquisitions += 1
+        try:
+            yield self._get_writer()
+        finally:
+            self._writer_lock.release()
+    
+    def writer_connection(self) -> sqlite3.Connection:
+        """返回写连接本身（兼容直接持有连接的旧代码）"""
+        with self._writer_lock:
+            return self._get_writer()
+    
+    def stats(self) -> Dict[str, Any]:
+        """连接池使用情况"""
+        with self._writer_lock:
+            writer_stats = {
+                'writer_open': self._writer is not None,
+                'writer_acquisitions': self._writer_acquisitions,
+                'writer_waits': self._writer_waits,
+                'writer_wait_time': self._writer_wait_time
+            }
+        with self._condition:
+            return {
+                'max_readers': self.max_readers,
+                'open_readers': self._open_readers,
+                'idle_readers': len(self._idle),
+                'active_readers': self._active_readers,
+                'peak_readers': self._peak_readers,
+                'reader_waits': self._reader_waits,
+                **writer_stats
+            }
+    
+    def close_all(self) -> None:
+        """关闭所有连接，之后的借出请求会重新建立连接（借出中的读连接在归还时关闭）"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._condition:
+            for conn in self._idle:
+                conn.close()
+            self._open_readers -= len(self._idle)
+            self._idle.clear()
+            self._generation += 1
+            self._condition.notify_all()
+
+
+class CheckpointScheduler:
+    """WAL检查点调度器 - 在后台线程中定期把WAL内容写回主数据库文件"""
+    
+    def __init__(self, db_manager: 'DatabaseManager', interval: float = 300.0,
+                 mode: str = 'PASSIVE'):
+        self.db_manager = db_manager
+        self.interval = interval
+        self.mode = mode
+        self.logger = logging.getLogger(__name__)
+        self.last_result: Optional[Tuple[int, int, int]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def running(self) -> bool:
+        """调度器是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> None:
+        """启动调度线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='wal-checkpoint', daemon=True
+        )
+        self._thread.start()
+        self.logger.info(f"WAL检查点调度已启动: 每 {self.interval} 秒执行 {self.mode}")
+    
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止调度线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self) -> None:
+        """调度循环"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.last_result = self.db_manager.checkpoint(self.mode)
+            except sqlite3.Error as e:
+                self.logger.warning(f"WAL检查点执行失败: {e}")
+
 
 class DatabaseManager:
     """数据库管理类"""
     
-    def __init__(self, db_path: str = 'database/db_files/flavor_lab.db'):
+    def __init__(self, db_path: str = 'database/db_files/flavor_lab.db',
+                 max_readers: Optional[int] = None,
+                 pragma_profile: Optional[str] = None,
+                 project_config: Optional[Any] = None,
+                 read_only: bool = False):
         self.db_path = db_path
-        self.connection = None
+        # 只读模式：以 mode=ro 打开已有数据库，不执行迁移，也不启动检查点调度
+        self.read_only = read_only
         self.logger = logging.getLogger(__name__)
+        
+        if project_config is None:
+            from config.project_config import get_config
+            project_config = get_config()
+        self.project_config = project_config
+        
+        if max_readers is None:
+            max_readers = project_config.get('database/max_readers', 8)
+        self.statement_cache_size = project_config.get('database/statement_cache_size',
+                                                       DEFAULT_STATEMENT_CACHE_SIZE)
+        self.pragmas = self._resolve_pragmas(pragma_profile)
+        self.pool = ConnectionPool(self._open_connection, max_readers=max_readers)
+        self.checkpoint_scheduler: Optional[CheckpointScheduler] = None
+        self.migration_engine = MigrationEngine()
+        # 显式事务的嵌套深度和所属线程，仅在持有写锁时修改
+        self._transaction_depth = 0
+        self._transaction_owner: Optional[int] = None
         self._ensure_database()
+        self._configure_checkpoints()
     
     def _ensure_database(self) -> None:
         """确保数据库文件和目录存在"""
         db_file = Path(self.db_path)
+        if self.read_only:
+            if not db_file.exists():
+                raise FileNotFoundError(f"只读模式下数据库文件不存在: {self.db_path}")
+            return
         db_file.parent.mkdir(parents=True, exist_ok=True)
         
         if not db_file.exists():
@@ -30,120 +361,557 @@ class DatabaseManager:
             self._create_tables()
         else:
             self.logger.info(f"使用现有数据库文件: {self.db_path}")
+            # 旧版本数据库补齐缺失的迁移（如索引）
+            self.migrate()
+        
+        self._apply_database_pragmas()
     
-    def connect(self) -> sqlite3.Connection:
-        """连接到数据库"""
-        if self.connection is None:
-            self.connection = sqlite3.connect(
-                self.db_path,
-                check_same_thread=False,
-                isolation_level=None
+    def _resolve_pragmas(self, profile_name: Optional[str]) -> Dict[str, Any]:
+        """根据配置档和覆盖项确定最终的PRAGMA设置"""
+        if profile_name is None:
+            profile_name = self.project_config.get('database/pragma_profile',
+                                                   DEFAULT_PRAGMA_PROFILE)
+        if profile_name not in PRAGMA_PROFILES:
+            self.logger.warning(f"未知的PRAGMA配置档 {profile_name}，使用 {DEFAULT_PRAGMA_PROFILE}")
+            profile_name = DEFAULT_PRAGMA_PROFILE
+        self.pragma_profile = profile_name
+        
+        # 配置档和覆盖项的取值都规范为校验过的SQL文本
+        pragmas = {name: self._check_pragma_value(name, value)
+                   for name, value in PRAGMA_PROFILES[profile_name].items()}
+        overrides = self.project_config.get('database/pragmas', {}) or {}
+        for name, value in overrides.items():
+            if name not in ALLOWED_PRAGMAS:
+                self.logger.warning(f"忽略不支持的PRAGMA: {name}")
+                continue
+            text = self._check_pragma_value(name, value)
+            if text is None:
+                self.logger.warning(f"忽略无效的PRAGMA取值: {name} = {value!r}")
+                continue
+            pragmas[name] = text
+        return pragmas
+    
+    @staticmethod
+    def _check_pragma_value(name: str, value: Any) -> Optional[str]:
+        """校验PRAGMA取值，返回可以拼接进SQL的文本，取值无效时返回None"""
+        allowed = ALLOWED_PRAGMAS.get(name)
+        if allowed is int:
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                return None
+            try:
+                return str(int(value))
+            except ValueError:
+                return None
+        if allowed is not None:
+            if isinstance(value, bool):
+                value = 'ON' if value else 'OFF'
+            text = str(value).strip().upper()
+            return text if text in allowed else None
+        return None
+    
+    def _apply_database_pragmas(self) -> None:
+        """在写连接上设置数据库级别的PRAGMA（如日志模式，取值已在 _resolve_pragmas 中校验）"""
+        with self.write_connection() as conn:
+            for name in DATABASE_PRAGMAS:
+                if name in self.pragmas:
+                    result = conn.execute(f'PRAGMA {name} = {self.pragmas[name]}').fetchone()
+                    self.logger.info(f"PRAGMA {name} = {result[0] if result else None}")
+    
+    def _apply_connection_pragmas(self, conn: sqlite3.Connection) -> None:
+        """设置按连接生效的PRAGMA（取值已在 _resolve_pragmas 中校验）"""
+        for name, value in self.pragmas.items():
+            if name not in DATABASE_PRAGMAS:
+                conn.execute(f'PRAGMA {name} = {value}')
+    
+    @property
+    def wal_enabled(self) -> bool:
+        """数据库是否运行在WAL模式"""
+        with self.read_connection() as conn:
+            return conn.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+    
+    def _configure_checkpoints(self) -> None:
+        """WAL模式下按配置启动后台检查点调度"""
+        if self.read_only:
+            return
+        interval = self.project_config.get('database/checkpoint_interval', 300)
+        if interval and interval > 0 and self.wal_enabled:
+            self.start_checkpoint_scheduler(
+                interval, self.project_config.get('database/checkpoint_mode', 'PASSIVE')
             )
-            self.connection.row_factory = sqlite3.Row
-            self._enable_foreign_keys()
-        return self.connection
     
-    def _enable_foreign_keys(self) -> None:
-        """启用外键约束"""
-        with self.connect() as conn:
-            conn.execute('PRAGMA foreign_keys = ON')
+    def start_checkpoint_scheduler(self, interval: float = 300.0,
+                                   mode: str = 'PASSIVE') -> CheckpointScheduler:
+        """启动后台WAL检查点调度"""
+        if self.checkpoint_scheduler is not None:
+            self.checkpoint_scheduler.stop()
+        self.checkpoint_scheduler = CheckpointScheduler(self, interval, mode.upper())
+        self.checkpoint_scheduler.start()
+        return self.checkpoint_scheduler
+    
+    def stop_checkpoint_scheduler(self) -> None:
+        """停止后台WAL检查点调度"""
+        if self.checkpoint_scheduler is not None:
+            self.checkpoint_scheduler.stop()
+            self.checkpoint_scheduler = None
+    
+    def checkpoint(self, mode: str = 'PASSIVE') -> Tuple[int, int, int]:
+        """执行WAL检查点，返回 (是否被阻塞, WAL页数, 已写回页数)"""
+        mode = mode.upper()
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"无效的检查点模式: {mode}")
+        
+        # PASSIVE 模式不会等待读写，借用读连接即可，不占用写锁
+        if mode == 'PASSIVE':
+            with self.read_connection() as conn:
+                row = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+        else:
+            with self.write_connection() as conn:
+                row = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+        return tuple(row)
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """创建新的数据库连接"""
+        # 读连接归还后可能被其他线程借出，同一时刻只由一个线程使用
+        conn = sqlite3.connect(
+            f"{Path(self.db_path).resolve().as_uri()}?mode=ro" if self.read_only else self.db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=self.statement_cache_size,
+            uri=self.read_only
+        )
+        conn.row_factory = sqlite3.Row
+        self._enable_foreign_keys(conn)
+        self._apply_connection_pragmas(conn)
+        if self.read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+    
+    def _enable_foreign_keys(self, conn: sqlite3.Connection) -> None:
+        """启用外键约束（外键设置按连接生效）"""
+        conn.execute('PRAGMA foreign_keys = ON')
+    
+    @property
+    def connection(self) -> Optional[sqlite3.Connection]:
+        """当前已打开的写连接"""
+        return self.pool._writer
+    
+    def connect(self) -> sqlite3.Connection:
+        """连接到数据库，返回共享的写连接"""
+        return self.pool.writer_connection()
+    
+    @contextmanager
+    def read_connection(self) -> Iterator[sqlite3.Connection]:
+        """借出读连接"""
+        # 事务内的读取需要看到尚未提交的写入，改用写连接
+        if self.in_transaction():
+            with self.pool.writer() as conn:
+                yield conn
+            return
+        with self.pool.reader() as conn:
+            yield conn
+    
+    @contextmanager
+    def write_connection(self) -> Iterator[sqlite3.Connection]:
+        """独占借出写连接，同一时间只有一个线程写入"""
+        with self.pool.writer() as conn:
+            yield conn
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池使用情况"""
+        return self.pool.stats()
     
     def _create_tables(self) -> None:
-        """创建数据库表结构"""
-        with self.connect() as conn:
-            # 材料表
-            conn.execute('''
-                CREATE TABLE materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    category TEXT NOT NULL,
-                    description TEXT,
-                    price_per_ml REAL DEFAULT 0.0,
-                    density REAL DEFAULT 1.0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 配方表
-            conn.execute('''
-                CREATE TABLE recipes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    version INTEGER DEFAULT 1,
-                    parent_recipe_id INTEGER,
-                    description TEXT,
-                    total_volume_ml REAL DEFAULT 0.0,
-                    nicotine_strength_mg REAL DEFAULT 0.0,
-                    pg_ratio REAL DEFAULT 0.0,
-                    vg_ratio REAL DEFAULT 0.0,
-                    flavor_ratio REAL DEFAULT 0.0,
-                    designer_name TEXT,
-                    customer_name TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (parent_recipe_id) REFERENCES recipes (id)
-                )
-            ''')
-            
-            # 配方组成表
-            conn.execute('''
-                CREATE TABLE recipe_compositions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    recipe_id INTEGER NOT NULL,
-                    material_id INTEGER NOT NULL,
-                    percentage REAL NOT NULL,
-                    weight_grams REAL DEFAULT 0.0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (recipe_id) REFERENCES recipes (id) ON DELETE CASCADE,
-                    FOREIGN KEY (material_id) REFERENCES materials (id)
-                )
-            ''')
-            
-            # 版本历史表
-            conn.execute('''
-                CREATE TABLE version_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    recipe_id INTEGER NOT NULL,
-                    version INTEGER NOT NULL,
-                    change_type TEXT NOT NULL,
-                    change_description TEXT,
-                    created_by TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (recipe_id) REFERENCES recipes (id) ON DELETE CASCADE
-                )
-            ''')
-            
-            self.logger.info("数据库表结构创建完成")
+        """创建数据库表结构（迁移到最新版本）"""
+        self.migrate()
+        self.logger.info("数据库表结构创建完成")
+    
+    def migrate(self, target_version: Optional[int] = None) -> List[int]:
+        """执行尚未应用的数据库迁移"""
+        with self.write_connection() as conn:
+            return self.migration_engine.migrate(conn, target_version)
+    
+    @property
+    def schema_version(self) -> int:
+        """当前数据库的表结构版本"""
+        with self.read_connection() as conn:
+            return self.migration_engine.current_version(conn)
     
-    def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """执行查询并返回结果"""
+    def _execute_cursor(self, conn: sqlite3.Connection, query: str, params: tuple,
+                        row_mode: str) -> sqlite3.Cursor:
+        """按行格式创建游标并执行查询"""
+        if row_mode not in ROW_MODES:
+            raise ValueError(f"无效的行格式: {row_mode}")
+        cursor = conn.cursor()
+        if row_mode != 'dict':
+            # 直接取回元组，跳过 sqlite3.Row 对象的创建
+            cursor.row_factory = None
+        return cursor.execute(query, params)
+    
+    def _convert_rows(self, cursor: sqlite3.Cursor, rows: List[Any], row_mode: str) -> List[Any]:
+        """把一批原始行转换为指定格式"""
+        if row_mode == 'dict':
+            return [dict(row) for row in rows]
+        if row_mode == 'record':
+            make = record_type(tuple(col[0] for col in cursor.description))._make
+            return [make(row) for row in rows]
+        return rows
+    
+    def execute_query(self, query: str, params: tuple = (),
+                      row_mode: str = 'dict') -> List[Any]:
+        """执行查询并返回结果，row_mode 可选 dict/tuple/record"""
         try:
-            with self.connect() as conn:
-                cursor = conn.execute(query, params)
-                return [dict(row) for row in cursor.fetchall()]
+            with self.read_connection() as conn:
+                cursor = self._execute_cursor(conn, query, params, row_mode)
+                return self._convert_rows(cursor, cursor.fetchall(), row_mode)
+        except sqlite3.Error as e:
+            self.logger.error(f"数据库查询错误: {e}")
+            raise
+    
+    def iter_query(self, query: str, params: tuple = (), row_mode: str = 'dict',
+                   batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Iterator[Any]:
+        """流式执行查询，按批次 fetchmany 并逐行产出，内存占用与结果集大小无关"""
+        try:
+            with self.read_connection() as conn:
+                cursor = self._execute_cursor(conn, query, params, row_mode)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield from self._convert_rows(cursor, rows, row_mode)
+                finally:
+                    cursor.close()
         except sqlite3.Error as e:
             self.logger.error(f"数据库查询错误: {e}")
             raise
     
+    def iter_recipe_dicts(self, recipe_ids: Optional[Iterable[int]] = None,
+                          batch_size: int = DEFAULT_FETCH_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """按配方ID顺序流式产出带组成（含材料名称、单价、密度）的配方字典"""
+        recipe_fields = ['id'] + list(RECIPE_COLUMNS) + ['created_at', 'updated_at']
+        composition_fields = ['material_id', 'material_name', 'category', 'percentage',
+                              'weight_grams', 'price_per_ml', 'density']
+        query = f"""
+            SELECT {', '.join('r.' + col for col in recipe_fields)},
+                   c.material_id, m.name, m.category, c.percentage, c.weight_grams,
+                   m.price_per_ml, m.density
+            FROM recipes r
+            LEFT JOIN recipe_compositions c ON c.recipe_id = r.id
+            LEFT JOIN materials m ON m.id = c.material_id
+            {{where}}
+            ORDER BY r.id, c.id
+        """
+        
+        if recipe_ids is None:
+            chunks: Iterable[List[int]] = [[]]
+        else:
+            ids = sorted(set(recipe_ids))
+            chunks = [ids[i:i + MAX_IN_PARAMS] for i in range(0, len(ids), MAX_IN_PARAMS)]
+        
+        split = len(recipe_fields)
+        for chunk in chunks:
+            if recipe_ids is None:
+                rows = self.iter_query(query.format(where=''), row_mode='tuple', batch_size=batch_size)
+            elif not chunk:
+                continue
+            else:
+                where = f"WHERE r.id IN ({', '.join('?' for _ in chunk)})"
+                rows = self.iter_query(query.format(where=where), tuple(chunk),
+                                       row_mode='tuple', batch_size=batch_size)
+            
+            # 同一配方的行在结果中相邻，按配方分组即可保持常量内存
+            for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+                recipe = None
+                for row in group:
+                    if recipe is None:
+                        recipe = dict(zip(recipe_fields, row[:split]))
+                        recipe['compositions'] = []
+                    if row[split] is not None:
+                        recipe['compositions'].append(dict(zip(composition_fields, row[split:])))
+                yield recipe
+    
     def execute_update(self, query: str, params: tuple = ()) -> int:
-        """执行更新操作并返回影响的行数"""
+        """执行更新操作并返回影响的行数（事务内不单独提交）"""
         try:
-            with self.connect() as conn:
+            with self.write_connection() as conn:
                 cursor = conn.execute(query, params)
-                conn.commit()
+                if not self.in_transaction():
+                    conn.commit()
                 return cursor.rowcount
         except sqlite3.Error as e:
             self.logger.error(f"数据库更新错误: {e}")
             raise
     
+    def execute_insert(self, query: str, params: tuple = ()) -> int:
+        """执行插入操作并返回新行的ID"""
+        try:
+            with self.write_connection() as conn:
+                cursor = conn.execute(query, params)
+                if not self.in_transaction():
+                    conn.commit()
+                return cursor.lastrowid
+        except sqlite3.Error as e:
+            self.logger.error(f"数据库插入错误: {e}")
+            raise
+    
+    def in_transaction(self) -> bool:
+        """当前线程是否处于显式事务中"""
+        return self._transaction_depth > 0 and self._transaction_owner == threading.get_ident()
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """显式事务，块内的所有写入只提交一次；嵌套调用使用保存点"""
+        with self.pool.writer() as conn:
+            depth = self._transaction_depth
+            if depth == 0:
+                conn.execute('BEGIN IMMEDIATE')
+                self._transaction_owner = threading.get_ident()
+            else:
+                conn.execute(f'SAVEPOINT sp_{depth}')
+            self._transaction_depth = depth + 1
+            
+            try:
+                yield conn
+            except BaseException:
+                if depth == 0:
+                    conn.execute('ROLLBACK')
+                else:
+                    conn.execute(f'ROLLBACK TO sp_{depth}')
+                    conn.execute(f'RELEASE sp_{depth}')
+                raise
+            else:
+                if depth == 0:
+                    conn.execute('COMMIT')
+                else:
+                    conn.execute(f'RELEASE sp_{depth}')
+            finally:
+                self._transaction_depth = depth
+                if depth == 0:
+                    self._transaction_owner = None
+    
+    def execute_many(self, query: str, params_seq: Iterable[tuple]) -> int:
+        """在一个事务中批量执行同一条语句，返回影响的行数"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.executemany(query, params_seq)
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            self.logger.error(f"数据库批量更新错误: {e}")
+            raise
+    
+    def bulk_insert(self, table: str, rows: Iterable[Dict[str, Any]],
+                    columns: Optional[List[str]] = None) -> int:
+        """批量插入字典行，未指定列时使用第一行的键"""
+        iterator = iter(rows)
+        if columns is None:
+            first = next(iterator, None)
+            if first is None:
+                return 0
+            columns = list(first.keys())
+            iterator = itertools.chain([first], iterator)
+        
+        for identifier in [table] + list(columns):
+            if not identifier.isidentifier():
+                raise ValueError(f"无效的表名或列名: {identifier}")
+        
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' for _ in columns)})")
+        return self.execute_many(
+            query, (tuple(row.get(col) for col in columns) for row in iterator)
+        )
+    
+    def find_material_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        """按材料名称分批查找材料ID，返回 {材料名称: 材料ID}（不存在的名称不在结果中）"""
+        names = list(names)
+        name_to_id: Dict[str, int] = {}
+        for start in range(0, len(names), MAX_IN_PARAMS):
+            chunk = names[start:start + MAX_IN_PARAMS]
+            name_to_id.update(self.execute_query(
+                f"SELECT name, id FROM materials WHERE name IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk), row_mode='tuple'
+            ))
+        return name_to_id
+    
+    def _resolve_material_ids(self, conn: sqlite3.Connection,
+                              compositions: List[Dict[str, Any]],
+                              create_missing: bool = False) -> List[int]:
+        """确定每个组成的材料ID，缺少ID时按材料名称分批查找
+        
+        create_missing 为 True 时，用组成中的分类、单价和密度创建本地不存在的材料（导入其他站点的配方库）
+        """
+        names = list({comp['material_name'] for comp in compositions
+                      if comp.get('material_id') is None and comp.get('material_name')})
+        name_to_id = self.find_material_ids(names)
+        
+        if create_missing and len(name_to_id) < len(names):
+            for comp in compositions:
+                name = comp.get('material_name')
+                if comp.get('material_id') is None and name and name not in name_to_id:
+                    name_to_id[name] = conn.execute(
+                        'INSERT INTO materials (name, category, price_per_ml, density) VALUES (?, ?, ?, ?)',
+                        (name, comp.get('category') or DEFAULT_MATERIAL_CATEGORY,
+                         comp.get('price_per_ml') or 0.0, comp.get('density') or 1.0)
+                    ).lastrowid
+        
+        material_ids = []
+        for comp in compositions:
+            material_id = comp.get('material_id')
+            if material_id is None:
+                material_id = name_to_id.get(comp.get('material_name'))
+            if material_id is None:
+                raise ValueError(f"未找到材料: {comp.get('material_name', '未知')}")
+            material_ids.append(material_id)
+        return material_ids
+    
+    def save_recipe(self, recipe_data: Dict[str, Any], created_by: Optional[str] = None,
+                    change_type: Optional[ChangeType] = None,
+                    change_description: Optional[str] = None) -> int:
+        """在一个事务中保存配方、全部组成和版本记录，返回配方ID"""
+        compositions = recipe_data.get('compositions', [])
+        values = tuple(default if recipe_data.get(col) is None else recipe_data[col]
+                       for col, default in RECIPE_COLUMNS.items())
+        
+        with self.transaction() as conn:
+            material_ids = self._resolve_material_ids(conn, compositions)
+            
+            recipe_id = recipe_data.get('id')
+            exists = recipe_id is not None and conn.execute(
+                'SELECT 1 FROM recipes WHERE id = ?', (recipe_id,)
+            ).fetchone() is not None
+            
+            if exists:
+                assignments = ', '.join(f'{col} = ?' for col in RECIPE_COLUMNS)
+                conn.execute(
+                    f'UPDATE recipes SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                    values + (recipe_id,)
+                )
+                conn.execute('DELETE FROM recipe_compositions WHERE recipe_id = ?', (recipe_id,))
+            else:
+                cursor = conn.execute(
+                    f"INSERT INTO recipes ({', '.join(RECIPE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in RECIPE_COLUMNS)})",
+                    values
+                )
+                recipe_id = cursor.lastrowid
+            
+            conn.executemany(
+                'INSERT INTO recipe_compositions (recipe_id, material_id, percentage, weight_grams) '
+                'VALUES (?, ?, ?, ?)',
+                [(recipe_id, material_id, comp.get('percentage', 0.0), comp.get('weight_grams') or 0.0)
+                 for material_id, comp in zip(material_ids, compositions)]
+            )
+            
+            if change_type is None:
+                change_type = ChangeType.UPDATED if exists else ChangeType.CREATED
+            conn.execute(
+                'INSERT INTO version_history (recipe_id, version, change_type, change_description, created_by) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (recipe_id, values[1], change_type.value, change_description, created_by)
+            )
+        
+        return recipe_id
+    
+    def insert_recipes(self, recipes: Iterable[Dict[str, Any]], created_by: Optional[str] = None,
+                       change_type: ChangeType = ChangeType.IMPORTED,
+                       change_description: Optional[str] = None,
+                       create_missing_materials: bool = False) -> List[int]:
+        """在一个事务中批量插入新配方及其组成和版本记录，返回新配方ID（与输入顺序一致）
+        
+        与逐个调用 save_recipe 相比，材料名称一次性查找，组成和版本记录各用一次 executemany 写入
+        """
+        recipes = list(recipes)
+        with self.transaction() as conn:
+            material_ids = iter(self._resolve_material_ids(
+                conn, [comp for recipe in recipes for comp in recipe.get('compositions', [])],
+                create_missing_materials
+            ))
+            
+            insert_recipe = (f"INSERT INTO recipes ({', '.join(RECIPE_COLUMNS)}) "
+                             f"VALUES ({', '.join('?' for _ in RECIPE_COLUMNS)})")
+            recipe_ids = []
+            composition_rows = []
+            history_rows = []
+            for recipe_data in recipes:
+                values = tuple(default if recipe_data.get(col) is None else recipe_data[col]
+                               for col, default in RECIPE_COLUMNS.items())
+                recipe_id = conn.execute(insert_recipe, values).lastrowid
+                recipe_ids.append(recipe_id)
+                composition_rows.extend(
+                    (recipe_id, next(material_ids), comp.get('percentage', 0.0), comp.get('weight_grams') or 0.0)
+                    for comp in recipe_data.get('compositions', [])
+                )
+                history_rows.append((recipe_id, values[1], change_type.value, change_description, created_by))
+            
+            conn.executemany(
+                'INSERT INTO recipe_compositions (recipe_id, material_id, percentage, weight_grams) '
+                'VALUES (?, ?, ?, ?)',
+                composition_rows
+            )
+            conn.executemany(
+                'INSERT INTO version_history (recipe_id, version, change_type, change_description, created_by) '
+                'VALUES (?, ?, ?, ?, ?)',
+                history_rows
+            )
+        
+        return recipe_ids
+    
+    def copy_recipe_version(self, recipe_id: int, created_by: Optional[str] = None,
+                            change_description: Optional[str] = None) -> int:
+        """复制配方为新版本（组成随之复制），返回新配方ID"""
+        columns = ', '.join(col for col in RECIPE_COLUMNS if col not in ('version', 'parent_recipe_id'))
+        
+        with self.transaction() as conn:
+            row = conn.execute('SELECT version FROM recipes WHERE id = ?', (recipe_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"配方不存在: {recipe_id}")
+            new_version = (row['version'] or 1) + 1
+            
+            cursor = conn.execute(
+                f'INSERT INTO recipes ({columns}, version, parent_recipe_id) '
+                f'SELECT {columns}, ?, id FROM recipes WHERE id = ?',
+                (new_version, recipe_id)
+            )
+            new_recipe_id = cursor.lastrowid
+            
+            conn.execute(
+                'INSERT INTO recipe_compositions (recipe_id, material_id, percentage, weight_grams) '
+                'SELECT ?, material_id, percentage, weight_grams FROM recipe_compositions '
+                'WHERE recipe_id = ? ORDER BY id',
+                (new_recipe_id, recipe_id)
+            )
+            conn.execute(
+                'INSERT INTO version_history (recipe_id, version, change_type, change_description, created_by) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (new_recipe_id, new_version, ChangeType.COPIED.value,
+                 change_description or f"复制自配方 {recipe_id}", created_by)
+            )
+        
+        return new_recipe_id
+    
     def close(self) -> None:
         """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
-            self.logger.info("数据库连接已关闭")
+        self.stop_checkpoint_scheduler()
+        self.pool.close_all()
+        self.logger.info("数据库连接已关闭")
+
+
+# 全局数据库管理器实例，首次使用时才创建，导入本模块不会访问文件系统
+_db_manager: Optional[DatabaseManager] = None
+_db_manager_lock = threading.Lock()
+
+
+def get_db_manager() -> DatabaseManager:
+    """获取全局数据库管理器实例"""
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager()
+    return _db_manager
 
 
-# 全局数据库管理器实例
-db_manager = DatabaseManager()
\ No newline at end of file
+def __getattr__(name: str) -> Any:
+    """兼容 from database.database_manager import db_manager 的旧用法"""
+    if name == 'db_manager':
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
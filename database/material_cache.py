@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+材料缓存 - 进程内按ID和名称索引的 Material 标识映射（LRU），材料表变更计数增加后按行内容自动失效
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from database.database_manager import DatabaseManager, MAX_IN_PARAMS
+from models.recipe import Material
+
+
+MATERIAL_FIELDS = ['id', 'name', 'category', 'description', 'price_per_ml', 'density',
+                   'created_at', 'updated_at']
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    """解析SQLite中的时间文本"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def build_material(values: Iterable[Any]) -> Material:
+    """由按 MATERIAL_FIELDS 排列的查询行创建材料对象"""
+    data = dict(zip(MATERIAL_FIELDS, values))
+    data['created_at'] = parse_datetime(data['created_at'])
+    data['updated_at'] = parse_datetime(data['updated_at'])
+    return Material(**data)
+
+
+class MaterialCache:
+    """材料缓存类"""
+    
+    def __init__(self, db_manager: DatabaseManager, maxsize: int = 1024,
+                 validate_interval: float = 1.0):
+        self.db_manager = db_manager
+        self.maxsize = maxsize
+        # 两次有效性检查之间的最短间隔(秒)，0 表示每次查找都检查
+        self.validate_interval = validate_interval
+        self.logger = logging.getLogger(__name__)
+        
+        self._lock = threading.RLock()
+        self._by_id: 'OrderedDict[int, Tuple[Material, Any]]' = OrderedDict()
+        self._name_to_id: Dict[str, int] = {}
+        self._table_stamp: Optional[tuple] = None
+        self._has_version_table: Optional[bool] = None
+        self._last_validated = 0.0
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, material_id: int) -> Optional[Material]:
+        """按ID获取材料"""
+        return self.get_many([material_id]).get(material_id)
+    
+    def get_by_name(self, name: str) -> Optional[Material]:
+        """按名称获取材料"""
+        return self.get_many_by_name([name]).get(name)
+    
+    def get_many(self, material_ids: Iterable[int]) -> Dict[int, Material]:
+        """批量按ID获取材料，未命中的部分用一次查询加载"""
+        self.validate()
+        result: Dict[int, Material] = {}
+        missing: List[int] = []
+        with self._lock:
+            for material_id in dict.fromkeys(material_ids):
+                entry = self._by_id.get(material_id)
+                if entry is None:
+                    missing.append(material_id)
+                else:
+                    self._by_id.move_to_end(material_id)
+                    result[material_id] = entry[0]
+            self.hits += len(result)
+            self.misses += len(missing)
+        
+        if missing:
+            result.update(self._load('id', missing))
+        return result
+    
+    def get_many_by_name(self, names: Iterable[str]) -> Dict[str, Material]:
+        """批量按名称获取材料"""
+        self.validate()
+        result: Dict[str, Material] = {}
+        missing: List[str] = []
+        with self._lock:
+            for name in dict.fromkeys(names):
+                material_id = self._name_to_id.get(name)
+                entry = self._by_id.get(material_id) if material_id is not None else None
+                if entry is None:
+                    missing.append(name)
+                else:
+                    self._by_id.move_to_end(material_id)
+                    result[name] = entry[0]
+            self.hits += len(result)
+            self.misses += len(missing)
+        
+        if missing:
+            for material in self._load('name', missing).values():
+                result[material.name] = material
+        return result
+    
+    def invalidate(self, material_id: Optional[int] = None) -> None:
+        """手动失效单个材料，不指定ID时清空缓存"""
+        with self._lock:
+            if material_id is None:
+                self.invalidations += len(self._by_id)
+                self._by_id.clear()
+                self._name_to_id.clear()
+                self._table_stamp = None
+            else:
+                self._evict(material_id)
+    
+    def validate(self, force: bool = False) -> None:
+        """检查材料表是否有变化，并丢弃内容已改变或已删除的条目"""
+        now = time.monotonic()
+        if not force and now - self._last_validated < self.validate_interval:
+            return
+        self._last_validated = now
+        
+        stamp = self._read_stamp()
+        with self._lock:
+            if stamp == self._table_stamp:
+                return
+            previous, self._table_stamp = self._table_stamp, stamp
+            if previous is None or not self._by_id:
+                return
+            cached = {material_id: entry[1] for material_id, entry in self._by_id.items()}
+        
+        # 同一毫秒内的修改 updated_at 可能不变，因此比较整行内容
+        current: Dict[int, tuple] = {}
+        ids = list(cached)
+        for start in range(0, len(ids), MAX_IN_PARAMS):
+            chunk = ids[start:start + MAX_IN_PARAMS]
+            rows = self.db_manager.execute_query(
+                f"SELECT {', '.join(MATERIAL_FIELDS)} FROM materials "
+                f"WHERE id IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk), row_mode='tuple'
+            )
+            current.update((row[0], tuple(row)) for row in rows)
+        
+        with self._lock:
+            for material_id, row in cached.items():
+                if current.get(material_id) != row:
+                    self._evict(material_id)
+    
+    def _read_stamp(self) -> tuple:
+        """材料表的变更标记：materials_version 的变更计数（迁移 v6），每次插入、修改和删除都严格递增"""
+        if self._has_version_table is None:
+            self._has_version_table = bool(self.db_manager.execute_query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'materials_version'",
+                row_mode='tuple'
+            ))
+        if self._has_version_table:
+            return tuple(self.db_manager.execute_query(
+                'SELECT version FROM materials_version WHERE id = 1', row_mode='tuple'
+            )[0])
+        # 只读打开的旧版本数据库没有计数表，退回到行数和最新修改时间
+        return tuple(self.db_manager.execute_query(
+            'SELECT COUNT(*), MAX(updated_at) FROM materials', row_mode='tuple'
+        )[0])
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存使用情况"""
+        with self._lock:
+            return {
+                'size': len(self._by_id),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+    
+    def _evict(self, material_id: int) -> None:
+        """移除一个条目（调用方需持有锁）"""
+        entry = self._by_id.pop(material_id, None)
+        if entry is not None:
+            self.invalidations += 1
+            if self._name_to_id.get(entry[0].name) == material_id:
+                del self._name_to_id[entry[0].name]
+    
+    def _load(self, column: str, keys: List[Any]) -> Dict[int, Material]:
+        """从数据库加载材料并放入缓存"""
+        loaded: Dict[int, Material] = {}
+        for start in range(0, len(keys), MAX_IN_PARAMS):
+            chunk = keys[start:start + MAX_IN_PARAMS]
+            rows = self.db_manager.execute_query(
+                f"SELECT {', '.join(MATERIAL_FIELDS)} FROM materials "
+                f"WHERE {column} IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk), row_mode='tuple'
+            )
+            for row in rows:
+                material = build_material(row)
+                loaded[material.id] = material
+                
+                with self._lock:
+                    # 保存原始查询行，用于与数据库中的当前内容直接比较
+                    self._by_id[material.id] = (material, tuple(row))
+                    self._by_id.move_to_end(material.id)
+                    self._name_to_id[material.name] = material.id
+                    while len(self._by_id) > self.maxsize:
+                        evicted_id, (evicted, _) = self._by_id.popitem(last=False)
+                        if self._name_to_id.get(evicted.name) == evicted_id:
+                            del self._name_to_id[evicted.name]
+        return loaded
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库版本迁移 - 按版本号顺序升级表结构，并在 schema_version 表中记录已执行的迁移
+"""
+
+import sqlite3
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class Migration:
+    """单个迁移步骤"""
+    version: int
+    description: str
+    statements: List[str] = field(default_factory=list)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, '初始表结构', [
+        # 材料表
+        '''
+        CREATE TABLE IF NOT EXISTS materials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            category TEXT NOT NULL,
+            description TEXT,
+            price_per_ml REAL DEFAULT 0.0,
+            density REAL DEFAULT 1.0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # 配方表
+        '''
+        CREATE TABLE IF NOT EXISTS recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            version INTEGER DEFAULT 1,
+            parent_recipe_id INTEGER,
+            description TEXT,
+            total_volume_ml REAL DEFAULT 0.0,
+            nicotine_strength_mg REAL DEFAULT 0.0,
+            pg_ratio REAL DEFAULT 0.0,
+            vg_ratio REAL DEFAULT 0.0,
+            flavor_ratio REAL DEFAULT 0.0,
+            designer_name TEXT,
+            customer_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_recipe_id) REFERENCES recipes (id)
+        )
+        ''',
+        # 配方组成表
+        '''
+        CREATE TABLE IF NOT EXISTS recipe_compositions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipe_id INTEGER NOT NULL,
+            material_id INTEGER NOT NULL,
+            percentage REAL NOT NULL,
+            weight_grams REAL DEFAULT 0.0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (recipe_id) REFERENCES recipes (id) ON DELETE CASCADE,
+            FOREIGN KEY (material_id) REFERENCES materials (id)
+        )
+        ''',
+        # 版本历史表
+        '''
+        CREATE TABLE IF NOT EXISTS version_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipe_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            change_type TEXT NOT NULL,
+            change_description TEXT,
+            created_by TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (recipe_id) REFERENCES recipes (id) ON DELETE CASCADE
+        )
+        '''
+    ]),
+    Migration(2, '配方组成、版本历史和配方查询索引', [
+        # 加载配方组成：覆盖索引，无需回表
+        '''
+        CREATE INDEX IF NOT EXISTS idx_recipe_compositions_recipe
+        ON recipe_compositions (recipe_id, material_id, percentage, weight_grams)
+        ''',
+        # 查询使用某材料的配方（价格变动影响等）
+        '''
+        CREATE INDEX IF NOT EXISTS idx_recipe_compositions_material
+        ON recipe_compositions (material_id, recipe_id, percentage)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_version_history_recipe
+        ON version_history (recipe_id, version)
+        ''',
+        # 查找子版本
+        '''
+        CREATE INDEX IF NOT EXISTS idx_recipes_parent
+        ON recipes (parent_recipe_id, version)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_recipes_name
+        ON recipes (name, version)
+        ''',
+        'ANALYZE'
+    ]),
+    Migration(3, '材料修改时自动刷新 updated_at（毫秒精度）', [
+        # 材料缓存依赖 updated_at 判断条目是否失效；
+        # 未显式修改 updated_at 的 UPDATE 由触发器补上当前时间
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_materials_touch_updated_at
+        AFTER UPDATE ON materials
+        FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+        BEGIN
+            UPDATE materials
+            SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+            WHERE id = NEW.id;
+        END
+        """
+    ]),
+    Migration(4, '配方分析结果缓存表', [
+        # 以配方内容指纹为键保存 AnalysisResult(JSON)，组成变化后指纹随之改变，旧条目不再命中
+        '''
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            fingerprint TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_analysis_cache_created
+        ON analysis_cache (created_at)
+        '''
+    ]),
+    Migration(5, '配方组成变更记录（供内存索引增量同步）', [
+        # 每个配方只保留最近一次变更的序号，表的大小不超过配方数量；
+        # 读取方记住已处理的最大序号，之后只需读取 seq 更大的记录
+        '''
+        CREATE TABLE IF NOT EXISTS recipe_change_log (
+            recipe_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_recipe_change_log_seq
+        ON recipe_change_log (seq)
+        ''',
+        # 新插入的组成由读取方按 recipe_compositions.id（AUTOINCREMENT，严格递增）识别，
+        # 不使用逐行触发器（会使批量导入慢数倍）；修改和删除组成由触发器记录，直接执行的 SQL 也不会遗漏
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_recipe_compositions_log_update
+        AFTER UPDATE ON recipe_compositions
+        BEGIN
+            INSERT OR REPLACE INTO recipe_change_log (recipe_id, seq)
+            VALUES (OLD.recipe_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM recipe_change_log));
+            INSERT OR REPLACE INTO recipe_change_log (recipe_id, seq)
+            VALUES (NEW.recipe_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM recipe_change_log));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_recipe_compositions_log_delete
+        AFTER DELETE ON recipe_compositions
+        BEGIN
+            INSERT OR REPLACE INTO recipe_change_log (recipe_id, seq)
+            VALUES (OLD.recipe_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM recipe_change_log));
+        END
+        '''
+    ]),
+    Migration(6, '材料表变更计数（材料缓存失效检测）', [
+        # updated_at 只有毫秒精度，同一毫秒内的两次修改无法区分；
+        # 材料表的每次插入、修改和删除都使计数严格递增
+        '''
+        CREATE TABLE IF NOT EXISTS materials_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        'INSERT OR IGNORE INTO materials_version (id, version) VALUES (1, 0)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_materials_version_insert
+        AFTER INSERT ON materials
+        BEGIN
+            UPDATE materials_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_materials_version_update
+        AFTER UPDATE ON materials
+        BEGIN
+            UPDATE materials_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_materials_version_delete
+        AFTER DELETE ON materials
+        BEGIN
+            UPDATE materials_version SET version = version + 1 WHERE id = 1;
+        END
+        '''
+    ])
+]
+
+
+class MigrationEngine:
+    """数据库迁移引擎"""
+    
+    def __init__(self, migrations: Optional[List[Migration]] = None):
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        self.logger = logging.getLogger(__name__)
+    
+    @property
+    def latest_version(self) -> int:
+        """最新的表结构版本"""
+        return self.migrations[-1].version if self.migrations else 0
+    
+    def _ensure_version_table(self, conn: sqlite3.Connection) -> None:
+        """创建版本记录表"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+    
+    def current_version(self, conn: sqlite3.Connection) -> int:
+        """当前数据库的表结构版本"""
+        self._ensure_version_table(conn)
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+        return row[0] or 0
+    
+    def pending(self, conn: sqlite3.Connection,
+                target_version: Optional[int] = None) -> List[Migration]:
+        """尚未执行的迁移"""
+        current = self.current_version(conn)
+        target = self.latest_version if target_version is None else target_version
+        return [m for m in self.migrations if current < m.version <= target]
+    
+    def migrate(self, conn: sqlite3.Connection,
+                target_version: Optional[int] = None) -> List[int]:
+        """执行迁移到目标版本，返回本次执行的版本号列表"""
+        applied = []
+        for migration in self.pending(conn, target_version):
+            # 每个迁移在独立事务中执行，失败时回滚该版本的全部修改
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for statement in migration.statements:
+                    conn.execute(statement)
+                conn.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                    (migration.version, migration.description)
+                )
+                conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                conn.execute('ROLLBACK')
+                self.logger.error(f"数据库迁移 v{migration.version} 失败: {e}")
+                raise
+            
+            applied.append(migration.version)
+            self.logger.info(f"数据库迁移 v{migration.version} 完成: {migration.description}")
+        
+        return applied
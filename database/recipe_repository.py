@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方仓储 - 从数据库批量加载完整的 Recipe 对象图（组成、材料、版本历史）
+"""
+
+import logging
+from typing import List, Dict, Optional, Iterable
+
+from database.database_manager import DatabaseManager, RECIPE_COLUMNS, MAX_IN_PARAMS
+from database.material_cache import MaterialCache, parse_datetime
+from models.recipe import Recipe, RecipeComposition, VersionHistory, ChangeType
+
+
+RECIPE_FIELDS = ['id'] + list(RECIPE_COLUMNS) + ['created_at', 'updated_at']
+
+
+class RecipeRepository:
+    """配方仓储类"""
+    
+    def __init__(self, db_manager: DatabaseManager,
+                 material_cache: Optional[MaterialCache] = None):
+        self.db_manager = db_manager
+        self.material_cache = material_cache or MaterialCache(db_manager)
+        self.logger = logging.getLogger(__name__)
+    
+    def get(self, recipe_id: int, include_history: bool = True) -> Optional[Recipe]:
+        """加载单个配方"""
+        recipes = self.get_many([recipe_id], include_history)
+        return recipes[0] if recipes else None
+    
+    def get_many(self, recipe_ids: Iterable[int], include_history: bool = True) -> List[Recipe]:
+        """批量加载配方，按传入顺序返回（忽略不存在的ID）
+        
+        每批最多 MAX_IN_PARAMS 个ID，每批固定执行三条查询：配方、组成、版本历史；
+        材料从 MaterialCache 中取得，缓存未命中的材料再用一条查询补齐
+        """
+        ids = list(dict.fromkeys(recipe_ids))
+        loaded: Dict[int, Recipe] = {}
+        for start in range(0, len(ids), MAX_IN_PARAMS):
+            loaded.update(self._load_chunk(ids[start:start + MAX_IN_PARAMS], include_history))
+        return [loaded[recipe_id] for recipe_id in ids if recipe_id in loaded]
+    
+    def get_children(self, parent_recipe_id: int, include_history: bool = False) -> List[Recipe]:
+        """加载某配方的全部子版本"""
+        rows = self.db_manager.execute_query(
+            'SELECT id FROM recipes WHERE parent_recipe_id = ? ORDER BY version',
+            (parent_recipe_id,), row_mode='tuple'
+        )
+        return self.get_many([row[0] for row in rows], include_history)
+    
+    def save(self, recipe: Recipe, created_by: Optional[str] = None) -> int:
+        """保存配方及其组成，返回配方ID"""
+        recipe_id = self.db_manager.save_recipe(recipe.to_dict(), created_by=created_by)
+        recipe.id = recipe_id
+        return recipe_id
+    
+    def _load_chunk(self, ids: List[int], include_history: bool) -> Dict[int, Recipe]:
+        """加载一批配方"""
+        placeholders = ', '.join('?' for _ in ids)
+        params = tuple(ids)
+        
+        recipes: Dict[int, Recipe] = {}
+        for row in self.db_manager.execute_query(
+            f"SELECT {', '.join(RECIPE_FIELDS)} FROM recipes WHERE id IN ({placeholders})",
+            params, row_mode='tuple'
+        ):
+            data = dict(zip(RECIPE_FIELDS, row))
+            data['created_at'] = parse_datetime(data['created_at'])
+            data['updated_at'] = parse_datetime(data['updated_at'])
+            recipes[data['id']] = Recipe(**data)
+        
+        if not recipes:
+            return recipes
+        
+        composition_rows = self.db_manager.execute_query(
+            f"""
+            SELECT id, recipe_id, material_id, percentage, weight_grams, created_at
+            FROM recipe_compositions
+            WHERE recipe_id IN ({placeholders})
+            ORDER BY recipe_id, id
+            """,
+            params, row_mode='tuple'
+        )
+        # 标识映射：同一材料在所有组成中共享一个对象
+        materials = self.material_cache.get_many(row[2] for row in composition_rows)
+        for row in composition_rows:
+            recipes[row[1]].compositions.append(RecipeComposition(
+                id=row[0],
+                recipe_id=row[1],
+                material_id=row[2],
+                percentage=row[3],
+                weight_grams=row[4] or 0.0,
+                created_at=parse_datetime(row[5]),
+                material=materials.get(row[2])
+            ))
+        
+        if include_history:
+            for row in self.db_manager.execute_query(
+                f"""
+                SELECT id, recipe_id, version, change_type, change_description, created_by, created_at
+                FROM version_history
+                WHERE recipe_id IN ({placeholders})
+                ORDER BY recipe_id, version, id
+                """,
+                params, row_mode='tuple'
+            ):
+                recipes[row[1]].version_history.append(VersionHistory(
+                    id=row[0],
+                    recipe_id=row[1],
+                    version=row[2],
+                    change_type=self._parse_change_type(row[3]),
+                    change_description=row[4],
+                    created_by=row[5],
+                    created_at=parse_datetime(row[6])
+                ))
+        
+        return recipes
+    
+    def _parse_change_type(self, value: str) -> ChangeType:
+        """解析变更类型，未知值按更新处理"""
+        try:
+            return ChangeType(value)
+        except ValueError:
+            self.logger.warning(f"未知的变更类型: {value}")
+            return ChangeType.UPDATED
@@ -627,6 +627,18 @@ ragrance_designer']
                     # 如果没有专门的加载方法，显示提示信息
                     QMessageBox.information(self, "提示", f"已切换到调香设计器\n配方名称: {recipe_data.get('name', '未知配方')}\n请手动加载配方数据")
                 
+                # 建立增量分析会话，设计器修改单个组成时只更新变化部分，不再整体重新分析
+                from services.recipe_analyzer import RecipeAnalyzer
+                from services.incremental_analyzer import IncrementalAnalysisSession
+                try:
+                    self.analysis_session = IncrementalAnalysisSession(RecipeAnalyzer(), recipe_data)
+                except Exception as e:
+                    # 分析会话只用于加速，建立失败时设计器照常编辑
+                    logger.warning(f"建立增量分析会话失败: {e}")
+                    self.analysis_session = None
+                if self.analysis_session is not None and hasattr(fragrance_designer, 'set_analysis_session'):
+                    fragrance_designer.set_analysis_session(self.analysis_session)
+                
                 # 更新状态栏
                 self.statusBar().showMessage(f"正在编辑配方: {recipe_data.get('name', '未知配方')}", 3000)
             else:
@@ -636,6 +648,17 @@ ragrance_designer']
             QMessageBox.warning(self, "错误", f"切换到调香设计器失败: {str(e)}")
             import traceback
             traceback.print_exc()
+    
+    def find_similar_recipes(self, recipe_id, k=20, metric='cosine'):
+        """查找与指定配方组成最相似的配方，返回 [(配方ID, 得分)]"""
+        if getattr(self, 'similarity_index', None) is None:
+            if self.db_manager is None:
+                return []
+            from services.similarity_index import SimilarityIndex
+            # 首次查询时建立索引，之后每次查询前增量同步变化的配方
+            self.similarity_index = SimilarityIndex(self.db_manager)
+            self.similarity_index.build()
+        return self.similarity_index.most_similar(recipe_id, k=k, metric=metric)
 
 
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式配方组成表 - 用 NumPy 数组保存大量配方的组成，供批量分析使用
+"""
+
+from array import array
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+import numpy as np
+
+from models.recipe import Recipe
+
+
+class CompositionTable:
+    """列式配方组成表
+    
+    所有配方的组成按配方顺序连续存放，第 i 个配方的组成位于
+    offsets[i]:offsets[i + 1] 区间（与 CSR 稀疏矩阵的行指针相同）；
+    没有组成的配方同样占一个下标（区间为空），与输入的配方顺序一一对应
+    """
+    
+    __slots__ = ('recipe_ids', 'offsets', 'material_ids', 'percentages', 'weights', '_index')
+    
+    def __init__(self, recipe_ids: np.ndarray, offsets: np.ndarray, material_ids: np.ndarray,
+                 percentages: np.ndarray, weights: np.ndarray):
+        self.recipe_ids = recipe_ids
+        self.offsets = offsets
+        self.material_ids = material_ids
+        self.percentages = percentages
+        self.weights = weights
+        self._index: Optional[Dict[int, int]] = None
+    
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, int, float, float]]) -> 'CompositionTable':
+        """由按配方ID分组排列的 (recipe_id, material_id, percentage, weight_grams) 行构建
+        
+        material_id 为 None 的行只登记配方本身（没有组成的配方），不产生组成行
+        """
+        # 先写入紧凑的 array 缓冲区，避免为每行创建 Python 对象列表
+        recipe_ids = array('q')
+        offsets = array('q', [0])
+        material_ids = array('q')
+        percentages = array('d')
+        weights = array('d')
+        
+        current = None
+        for recipe_id, material_id, percentage, weight in rows:
+            if recipe_id != current:
+                if current is not None:
+                    offsets.append(len(material_ids))
+                recipe_ids.append(recipe_id)
+                current = recipe_id
+            if material_id is None:
+                continue
+            material_ids.append(material_id)
+            percentages.append(percentage or 0.0)
+            weights.append(weight or 0.0)
+        if current is not None:
+            offsets.append(len(material_ids))
+        
+        return cls(
+            np.frombuffer(recipe_ids, dtype=np.int64).copy(),
+            np.frombuffer(offsets, dtype=np.int64).copy(),
+            np.frombuffer(material_ids, dtype=np.int64).copy(),
+            np.frombuffer(percentages, dtype=np.float64).copy(),
+            np.frombuffer(weights, dtype=np.float64).copy()
+        )
+    
+    @classmethod
+    def from_recipes(cls, recipes: Iterable[Recipe]) -> 'CompositionTable':
+        """由 Recipe 对象构建"""
+        return cls.from_rows(
+            row for recipe in recipes
+            for row in ([(recipe.id, comp.material_id, comp.percentage, comp.weight_grams)
+                         for comp in recipe.compositions] or [(recipe.id, None, None, None)])
+        )
+    
+    @classmethod
+    def from_database(cls, db_manager: Any, batch_size: int = 5000) -> 'CompositionTable':
+        """从数据库流式构建整个配方库的组成表（包括没有组成的配方）"""
+        rows = db_manager.iter_query(
+            'SELECT r.id, c.material_id, c.percentage, c.weight_grams '
+            'FROM recipes r LEFT JOIN recipe_compositions c ON c.recipe_id = r.id '
+            'ORDER BY r.id, c.id',
+            row_mode='tuple', batch_size=batch_size
+        )
+        return cls.from_rows(rows)
+    
+    def __len__(self) -> int:
+        """配方数量"""
+        return len(self.recipe_ids)
+    
+    @property
+    def row_count(self) -> int:
+        """组成行数"""
+        return len(self.material_ids)
+    
+    @property
+    def nbytes(self) -> int:
+        """数组占用的字节数"""
+        return sum(arr.nbytes for arr in (self.recipe_ids, self.offsets, self.material_ids,
+                                          self.percentages, self.weights))
+    
+    @property
+    def row_recipe_index(self) -> np.ndarray:
+        """每个组成行所属配方的下标"""
+        return np.repeat(np.arange(len(self.recipe_ids)), np.diff(self.offsets))
+    
+    def index_of(self, recipe_id: int) -> int:
+        """配方ID对应的下标"""
+        if self._index is None:
+            self._index = {int(rid): i for i, rid in enumerate(self.recipe_ids)}
+        return self._index[recipe_id]
+    
+    def compositions_for(self, recipe_id: int) -> Dict[str, np.ndarray]:
+        """某个配方的组成（数组视图，不复制数据）"""
+        i = self.index_of(recipe_id)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {
+            'material_ids': self.material_ids[start:end],
+            'percentages': self.percentages[start:end],
+            'weights': self.weights[start:end]
+        }
+    
+    def total_percentages(self) -> np.ndarray:
+        """每个配方的百分比合计"""
+        return np.bincount(self.row_recipe_index, weights=self.percentages,
+                           minlength=len(self.recipe_ids))
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        """转换为 (配方ID → 组成列表) 的普通字典列表，便于调试或导出"""
+        return [
+            {
+                'recipe_id': int(recipe_id),
+                'compositions': [
+                    {'material_id': int(m), 'percentage': float(p), 'weight_grams': float(w)}
+                    for m, p, w in zip(
+                        self.material_ids[self.offsets[i]:self.offsets[i + 1]],
+                        self.percentages[self.offsets[i]:self.offsets[i + 1]],
+                        self.weights[self.offsets[i]:self.offsets[i + 1]]
+                    )
+                ]
+            }
+            for i, recipe_id in enumerate(self.recipe_ids)
+        ]
@@ -4,12 +4,17 @@
 配方数据模型
 """
 
+import sys
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from enum import Enum
 
 
+# Python 3.10+ 使用 __slots__ 数据类，实例不再携带 __dict__，大批量加载时显著节省内存
+DATACLASS_OPTIONS: Dict[str, Any] = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
 class VersionType(Enum):
     """版本类型枚举"""
     MAJOR = "major"
@@ -26,7 +31,7 @@ class ChangeType(Enum):
     IMPORTED = "imported"
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Material:
     """材料数据类"""
     id: int
@@ -39,7 +44,7 @@ class Material:
     updated_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class RecipeComposition:
     """配方组成数据类"""
     id: int
@@ -51,7 +56,7 @@ class RecipeComposition:
     material: Optional[Material] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class VersionHistory:
     """版本历史数据类"""
     id: int
@@ -63,7 +68,7 @@ class VersionHistory:
     created_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class Recipe:
     """配方数据类"""
     id: int
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方分析结果缓存 - 以配方内容指纹为键缓存 AnalysisResult（进程内 LRU，可选持久化到 SQLite）
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from database.database_manager import MAX_IN_PARAMS
+from services.cost_engine import material_price_per_ml
+from services.recipe_analyzer import RecipeAnalyzer, AnalysisResult, ANALYSIS_VERSION
+
+
+def recipe_key(recipe_data: Dict[str, Any], analyzer: RecipeAnalyzer) -> Tuple:
+    """配方内容键：组成（材料名称、百分比、单价）、总体积以及分析器配置
+    
+    组成按原顺序参与比较，因为成本明细和警告的顺序与组成顺序一致
+    """
+    return (
+        ANALYSIS_VERSION,
+        analyzer.classifier.signature,
+        tuple(metric.name for metric in analyzer.metrics),
+        recipe_data.get('total_volume_ml', 30.0),
+        tuple((comp.get('material_name', ''), comp.get('percentage', 0.0), material_price_per_ml(comp))
+              for comp in recipe_data.get('compositions', []))
+    )
+
+
+def key_fingerprint(key: Tuple) -> str:
+    """内容键的稳定摘要，用作数据库缓存表的主键"""
+    # repr 对浮点数是精确的往返表示，且不依赖进程的哈希随机化，可以跨进程持久化
+    return hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def recipe_fingerprint(recipe_data: Dict[str, Any], analyzer: RecipeAnalyzer) -> str:
+    """配方内容指纹"""
+    return key_fingerprint(recipe_key(recipe_data, analyzer))
+
+
+class AnalysisCache:
+    """配方分析结果缓存类
+    
+    进程内缓存直接以内容键（元组）为键，只有访问数据库缓存表时才计算摘要；
+    组成、单价或体积变化后键随之改变，旧条目不会再被命中，在 LRU 中自然淘汰；
+    返回的结果是缓存条目的副本，调用方可以放心修改
+    """
+    
+    def __init__(self, analyzer: Optional[RecipeAnalyzer] = None, maxsize: int = 1024,
+                 db_manager: Optional[Any] = None):
+        self.analyzer = analyzer or RecipeAnalyzer()
+        self.maxsize = maxsize
+        # 设置后未命中的结果会写入 analysis_cache 表，进程重启后仍可复用
+        self.db_manager = db_manager
+        self.logger = logging.getLogger(__name__)
+        
+        self._lock = threading.RLock()
+        self._entries: 'OrderedDict[Tuple, AnalysisResult]' = OrderedDict()
+        
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+    
+    def analyze(self, recipe_data: Dict[str, Any]) -> AnalysisResult:
+        """分析配方，相同内容的配方直接返回缓存结果"""
+        recipe_data = self.analyzer._fill_material_data(recipe_data)
+        key = recipe_key(recipe_data, self.analyzer)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.copy()
+        return self.analyze_many([recipe_data])[0]
+    
+    def analyze_many(self, recipes: Iterable[Dict[str, Any]]) -> List[AnalysisResult]:
+        """批量分析配方，未命中的配方用一次批量分析完成"""
+        recipes = [self.analyzer._fill_material_data(recipe_data) for recipe_data in recipes]
+        keys = [recipe_key(recipe_data, self.analyzer) for recipe_data in recipes]
+        
+        results: Dict[Tuple, AnalysisResult] = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    results[key] = entry
+                    self.hits += 1
+        
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        if missing and self.db_manager is not None:
+            stored = self._load(missing)
+            self.db_hits += len(stored)
+            for key, result in stored.items():
+                self._put(key, result)
+            results.update(stored)
+            missing = [key for key in missing if key not in stored]
+        
+        if missing:
+            self.misses += len(missing)
+            missing_set = set(missing)
+            pending = {key: recipe_data for key, recipe_data in zip(keys, recipes) if key in missing_set}
+            computed = dict(zip(pending, self._compute(list(pending.values()))))
+            for key, result in computed.items():
+                self._put(key, result)
+            results.update(computed)
+            if self.db_manager is not None:
+                self._store(computed)
+        
+        return [results[key].copy() for key in keys]
+    
+    def invalidate(self, recipe_data: Optional[Dict[str, Any]] = None) -> None:
+        """失效单个配方的结果，不指定配方时清空缓存（包括数据库中的缓存表）"""
+        with self._lock:
+            if recipe_data is None:
+                self._entries.clear()
+            else:
+                key = recipe_key(self.analyzer._fill_material_data(recipe_data), self.analyzer)
+                self._entries.pop(key, None)
+        
+        if self.db_manager is not None:
+            if recipe_data is None:
+                self.db_manager.execute_update('DELETE FROM analysis_cache')
+            else:
+                self.db_manager.execute_update('DELETE FROM analysis_cache WHERE fingerprint = ?',
+                                               (key_fingerprint(key),))
+    
+    def prune(self, keep: int = 10000) -> int:
+        """只保留数据库缓存表中最新的 keep 条结果，返回删除的条数"""
+        if self.db_manager is None:
+            return 0
+        return self.db_manager.execute_update(
+            '''
+            DELETE FROM analysis_cache WHERE fingerprint NOT IN (
+                SELECT fingerprint FROM analysis_cache ORDER BY created_at DESC LIMIT ?
+            )
+            ''',
+            (keep,)
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存使用情况"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses
+            }
+    
+    def _compute(self, recipes: List[Dict[str, Any]]) -> List[AnalysisResult]:
+        """分析未命中的配方，多个配方时使用向量化批量路径"""
+        if len(recipes) == 1:
+            return [self.analyzer.analyze_recipe(recipes[0])]
+        return self.analyzer.analyze_many(recipes)
+    
+    def _put(self, key: Tuple, result: AnalysisResult) -> None:
+        """放入进程内缓存"""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def _load(self, keys: List[Tuple]) -> Dict[Tuple, AnalysisResult]:
+        """从数据库缓存表读取结果"""
+        by_fingerprint = {key_fingerprint(key): key for key in keys}
+        fingerprints = list(by_fingerprint)
+        loaded: Dict[Tuple, AnalysisResult] = {}
+        try:
+            for start in range(0, len(fingerprints), MAX_IN_PARAMS):
+                chunk = fingerprints[start:start + MAX_IN_PARAMS]
+                rows = self.db_manager.execute_query(
+                    f"SELECT fingerprint, result FROM analysis_cache "
+                    f"WHERE fingerprint IN ({', '.join('?' for _ in chunk)})",
+                    tuple(chunk), row_mode='tuple'
+                )
+                for fingerprint, result in rows:
+                    loaded[by_fingerprint[fingerprint]] = AnalysisResult.from_dict(json.loads(result))
+        except Exception as e:
+            self.logger.warning(f"读取分析结果缓存失败: {e}")
+        return loaded
+    
+    def _store(self, results: Dict[Tuple, AnalysisResult]) -> None:
+        """把新计算的结果写入数据库缓存表（无法序列化的结果只保留在进程内）"""
+        rows = []
+        for key, result in results.items():
+            try:
+                rows.append((key_fingerprint(key), json.dumps(result.to_dict(), ensure_ascii=False)))
+            except (TypeError, ValueError):
+                continue
+        if not rows:
+            return
+        try:
+            self.db_manager.execute_many(
+                'INSERT OR REPLACE INTO analysis_cache (fingerprint, result) VALUES (?, ?)', rows
+            )
+        except Exception as e:
+            self.logger.warning(f"写入分析结果缓存失败: {e}")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方分析指标 - RecipeAnalyzer 在一次遍历组成的过程中同时计算所有指标
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any
+
+from services.cost_engine import material_price_per_ml
+from services.flavor_classifier import MaterialClass, PERSISTENCE_BASE, PERSISTENCE_TOP
+
+
+class AnalysisMetric(ABC):
+    """分析指标接口
+    
+    每个配方分析时先调用 create_state 创建状态，每个组成调用一次 add，
+    全部组成处理完后由 finalize 得出指标值；指标之间共享同一次遍历和材料分类结果
+    """
+    
+    # 指标名称，自定义指标的结果保存在 AnalysisResult.extra_metrics[name]
+    name = ''
+    
+    # 是否实现了 remove；为 True 时增量分析会话增量维护该指标，否则每次变更后重新计算
+    supports_remove = False
+    
+    @abstractmethod
+    def create_state(self, recipe_data: Dict[str, Any]) -> Any:
+        """创建单个配方的累计状态"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def add(self, state: Any, comp: Dict[str, Any], material_class: MaterialClass) -> None:
+        """累计一个组成"""
+        raise NotImplementedError
+    
+    def remove(self, state: Any, comp: Dict[str, Any], material_class: MaterialClass) -> None:
+        """撤销一个组成的累计（可选，实现时同时把 supports_remove 设为 True）"""
+        raise NotImplementedError
+    
+    @abstractmethod
+    def finalize(self, state: Any, recipe_data: Dict[str, Any]) -> Any:
+        """由累计状态得出指标值"""
+        raise NotImplementedError
+
+
+class CoreState:
+    """内置指标的累计状态"""
+    
+    __slots__ = ('category_totals', 'base_percentage', 'top_percentage', 'total_volume',
+                 'total_cost', 'material_costs', 'total_percentage', 'material_warnings')
+    
+    def __init__(self, total_volume: Any):
+        self.category_totals = {'top': 0.0, 'middle': 0.0, 'base': 0.0, 'other': 0.0}
+        self.base_percentage = 0.0
+        self.top_percentage = 0.0
+        self.total_volume = total_volume
+        self.total_cost = 0.0
+        self.material_costs: List[Dict[str, Any]] = []
+        self.total_percentage = 0
+        self.material_warnings: List[str] = []
+
+
+class CoreMetric(AnalysisMetric):
+    """内置指标：香调平衡、持久性、成本和警告在同一个 add 中累计，避免每个组成多次方法调用"""
+    
+    name = 'core'
+    
+    def create_state(self, recipe_data: Dict[str, Any]) -> CoreState:
+        return CoreState(recipe_data.get('total_volume_ml', 30.0))
+    
+    def add(self, state: CoreState, comp: Dict[str, Any], material_class: MaterialClass) -> None:
+        percentage = comp.get('percentage', 0.0)
+        material_name = comp.get('material_name', '')
+        
+        # 香调平衡
+        state.category_totals[material_class.category] += percentage
+        
+        # 持久性：后调材料增加持久性，前调材料降低持久性
+        if material_class.persistence == PERSISTENCE_BASE:
+            state.base_percentage += percentage
+        elif material_class.persistence == PERSISTENCE_TOP:
+            state.top_percentage += percentage
+        
+        # 成本（成本占比要等总成本确定后在 cost_analysis 中计算）
+        cost = state.total_volume * percentage / 100.0 * material_price_per_ml(comp)
+        state.total_cost += cost
+        state.material_costs.append({
+            'material_name': material_name,
+            'percentage': percentage,
+            'cost': cost,
+            'cost_percentage': 0.0
+        })
+        
+        # 警告
+        state.total_percentage += percentage
+        if percentage > 20.0:
+            state.material_warnings.append(f"材料 {material_name} 比例过高: {percentage:.2f}%")
+        if percentage < 0.1:
+            state.material_warnings.append(f"材料 {material_name} 比例过低: {percentage:.2f}%")
+    
+    def finalize(self, state: CoreState, recipe_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'flavor_balance': self.flavor_balance(state),
+            'persistence_score': self.persistence_score(state),
+            'cost_analysis': self.cost_analysis(state),
+            'warnings': self.warnings(state)
+        }
+    
+    def flavor_balance(self, state: CoreState) -> Dict[str, float]:
+        """各香调分类占总百分比的比例"""
+        category_totals = dict(state.category_totals)
+        total_percentage = sum(category_totals.values())
+        if total_percentage > 0:
+            for category in category_totals:
+                category_totals[category] = (category_totals[category] / total_percentage) * 100
+        return category_totals
+    
+    def persistence_score(self, state: CoreState) -> float:
+        """持久性评分 (0-10)"""
+        persistence_score = min(10.0, (state.base_percentage - state.top_percentage * 0.5) / 10.0 + 5.0)
+        return max(0.0, min(10.0, persistence_score))
+    
+    def cost_analysis(self, state: CoreState) -> Dict[str, Any]:
+        """成本分析，各材料的成本占比按最终总成本计算"""
+        total_cost = state.total_cost
+        total_volume = state.total_volume
+        for item in state.material_costs:
+            item['cost_percentage'] = (item['cost'] / total_cost * 100) if total_cost > 0 else 0.0
+        return {
+            'total_cost': total_cost,
+            'cost_per_ml': total_cost / total_volume if total_volume > 0 else 0.0,
+            'material_costs': state.material_costs,
+            'total_volume_ml': total_volume
+        }
+    
+    def warnings(self, state: CoreState) -> List[str]:
+        """总百分比异常和单个材料比例过高/过低的警告"""
+        warnings = []
+        if abs(state.total_percentage - 100.0) > 0.1:
+            warnings.append(f"配方总百分比异常: {state.total_percentage:.2f}% (应为100%)")
+        warnings.extend(state.material_warnings)
+        return warnings
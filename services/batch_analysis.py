@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方库批量分析 - 把配方ID分片交给多个进程分析，结果按分片完成顺序流式返回
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
+
+from database.database_manager import DatabaseManager
+from services.flavor_classifier import FlavorClassifier
+from services.recipe_analyzer import RecipeAnalyzer, AnalysisResult
+
+
+# 进度回调：(已完成配方数, 配方总数)
+ProgressCallback = Callable[[int, int], None]
+
+# 工作进程内的数据库和分析器，由 _init_worker 创建，进程结束时释放
+_worker_db: Optional[Any] = None
+_worker_analyzer: Optional[RecipeAnalyzer] = None
+
+
+def _init_worker(db_path: str, flavor_keywords: Dict[str, str],
+                 persistence_keywords: Dict[str, List[str]], metrics: List[Any]) -> None:
+    """工作进程初始化：打开自己的只读数据库连接，按主进程的配置创建分析器"""
+    global _worker_db, _worker_analyzer
+    _worker_db = DatabaseManager(db_path, max_readers=1, read_only=True)
+    _worker_analyzer = RecipeAnalyzer(classifier=FlavorClassifier(flavor_keywords, persistence_keywords))
+    for metric in metrics:
+        _worker_analyzer.register_metric(metric)
+
+
+def _analyze_shard(recipe_ids: List[int], batch_size: int) -> List[Tuple[int, AnalysisResult]]:
+    """在工作进程中分析一个分片"""
+    return list(_worker_analyzer.analyze_library(_worker_db, recipe_ids, batch_size=batch_size))
+
+
+class BatchAnalysisRunner:
+    """配方库批量分析器
+    
+    每个工作进程持有一个只读数据库连接，按分片流式读取配方并使用向量化路径分析；
+    run() 是生成器，调用方（如 Qt 后台线程）边接收结果边更新进度，不必等待全部完成
+    """
+    
+    def __init__(self, db_path: str, analyzer: Optional[RecipeAnalyzer] = None,
+                 max_workers: Optional[int] = None, shard_size: int = 500, batch_size: int = 250):
+        self.db_path = db_path
+        self.analyzer = analyzer or RecipeAnalyzer()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shard_size = max(1, shard_size)
+        self.batch_size = max(1, batch_size)
+        self.logger = logging.getLogger(__name__)
+        self._cancelled = False
+    
+    def cancel(self) -> None:
+        """取消尚未开始的分片，已在运行的分片完成后 run() 结束"""
+        self._cancelled = True
+    
+    def run(self, recipe_ids: Optional[Iterable[int]] = None,
+            progress_callback: Optional[ProgressCallback] = None) -> Iterator[Tuple[int, AnalysisResult]]:
+        """分析配方（默认整个配方库），逐个产出 (配方ID, 分析结果)，顺序按分片完成顺序"""
+        self._cancelled = False
+        ids = list(recipe_ids) if recipe_ids is not None else self._all_recipe_ids()
+        total = len(ids)
+        shards = [ids[start:start + self.shard_size] for start in range(0, total, self.shard_size)]
+        done = 0
+        if progress_callback:
+            progress_callback(done, total)
+        
+        # 只有一个分片或只允许一个进程时，直接在当前进程中分析，省去进程启动开销
+        if len(shards) <= 1 or self.max_workers <= 1:
+            db_manager = DatabaseManager(self.db_path, max_readers=1, read_only=True)
+            try:
+                for shard in shards:
+                    if self._cancelled:
+                        break
+                    for item in self.analyzer.analyze_library(db_manager, shard, batch_size=self.batch_size):
+                        yield item
+                    done += len(shard)
+                    if progress_callback:
+                        progress_callback(done, total)
+            finally:
+                db_manager.close()
+            return
+        
+        classifier = self.analyzer.classifier
+        persistence_keywords = {'base': sorted(classifier.base_keywords),
+                                'top': sorted(classifier.top_keywords)}
+        executor = ProcessPoolExecutor(
+            max_workers=min(self.max_workers, len(shards)),
+            initializer=_init_worker,
+            initargs=(self.db_path, classifier.flavor_keywords, persistence_keywords, self.analyzer.metrics)
+        )
+        futures = {executor.submit(_analyze_shard, shard, self.batch_size): len(shard) for shard in shards}
+        try:
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    self.logger.error(f"配方分片分析失败: {e}")
+                    raise
+                for item in results:
+                    yield item
+                done += futures[future]
+                if progress_callback:
+                    progress_callback(done, total)
+                if self._cancelled:
+                    self.logger.info(f"批量分析已取消: 完成 {done}/{total}")
+                    break
+        finally:
+            # 提前结束（取消、出错或调用方停止迭代）时丢弃尚未开始的分片
+            # （shutdown 的 cancel_futures 参数需要 Python 3.9，这里逐个取消）
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    def run_all(self, recipe_ids: Optional[Iterable[int]] = None,
+                progress_callback: Optional[ProgressCallback] = None) -> Dict[int, AnalysisResult]:
+        """分析配方并返回 {配方ID: 分析结果}"""
+        return dict(self.run(recipe_ids, progress_callback))
+    
+    def _all_recipe_ids(self) -> List[int]:
+        """配方库中全部配方ID"""
+        db_manager = DatabaseManager(self.db_path, max_readers=1, read_only=True)
+        try:
+            return [row[0] for row in db_manager.execute_query('SELECT id FROM recipes ORDER BY id',
+                                                               row_mode='tuple')]
+        finally:
+            db_manager.close()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方文件批量导入 - 用线程池（或进程池）并行解析和验证目录中的配方JSON文件，按内容指纹去重，由单一写入方分批提交
+"""
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor,
+                                wait)
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable
+
+from utils.data_import_export import DataImportExport
+
+
+# 进度回调：(已处理文件数, 文件总数)
+ProgressCallback = Callable[[int, int], None]
+
+# 错误回调：(文件路径, 错误信息)
+ErrorCallback = Callable[[str, str], None]
+
+# 并行方式：thread - 线程池（默认，读取文件时释放 GIL），process - 进程池（解析大文件时使用）
+EXECUTOR_TYPES = ('thread', 'process')
+
+# 计算内容指纹时忽略的字段：来源站点的ID和时间戳不影响配方内容
+FINGERPRINT_IGNORED_FIELDS = ('id', 'parent_recipe_id', 'created_at', 'updated_at', 'version_history')
+FINGERPRINT_IGNORED_COMPOSITION_FIELDS = ('id', 'recipe_id', 'material_id')
+
+_parser = DataImportExport()
+
+
+def recipe_fingerprint(recipe_data: Dict[str, Any]) -> str:
+    """配方内容指纹：同一配方重复导出（导出时间、来源ID不同）得到相同的指纹"""
+    content = {key: value for key, value in recipe_data.items() if key not in FINGERPRINT_IGNORED_FIELDS}
+    content['compositions'] = [
+        {key: value for key, value in comp.items() if key not in FINGERPRINT_IGNORED_COMPOSITION_FIELDS}
+        for comp in recipe_data.get('compositions', [])
+    ]
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _parse_file(file_path: str, validate: bool) -> Tuple[str, Optional[Dict[str, Any]], Optional[str], str]:
+    """在工作线程/进程中解析并验证一个文件，返回 (指纹, 配方数据, 错误信息, 文件路径)"""
+    try:
+        recipe_data = _parser.parse_recipe_file(file_path)
+        if validate:
+            errors = _parser.validate_recipe_data(recipe_data)
+            if errors:
+                return '', None, '; '.join(errors), file_path
+        return recipe_fingerprint(recipe_data), recipe_data, None, file_path
+    except Exception as e:
+        return '', None, str(e), file_path
+
+
+@dataclass
+class DirectoryImportResult:
+    """目录导入结果数据类"""
+    total: int = 0                                                  # 文件总数
+    imported: int = 0                                               # 导入的配方数
+    duplicates: int = 0                                             # 内容重复而跳过的文件数
+    failed: int = 0                                                 # 解析、验证或写入失败的文件数
+    cancelled: bool = False                                         # 是否被取消
+    recipe_ids: List[int] = field(default_factory=list)             # 新配方ID
+    errors: List[Tuple[str, str]] = field(default_factory=list)     # [(文件路径, 错误信息)]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'recipe_ids': self.recipe_ids,
+            'errors': self.errors
+        }
+
+
+class DirectoryImportRunner:
+    """目录批量导入器
+    
+    工作线程只负责读取、解析和验证文件，数据库写入全部在调用 run() 的线程中完成（单一写入方），
+    每 batch_size 个配方一个事务；同时提交的文件数有上限，内存占用与目录大小无关。
+    进度和错误回调在调用 run() 的线程中触发，在 Qt 后台线程中运行时可直接转发为信号给进度对话框
+    """
+    
+    def __init__(self, db_manager: Any, max_workers: Optional[int] = None, batch_size: int = 200,
+                 executor: str = 'thread', validate: bool = True,
+                 create_missing_materials: bool = False):
+        if executor not in EXECUTOR_TYPES:
+            raise ValueError(f"不支持的并行方式: {executor}")
+        self.db_manager = db_manager
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.executor = executor
+        # 是否按 validate_recipe_data 检查配方（总百分比、单个比例），不通过的文件不导入
+        self.validate = validate
+        self.create_missing_materials = create_missing_materials
+        # 已导入配方的指纹，同一导入器多次导入时跨目录去重
+        self.fingerprints: Set[str] = set()
+        self.importer = DataImportExport()
+        self.logger = logging.getLogger(__name__)
+        self._cancelled = False
+    
+    def cancel(self) -> None:
+        """取消尚未开始的文件，已解析的配方写入后 run() 结束"""
+        self._cancelled = True
+    
+    def run(self, directory: str, pattern: str = '*.json', recursive: bool = False,
+            created_by: Optional[str] = None,
+            progress_callback: Optional[ProgressCallback] = None,
+            error_callback: Optional[ErrorCallback] = None) -> DirectoryImportResult:
+        """导入目录中匹配 pattern 的配方文件"""
+        self._cancelled = False
+        root = Path(directory)
+        files = sorted(str(path) for path in (root.rglob(pattern) if recursive else root.glob(pattern))
+                       if path.is_file())
+        result = DirectoryImportResult(total=len(files))
+        description = f"从 {root.name} 批量导入"
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        batch_fingerprints: Dict[str, str] = {}
+        done = 0
+        
+        def report_error(file_path: str, message: str) -> None:
+            result.failed += 1
+            result.errors.append((file_path, message))
+            if error_callback:
+                error_callback(file_path, message)
+        
+        def on_write_error(file_path: str, error: Exception) -> None:
+            # 写入失败的配方不算已导入，目录中内容相同的其他文件仍可导入
+            self.fingerprints.discard(batch_fingerprints[file_path])
+            report_error(file_path, f"写入失败: {error}")
+        
+        def flush() -> None:
+            if batch:
+                result.imported += self.importer.write_recipe_batch(
+                    self.db_manager, batch, created_by, description, self.create_missing_materials,
+                    on_write_error, result.recipe_ids
+                )
+                batch.clear()
+                batch_fingerprints.clear()
+        
+        if progress_callback:
+            progress_callback(done, result.total)
+        
+        pool_type = ProcessPoolExecutor if self.executor == 'process' else ThreadPoolExecutor
+        pool = pool_type(max_workers=self.max_workers)
+        # 同时提交的文件数上限：保持工作线程忙碌，又不会一次读入整个目录
+        window = self.max_workers * 4
+        queue = iter(files)
+        running: Set[Future] = set()
+        try:
+            while True:
+                while not self._cancelled and len(running) < window:
+                    file_path = next(queue, None)
+                    if file_path is None:
+                        break
+                    running.add(pool.submit(_parse_file, file_path, self.validate))
+                if not running:
+                    break
+                
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    fingerprint, recipe_data, error, file_path = future.result()
+                    done += 1
+                    if error is not None:
+                        report_error(file_path, error)
+                    elif fingerprint in self.fingerprints:
+                        result.duplicates += 1
+                    else:
+                        self.fingerprints.add(fingerprint)
+                        batch.append((file_path, recipe_data))
+                        batch_fingerprints[file_path] = fingerprint
+                    if progress_callback:
+                        progress_callback(done, result.total)
+                
+                if len(batch) >= self.batch_size:
+                    flush()
+            flush()
+        finally:
+            # 取消或出错时丢弃尚未开始的文件（shutdown 的 cancel_futures 参数需要 Python 3.9）
+            for future in running:
+                future.cancel()
+            pool.shutdown(wait=True)
+        
+        result.cancelled = self._cancelled
+        self.logger.info(
+            f"目录导入{'已取消' if result.cancelled else '完成'}: {directory} "
+            f"(成功 {result.imported}, 重复 {result.duplicates}, 失败 {result.failed}, 共 {result.total} 个文件)"
+        )
+        return result
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本计算引擎 - 两遍计算配方成本（先求总成本，再求各材料占比），支持按体积/重量配比、货币换算和批量生产规模
+"""
+
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple
+
+
+# 配比基准：volume - 百分比为体积比，批量单位为 ml；weight - 百分比为重量比，批量单位为 g
+PERCENTAGE_BASES = ('volume', 'weight')
+
+DEFAULT_CURRENCY = 'CNY'
+
+
+def material_price_per_ml(comp: Dict[str, Any]) -> float:
+    """组成材料的每毫升单价，所有成本计算（配方分析、批量分析、优化器和成本引擎）共用这一规则
+    
+    材料表只有 price_per_ml；组成中另外提供 price_per_g（按重量计价，如供应商报价）时优先使用，
+    按密度(g/ml，缺省为 1.0)换算为每毫升单价
+    """
+    price_per_g = comp.get('price_per_g')
+    if price_per_g is not None:
+        return price_per_g * (comp.get('density') or 1.0)
+    return comp.get('price_per_ml', 0.0) or 0.0
+
+
+class CostEngine:
+    """成本计算引擎
+    
+    材料单价按 material_price_per_ml 的规则确定，与 RecipeAnalyzer 的成本分析一致；
+    换算汇率表示 1 单位外币折合多少基准货币
+    """
+    
+    def __init__(self, currency: Optional[str] = None,
+                 exchange_rates: Optional[Dict[str, float]] = None,
+                 project_config: Optional[Any] = None):
+        if project_config is None and (currency is None or exchange_rates is None):
+            from config.project_config import get_config
+            project_config = get_config()
+        
+        self.currency = currency or project_config.get('analysis/currency', DEFAULT_CURRENCY)
+        if exchange_rates is None:
+            exchange_rates = project_config.get('analysis/exchange_rates', {})
+        self.exchange_rates = dict(exchange_rates)
+        self.exchange_rates[self.currency] = 1.0
+        self.logger = logging.getLogger(__name__)
+    
+    def convert(self, amount: Any, currency: Optional[str] = None) -> Any:
+        """把基准货币金额换算为指定货币（支持 NumPy 数组）"""
+        if currency is None or currency == self.currency:
+            return amount
+        rate = self.exchange_rates.get(currency)
+        if not rate:
+            raise ValueError(f"未配置货币汇率: {currency}")
+        return amount / rate
+    
+    def unit_price(self, comp: Dict[str, Any]) -> Tuple[float, float]:
+        """返回组成材料的 (每毫升单价, 密度)"""
+        return material_price_per_ml(comp), comp.get('density') or 1.0
+    
+    def calculate(self, recipe_data: Dict[str, Any], batch_size: Optional[float] = None,
+                  basis: str = 'volume', currency: Optional[str] = None) -> Dict[str, Any]:
+        """计算单个配方的成本
+        
+        batch_size 为批量生产规模（volume 基准为 ml，weight 基准为 g），默认使用配方的 total_volume_ml；
+        第一遍计算各材料成本和总成本，第二遍按最终总成本计算各材料的成本占比，结果与组成顺序无关
+        """
+        self._check_basis(basis)
+        if batch_size is None:
+            batch_size = recipe_data.get('total_volume_ml', 30.0)
+        
+        material_costs = []
+        total_cost = 0.0
+        total_volume = 0.0
+        total_weight = 0.0
+        for comp in recipe_data.get('compositions', []):
+            percentage = comp.get('percentage', 0.0)
+            price_per_ml, density = self.unit_price(comp)
+            if basis == 'volume':
+                volume_ml = batch_size * percentage / 100.0
+                weight_grams = volume_ml * density
+            else:
+                weight_grams = batch_size * percentage / 100.0
+                volume_ml = weight_grams / density
+            cost = volume_ml * price_per_ml
+            total_cost += cost
+            total_volume += volume_ml
+            total_weight += weight_grams
+            
+            material_costs.append({
+                'material_name': comp.get('material_name', ''),
+                'percentage': percentage,
+                'volume_ml': volume_ml,
+                'weight_grams': weight_grams,
+                'cost': self.convert(cost, currency)
+            })
+        
+        converted_total = self.convert(total_cost, currency)
+        for item in material_costs:
+            item['cost_percentage'] = item['cost'] / converted_total * 100 if total_cost > 0 else 0.0
+        
+        # 批量规模所在的维度以批量为准，另一维度为各材料换算结果之和
+        if basis == 'volume':
+            total_volume = batch_size
+        else:
+            total_weight = batch_size
+        return {
+            'total_cost': converted_total,
+            'cost_per_ml': converted_total / total_volume if total_volume > 0 else 0.0,
+            'cost_per_g': converted_total / total_weight if total_weight > 0 else 0.0,
+            'material_costs': material_costs,
+            'total_volume_ml': total_volume,
+            'total_weight_g': total_weight,
+            'batch_size': batch_size,
+            'basis': basis,
+            'currency': currency or self.currency
+        }
+    
+    def unit_costs(self, recipes: Iterable[Dict[str, Any]], basis: str = 'volume') -> Any:
+        """向量化计算每个配方每单位批量（1 ml 或 1 g）的成本，返回 NumPy 数组（基准货币）"""
+        # NumPy 只在批量计算时需要，避免拖慢模块导入
+        import numpy as np
+        
+        self._check_basis(basis)
+        recipes = list(recipes)
+        counts: List[int] = []
+        percentages: List[float] = []
+        prices: List[float] = []
+        densities: List[float] = []
+        for recipe_data in recipes:
+            compositions = recipe_data.get('compositions', [])
+            counts.append(len(compositions))
+            for comp in compositions:
+                price_per_ml, density = self.unit_price(comp)
+                percentages.append(comp.get('percentage', 0.0))
+                prices.append(price_per_ml)
+                densities.append(density)
+        
+        pct = np.array(percentages, dtype=np.float64)
+        price = np.array(prices, dtype=np.float64)
+        row_recipe = np.repeat(np.arange(len(recipes)), counts)
+        if basis == 'volume':
+            row_cost = pct / 100.0 * price
+        else:
+            row_cost = pct / 100.0 / np.array(densities, dtype=np.float64) * price
+        return np.bincount(row_recipe, weights=row_cost, minlength=len(recipes))
+    
+    def batch_costs(self, recipes: Iterable[Dict[str, Any]], batch_sizes: Sequence[float],
+                    basis: str = 'volume', currency: Optional[str] = None) -> Any:
+        """向量化计算多个配方在多个生产规模下的总成本，返回 (配方数, 规模数) 的 NumPy 数组
+        
+        例如 batch_sizes=[1000, 100000] 得到每个配方 1 L 和 100 L 的生产成本
+        """
+        import numpy as np
+        
+        unit = self.unit_costs(recipes, basis)
+        return self.convert(np.outer(unit, np.asarray(batch_sizes, dtype=np.float64)), currency)
+    
+    def _check_basis(self, basis: str) -> None:
+        """检查配比基准"""
+        if basis not in PERCENTAGE_BASES:
+            raise ValueError(f"不支持的配比基准: {basis}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+香调关键词分类器 - 把全部关键词编译为一个正则表达式，材料名称的分类结果按名称缓存
+"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, NamedTuple, Iterable
+
+
+# 关键词 → 香调分类（值与 FlavorCategory 一致），靠前的关键词优先
+DEFAULT_FLAVOR_KEYWORDS: Dict[str, str] = {
+    'citrus': 'top',
+    'fruit': 'top',
+    'berry': 'top',
+    'mint': 'top',
+    'floral': 'middle',
+    'spice': 'middle',
+    'nut': 'middle',
+    'cream': 'middle',
+    'tobacco': 'base',
+    'vanilla': 'base',
+    'caramel': 'base',
+    'chocolate': 'base'
+}
+
+# 影响持久性的关键词：后调材料增加持久性，前调材料降低持久性
+DEFAULT_PERSISTENCE_KEYWORDS: Dict[str, List[str]] = {
+    'base': ['tobacco', 'vanilla', 'caramel', 'chocolate'],
+    'top': ['citrus', 'mint']
+}
+
+OTHER_CATEGORY = 'other'
+
+# 有效的香调分类值（与 FlavorCategory 一致）
+FLAVOR_CATEGORIES = ('top', 'middle', 'base', OTHER_CATEGORY)
+
+# 持久性分类编码
+PERSISTENCE_BASE = 1
+PERSISTENCE_TOP = -1
+PERSISTENCE_NEUTRAL = 0
+
+
+class MaterialClass(NamedTuple):
+    """材料分类结果"""
+    category: str      # 香调分类值
+    persistence: int   # 持久性分类编码
+
+
+class FlavorClassifier:
+    """香调关键词分类器
+    
+    所有关键词按长度降序组成一个前瞻匹配的正则表达式，一次扫描即可找出名称中出现的全部关键词；
+    同一位置上较短的关键词必然是最长匹配的前缀，通过预先计算的前缀表补齐
+    """
+    
+    def __init__(self, flavor_keywords: Optional[Dict[str, str]] = None,
+                 persistence_keywords: Optional[Dict[str, List[str]]] = None,
+                 cache_size: int = 8192):
+        flavor_keywords = DEFAULT_FLAVOR_KEYWORDS if flavor_keywords is None else flavor_keywords
+        persistence_keywords = (DEFAULT_PERSISTENCE_KEYWORDS if persistence_keywords is None
+                                else persistence_keywords)
+        
+        self.logger = logging.getLogger(__name__)
+        # 关键词表来自配置文件，未知分类的关键词记录后跳过，避免 FlavorCategory 和 CoreState 出错
+        self.flavor_keywords: Dict[str, str] = {}
+        for keyword, category in flavor_keywords.items():
+            if category not in FLAVOR_CATEGORIES:
+                self.logger.warning(f"忽略未知香调分类的关键词: {keyword} -> {category}")
+                continue
+            self.flavor_keywords[keyword.lower()] = category
+        self.base_keywords = frozenset(k.lower() for k in persistence_keywords.get('base', []))
+        self.top_keywords = frozenset(k.lower() for k in persistence_keywords.get('top', []))
+        
+        # 香调关键词的优先级（字典顺序）
+        self._priority = {keyword: i for i, keyword in enumerate(self.flavor_keywords)}
+        
+        keywords = sorted(set(self.flavor_keywords) | self.base_keywords | self.top_keywords,
+                          key=len, reverse=True)
+        keywords = [k for k in keywords if k]
+        self._prefixes = {
+            keyword: [other for other in keywords if keyword.startswith(other)]
+            for keyword in keywords
+        }
+        self._pattern = (re.compile('(?=(' + '|'.join(map(re.escape, keywords)) + '))')
+                         if keywords else None)
+        
+        self._signature = repr((list(self.flavor_keywords.items()),
+                                sorted(self.base_keywords), sorted(self.top_keywords)))
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+    
+    @classmethod
+    def from_config(cls, project_config: Any) -> 'FlavorClassifier':
+        """从 ProjectConfig 的 analysis/flavor_keywords 与 analysis/persistence_keywords 创建"""
+        return cls(
+            project_config.get('analysis/flavor_keywords', DEFAULT_FLAVOR_KEYWORDS),
+            project_config.get('analysis/persistence_keywords', DEFAULT_PERSISTENCE_KEYWORDS)
+        )
+    
+    @property
+    def signature(self) -> str:
+        """关键词配置的标识，配置不同的分类器给出不同结果"""
+        return self._signature
+    
+    def matched_keywords(self, material_name: str) -> List[str]:
+        """名称中出现的全部关键词"""
+        if self._pattern is None:
+            return []
+        found = set()
+        for match in self._pattern.finditer(material_name.lower()):
+            found.update(self._prefixes[match.group(1)])
+        return list(found)
+    
+    def _classify(self, material_name: str) -> MaterialClass:
+        """分类单个材料名称（未缓存）"""
+        found = self.matched_keywords(material_name)
+        
+        category = OTHER_CATEGORY
+        flavor_matches = [keyword for keyword in found if keyword in self._priority]
+        if flavor_matches:
+            category = self.flavor_keywords[min(flavor_matches, key=self._priority.__getitem__)]
+        
+        if any(keyword in self.base_keywords for keyword in found):
+            persistence = PERSISTENCE_BASE
+        elif any(keyword in self.top_keywords for keyword in found):
+            persistence = PERSISTENCE_TOP
+        else:
+            persistence = PERSISTENCE_NEUTRAL
+        
+        return MaterialClass(category, persistence)
+    
+    def classify_many(self, material_names: Iterable[str]) -> List[MaterialClass]:
+        """批量分类"""
+        classify = self.classify
+        return [classify(name) for name in material_names]
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方优化服务 - 用线性规划求解新的配方百分比，使香调平衡和持久性达到目标并使成本最低
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple, Union
+
+import numpy as np
+from scipy.optimize import linprog
+
+from services.cost_engine import material_price_per_ml
+from services.flavor_classifier import PERSISTENCE_BASE, PERSISTENCE_TOP
+from services.incremental_analyzer import composition_key
+from services.recipe_analyzer import RecipeAnalyzer, AnalysisResult
+
+
+# 目标：单个数值（配合 tolerance）或 (下限, 上限) 区间
+Target = Union[float, Tuple[float, float]]
+
+# 默认目标与 RecipeAnalyzer._generate_recommendations 的判断标准一致
+DEFAULT_BALANCE_TARGETS: Dict[str, Target] = {
+    'top': (0.0, 40.0),
+    'middle': (20.0, 100.0),
+    'base': (15.0, 100.0)
+}
+DEFAULT_PERSISTENCE_TARGET: Target = (5.0, 8.0)
+
+# 单个材料的比例范围与 CoreMetric 的比例过低/过高警告一致
+DEFAULT_MIN_PERCENTAGE = 0.1
+DEFAULT_MAX_PERCENTAGE = 20.0
+
+# 求解时目标区间向内收紧的余量（百分点）：线性规划的最优解落在区间端点上，
+# 求解器容差和第二步允许的偏差会让结果略微越界（如前调 40.0000001%），分析时仍判为未达标
+GOAL_MARGIN = 1e-6
+
+
+@dataclass
+class OptimizationResult:
+    """配方优化结果数据类"""
+    success: bool                          # 是否求得可行解
+    message: str                           # 求解器状态说明
+    compositions: List[Dict[str, Any]]     # 优化后的组成（百分比已更新）
+    target_deviation: float = 0.0          # 未能达到目标的偏差合计（百分点），0 表示全部达到
+    original_cost: float = 0.0             # 优化前总成本
+    total_cost: float = 0.0                # 优化后总成本
+    analysis: Optional[AnalysisResult] = None  # 优化后配方的分析结果
+    percentages: List[float] = field(default_factory=list)  # 优化后的百分比（与组成顺序一致）
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'success': self.success,
+            'message': self.message,
+            'compositions': self.compositions,
+            'target_deviation': self.target_deviation,
+            'original_cost': self.original_cost,
+            'total_cost': self.total_cost,
+            'analysis': self.analysis.to_dict() if self.analysis else None,
+            'percentages': self.percentages
+        }
+
+
+class FormulaOptimizer:
+    """配方优化器
+    
+    总百分比固定为 100% 时，各香调占比就是该香调材料百分比之和，持久性评分也是百分比的线性函数，
+    因此问题是一个小型线性规划，用 HiGHS 求解：
+    第一步使目标偏差最小（目标可达时为 0），第二步在偏差不增加的前提下使成本最低，
+    并以 change_weight 为权重惩罚相对原配方的改动量，成本相同的方案中选择改动最小的
+    """
+    
+    def __init__(self, analyzer: Optional[RecipeAnalyzer] = None,
+                 min_percentage: float = DEFAULT_MIN_PERCENTAGE,
+                 max_percentage: float = DEFAULT_MAX_PERCENTAGE):
+        self.analyzer = analyzer or RecipeAnalyzer()
+        self.min_percentage = min_percentage
+        self.max_percentage = max_percentage
+        self.logger = logging.getLogger(__name__)
+    
+    def optimize(self, recipe_data: Dict[str, Any],
+                 balance_targets: Optional[Dict[str, Target]] = None,
+                 persistence_target: Optional[Target] = None,
+                 tolerance: float = 0.0,
+                 bounds: Optional[Dict[Any, Tuple[float, float]]] = None,
+                 change_weight: float = 1e-3) -> OptimizationResult:
+        """优化配方百分比
+        
+        balance_targets 为 {香调分类: 目标占比}，persistence_target 为目标持久性评分(0-10)，
+        数值目标允许 ±tolerance 的偏差；bounds 按组成标识（材料ID或名称）覆盖单个材料的比例范围，
+        上下限相同即锁定该材料
+        """
+        try:
+            recipe_data = self.analyzer._fill_material_data(recipe_data)
+            compositions = recipe_data.get('compositions', [])
+            if not compositions:
+                raise ValueError("配方没有组成，无法优化")
+            if balance_targets is None:
+                balance_targets = DEFAULT_BALANCE_TARGETS
+            if persistence_target is None:
+                persistence_target = DEFAULT_PERSISTENCE_TARGET
+            
+            count = len(compositions)
+            total_volume = recipe_data.get('total_volume_ml', 30.0)
+            original = np.array([comp.get('percentage', 0.0) for comp in compositions], dtype=np.float64)
+            # 每个百分点的成本
+            unit_cost = np.array([total_volume / 100.0 * material_price_per_ml(comp)
+                                  for comp in compositions], dtype=np.float64)
+            
+            # 目标约束的行：(系数, 下限, 上限)，都以百分点为单位
+            classes = [self.analyzer.classifier.classify(comp.get('material_name', '')) for comp in compositions]
+            goals = []
+            for category, target in balance_targets.items():
+                row = np.array([1.0 if cls.category == category else 0.0 for cls in classes])
+                low, high = self._interval(target, tolerance)
+                goals.append((row, low, high))
+            
+            # 持久性评分 = (后调百分比 - 0.5 * 前调百分比) / 10 + 5，再截断到 0-10
+            row = np.array([1.0 if cls.persistence == PERSISTENCE_BASE
+                            else -0.5 if cls.persistence == PERSISTENCE_TOP else 0.0 for cls in classes])
+            low, high = self._interval(persistence_target, tolerance)
+            goals.append((row,
+                          (low - 5.0) * 10.0 if low > 0.0 else None,
+                          (high - 5.0) * 10.0 if high < 10.0 else None))
+            
+            # 变量: 百分比 x (count) | 目标偏差 d (len(goals)) | 改动量 u (count)
+            goal_count = len(goals)
+            size = 2 * count + goal_count
+            x_bounds = self._bounds(compositions, bounds)
+            variable_bounds = x_bounds + [(0.0, None)] * (goal_count + count)
+            
+            a_eq = np.zeros((1, size))
+            a_eq[0, :count] = 1.0
+            b_eq = np.array([100.0])
+            
+            # d >= row·x - 上限, d >= 下限 - row·x
+            goal_rows: List[np.ndarray] = []
+            b_ub: List[float] = []
+            for i, (row, low, high) in enumerate(goals):
+                if low is None or high is None or high - low > 2 * GOAL_MARGIN:
+                    low = None if low is None else low + GOAL_MARGIN
+                    high = None if high is None else high - GOAL_MARGIN
+                deviation = np.zeros(goal_count)
+                deviation[i] = -1.0
+                if high is not None:
+                    goal_rows.append(np.concatenate([row, deviation, np.zeros(count)]))
+                    b_ub.append(high)
+                if low is not None:
+                    goal_rows.append(np.concatenate([-row, deviation, np.zeros(count)]))
+                    b_ub.append(-low)
+            
+            # u >= x - 原百分比, u >= 原百分比 - x
+            identity = np.eye(count)
+            no_goals = np.zeros((count, goal_count))
+            a_ub = np.vstack(goal_rows + [np.hstack([identity, no_goals, -identity]),
+                                          np.hstack([-identity, no_goals, -identity])])
+            b_ub = np.concatenate([b_ub, original, -original])
+            
+            # 第一步：目标偏差最小
+            deviation_cost = np.concatenate([np.zeros(count), np.ones(goal_count), np.zeros(count)])
+            first = linprog(deviation_cost, A_ub=a_ub, b_ub=b_ub,
+                            A_eq=a_eq, b_eq=b_eq, bounds=variable_bounds, method='highs')
+            if first.status != 0:
+                self.logger.warning(f"配方优化无可行解: {first.message}")
+                return OptimizationResult(success=False, message=first.message,
+                                          compositions=[dict(comp) for comp in compositions],
+                                          original_cost=float(unit_cost @ original),
+                                          total_cost=float(unit_cost @ original))
+            
+            # 第二步：偏差不超过第一步的最优值，成本最低（兼顾改动量）
+            a_ub = np.vstack([a_ub, deviation_cost])
+            b_ub = np.append(b_ub, first.fun + 1e-7)
+            objective = np.concatenate([unit_cost, np.zeros(goal_count), np.full(count, change_weight)])
+            second = linprog(objective, A_ub=a_ub, b_ub=b_ub,
+                             A_eq=a_eq, b_eq=b_eq, bounds=variable_bounds, method='highs')
+            solution = second if second.status == 0 else first
+            
+            # 截断到各材料的比例范围内，消除求解器容差造成的微小越界
+            lower, upper = zip(*x_bounds)
+            percentages = [float(value) for value in np.clip(solution.x[:count], lower, upper)]
+            optimized = [dict(comp, percentage=percentage) for comp, percentage in zip(compositions, percentages)]
+            analysis = self.analyzer.analyze_recipe(dict(recipe_data, compositions=optimized))
+            return OptimizationResult(
+                success=True,
+                message=solution.message,
+                compositions=optimized,
+                target_deviation=self._deviation(goals, np.array(percentages)),
+                original_cost=float(unit_cost @ original),
+                total_cost=analysis.cost_analysis['total_cost'],
+                analysis=analysis,
+                percentages=percentages
+            )
+            
+        except Exception as e:
+            self.logger.error(f"配方优化错误: {e}")
+            raise
+    
+    @staticmethod
+    def _deviation(goals: List[Tuple[np.ndarray, Optional[float], Optional[float]]],
+                   percentages: np.ndarray) -> float:
+        """优化结果相对原目标区间（未收紧）的偏差合计，小于收紧余量的视为 0"""
+        deviation = 0.0
+        for row, low, high in goals:
+            value = float(row @ percentages)
+            if high is not None:
+                deviation += max(0.0, value - high)
+            if low is not None:
+                deviation += max(0.0, low - value)
+        return deviation if deviation > GOAL_MARGIN else 0.0
+    
+    def _bounds(self, compositions: List[Dict[str, Any]],
+                bounds: Optional[Dict[Any, Tuple[float, float]]]) -> List[Tuple[float, float]]:
+        """各材料的比例范围"""
+        default = (self.min_percentage, self.max_percentage)
+        if not bounds:
+            return [default] * len(compositions)
+        return [bounds.get(composition_key(comp), default) for comp in compositions]
+    
+    @staticmethod
+    def _interval(target: Target, tolerance: float) -> Tuple[float, float]:
+        """把目标统一为 (下限, 上限)"""
+        if isinstance(target, (tuple, list)):
+            return float(target[0]), float(target[1])
+        return float(target) - tolerance, float(target) + tolerance
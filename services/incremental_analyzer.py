@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量配方分析 - 在设计器中逐个修改组成时，只按变化的组成更新香调、持久性、成本和警告的累计值
+"""
+
+import itertools
+import logging
+from typing import Dict, List, Any, Optional
+
+from services.analysis_metrics import CoreState
+from services.cost_engine import material_price_per_ml
+from services.flavor_classifier import MaterialClass, PERSISTENCE_BASE, PERSISTENCE_TOP
+from services.recipe_analyzer import RecipeAnalyzer, AnalysisResult
+
+
+def composition_key(comp: Dict[str, Any]) -> Any:
+    """组成在会话中的标识：优先使用材料ID，否则使用材料名称"""
+    material_id = comp.get('material_id')
+    return material_id if material_id is not None else comp.get('material_name', '')
+
+
+class IncrementalAnalysisSession:
+    """增量分析会话
+    
+    每次添加、删除或修改一个组成只更新对应的累计值(O(1))；
+    生成结果时香调平衡、持久性和建议直接由累计值得出，只有逐材料的成本和警告列表需要按组成顺序输出。
+    组成在会话内部按生成的句柄保存，载入的配方可以包含重复材料或没有ID和名称的组成；
+    对外仍按 composition_key 指定组成，该键对应多个组成时无法按键修改或删除
+    """
+    
+    def __init__(self, analyzer: Optional[RecipeAnalyzer] = None,
+                 recipe_data: Optional[Dict[str, Any]] = None, resync_interval: int = 1000):
+        self.analyzer = analyzer or RecipeAnalyzer()
+        # 每累计多少次变更从头重算一次，消除反复加减带来的浮点误差
+        self.resync_interval = resync_interval
+        self.logger = logging.getLogger(__name__)
+        self.reset(recipe_data or {})
+    
+    def reset(self, recipe_data: Dict[str, Any]) -> AnalysisResult:
+        """由完整配方重新建立累计状态"""
+        recipe_data = self.analyzer._fill_material_data(recipe_data)
+        self.recipe_data = {key: value for key, value in recipe_data.items() if key != 'compositions'}
+        
+        self._state = CoreState(recipe_data.get('total_volume_ml', 30.0))
+        self._next_handle = itertools.count()
+        self._compositions: Dict[int, Dict[str, Any]] = {}
+        # composition_key -> 句柄列表（按添加顺序）
+        self._handles: Dict[Any, List[int]] = {}
+        self._classes: Dict[int, MaterialClass] = {}
+        self._costs: Dict[int, float] = {}
+        # 各累计值包含的组成数量，降为 0 时把累计值恢复为精确的 0；
+        # 香调分类和持久性分类都有 'top'/'base'，键分别为 ('category', 分类) 和 ('persistence', 编码)
+        self._counts: Dict[Any, int] = {}
+        self._changes = 0
+        
+        # 实现了 remove 的自定义指标增量维护，其余在生成结果时重新计算
+        self._metric_states = [(metric, metric.create_state(recipe_data))
+                               for metric in self.analyzer.metrics if metric.supports_remove]
+        
+        for comp in recipe_data.get('compositions', []):
+            self._insert(comp)
+        return self.result()
+    
+    @property
+    def compositions(self) -> List[Dict[str, Any]]:
+        """当前组成（按添加顺序）"""
+        return list(self._compositions.values())
+    
+    def to_recipe_data(self) -> Dict[str, Any]:
+        """当前配方数据"""
+        return dict(self.recipe_data, compositions=self.compositions)
+    
+    def add_composition(self, comp: Dict[str, Any]) -> AnalysisResult:
+        """添加组成"""
+        comp = self._fill(comp)
+        key = composition_key(comp)
+        if key in self._handles:
+            raise ValueError(f"组成已存在: {key}")
+        self._insert(comp)
+        return self._changed()
+    
+    def remove_composition(self, key: Any) -> AnalysisResult:
+        """删除组成（key 为材料ID或材料名称）"""
+        handle = self._resolve(key)
+        self._retract(handle)
+        self._unindex(key, handle)
+        del self._compositions[handle]
+        return self._changed()
+    
+    def update_composition(self, key: Any, **changes: Any) -> AnalysisResult:
+        """修改组成的字段（如 percentage），组成保持原来的位置；更换材料时组成改用新材料的键"""
+        handle = self._resolve(key)
+        comp = dict(self._compositions[handle], **changes)
+        if 'material_id' in changes:
+            # 更换材料时重新补齐名称、单价和密度
+            for field_name in ('material_name', 'price_per_ml', 'density'):
+                if field_name not in changes:
+                    comp.pop(field_name, None)
+            comp = self._fill(comp)
+        new_key = composition_key(comp)
+        if new_key != key and new_key in self._handles:
+            raise ValueError(f"组成已存在: {new_key}")
+        
+        self._retract(handle)
+        if new_key != key:
+            self._unindex(key, handle)
+            self._handles[new_key] = [handle]
+        self._compositions[handle] = comp
+        self._apply(handle, comp)
+        return self._changed()
+    
+    def result(self) -> AnalysisResult:
+        """当前分析结果，与对 to_recipe_data() 调用 analyze_recipe 的结果一致（允许浮点舍入差异）"""
+        core = self.analyzer.core_metric
+        state = self._state
+        
+        material_costs = []
+        material_warnings = []
+        total_cost = 0.0
+        total_percentage = 0
+        for handle, comp in self._compositions.items():
+            percentage = comp.get('percentage', 0.0)
+            material_name = comp.get('material_name', '')
+            cost = self._costs[handle]
+            total_cost += cost
+            total_percentage += percentage
+            # 成本占比由 core.cost_analysis 按总成本计算
+            material_costs.append({
+                'material_name': material_name,
+                'percentage': percentage,
+                'cost': cost,
+                'cost_percentage': 0.0
+            })
+            if percentage > 20.0:
+                material_warnings.append(f"材料 {material_name} 比例过高: {percentage:.2f}%")
+            if percentage < 0.1:
+                material_warnings.append(f"材料 {material_name} 比例过低: {percentage:.2f}%")
+        # 输出明细时已按组成顺序重新求和，总成本和总百分比直接采用该值，不受增量加减的舍入误差影响
+        state.total_cost = total_cost
+        state.total_percentage = total_percentage
+        state.material_costs = material_costs
+        state.material_warnings = material_warnings
+        
+        flavor_balance = core.flavor_balance(state)
+        persistence_score = core.persistence_score(state)
+        
+        extra_metrics = {metric.name: metric.finalize(metric_state, self.recipe_data)
+                         for metric, metric_state in self._metric_states}
+        recompute = [metric for metric in self.analyzer.metrics if not metric.supports_remove]
+        if recompute:
+            extra_metrics.update(self.analyzer._run_metrics(self.to_recipe_data(), recompute))
+        
+        return AnalysisResult(
+            flavor_balance=flavor_balance,
+            persistence_score=persistence_score,
+            cost_analysis=core.cost_analysis(state),
+            recommendations=self.analyzer._generate_recommendations(flavor_balance, persistence_score),
+            warnings=core.warnings(state),
+            extra_metrics=extra_metrics
+        )
+    
+    def _fill(self, comp: Dict[str, Any]) -> Dict[str, Any]:
+        """从材料缓存补齐单个组成"""
+        return self.analyzer._fill_material_data({'compositions': [comp]})['compositions'][0]
+    
+    def _insert(self, comp: Dict[str, Any]) -> None:
+        """为组成分配句柄并计入累计值"""
+        handle = next(self._next_handle)
+        self._compositions[handle] = comp
+        self._handles.setdefault(composition_key(comp), []).append(handle)
+        self._apply(handle, comp)
+    
+    def _resolve(self, key: Any) -> int:
+        """由材料ID或材料名称找到组成的句柄"""
+        handles = self._handles.get(key)
+        if not handles:
+            raise KeyError(key)
+        if len(handles) > 1:
+            raise ValueError(f"组成重复，无法按键确定: {key}")
+        return handles[0]
+    
+    def _unindex(self, key: Any, handle: int) -> None:
+        """从键索引中移除句柄"""
+        handles = self._handles[key]
+        handles.remove(handle)
+        if not handles:
+            del self._handles[key]
+    
+    def _apply(self, handle: int, comp: Dict[str, Any]) -> None:
+        """把一个组成计入累计值"""
+        material_class = self.analyzer.classifier.classify(comp.get('material_name', ''))
+        self._classes[handle] = material_class
+        self._update_totals(handle, comp, material_class, 1)
+        for metric, metric_state in self._metric_states:
+            metric.add(metric_state, comp, material_class)
+    
+    def _retract(self, handle: int) -> None:
+        """从累计值中撤销一个组成"""
+        comp = self._compositions[handle]
+        material_class = self._classes.pop(handle)
+        self._update_totals(handle, comp, material_class, -1)
+        for metric, metric_state in self._metric_states:
+            metric.remove(metric_state, comp, material_class)
+    
+    def _update_totals(self, handle: int, comp: Dict[str, Any], material_class: MaterialClass,
+                       sign: int) -> None:
+        """按组成增减累计值（sign 为 1 或 -1）"""
+        state = self._state
+        percentage = comp.get('percentage', 0.0)
+        signed = percentage if sign > 0 else -percentage
+        
+        category = material_class.category
+        if self._count(('category', category), sign):
+            state.category_totals[category] += signed
+        else:
+            state.category_totals[category] = 0.0
+        
+        persistence = material_class.persistence
+        if persistence == PERSISTENCE_BASE:
+            remaining = self._count(('persistence', persistence), sign)
+            state.base_percentage = state.base_percentage + signed if remaining else 0.0
+        elif persistence == PERSISTENCE_TOP:
+            remaining = self._count(('persistence', persistence), sign)
+            state.top_percentage = state.top_percentage + signed if remaining else 0.0
+        
+        # 总百分比与总成本一样在 result() 中按组成顺序重新求和
+        if sign > 0:
+            self._costs[handle] = state.total_volume * percentage / 100.0 * material_price_per_ml(comp)
+        else:
+            del self._costs[handle]
+    
+    def _count(self, bucket: Any, sign: int) -> int:
+        """增减累计值的组成数量，返回变化后的数量"""
+        count = self._counts.get(bucket, 0) + sign
+        self._counts[bucket] = count
+        return count
+    
+    def _changed(self) -> AnalysisResult:
+        """记录一次变更，到达重算间隔时从头重建累计值"""
+        self._changes += 1
+        if self.resync_interval and self._changes >= self.resync_interval:
+            self.logger.debug(f"增量分析已累计 {self._changes} 次变更，重新计算")
+            return self.reset(self.to_recipe_data())
+        return self.result()
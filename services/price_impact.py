@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+材料调价影响模拟 - 以稀疏矩阵保存 配方×材料 的百分比，一次稀疏矩阵-向量乘法得到所有配方的成本变化
+"""
+
+import logging
+from array import array
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+
+# 价格变化：{材料ID: 单价变化量} 或按 material_ids 顺序排列的数组
+PriceChanges = Union[Dict[int, float], np.ndarray]
+
+
+class PriceImpactSimulator:
+    """材料调价影响模拟器
+    
+    percentages[i, j] 为第 i 个配方中第 j 种材料的百分比，配方在批量 V ml 下的成本变化为
+    V * (percentages @ 单价变化) / 100；按列(CSC)访问即是 材料ID → (配方ID, 百分比) 的倒排索引
+    """
+    
+    def __init__(self, recipe_ids: np.ndarray, volumes: np.ndarray, material_ids: np.ndarray,
+                 prices: np.ndarray, percentages: sparse.csr_matrix):
+        self.recipe_ids = recipe_ids
+        self.volumes = volumes
+        self.material_ids = material_ids
+        self.prices = prices
+        self.percentages = percentages
+        self._by_material: Optional[sparse.csc_matrix] = None
+        self.logger = logging.getLogger(__name__)
+    
+    @classmethod
+    def from_database(cls, db_manager: Any, batch_size: int = 5000) -> 'PriceImpactSimulator':
+        """从数据库构建（配方、材料和组成各一次流式查询）"""
+        recipes = db_manager.execute_query(
+            'SELECT id, total_volume_ml FROM recipes ORDER BY id', row_mode='tuple'
+        )
+        materials = db_manager.execute_query(
+            'SELECT id, price_per_ml FROM materials ORDER BY id', row_mode='tuple'
+        )
+        recipe_ids = np.array([row[0] for row in recipes], dtype=np.int64)
+        volumes = np.array([row[1] or 0.0 for row in recipes], dtype=np.float64)
+        material_ids = np.array([row[0] for row in materials], dtype=np.int64)
+        prices = np.array([row[1] or 0.0 for row in materials], dtype=np.float64)
+        
+        # 先写入紧凑的 array 缓冲区，避免为每行创建 Python 对象列表
+        composition_recipes = array('q')
+        composition_materials = array('q')
+        percentages = array('d')
+        for recipe_id, material_id, percentage in db_manager.iter_query(
+            'SELECT recipe_id, material_id, percentage FROM recipe_compositions',
+            row_mode='tuple', batch_size=batch_size
+        ):
+            composition_recipes.append(recipe_id)
+            composition_materials.append(material_id)
+            percentages.append(percentage or 0.0)
+        
+        rows = np.searchsorted(recipe_ids, np.frombuffer(composition_recipes, dtype=np.int64))
+        cols = np.searchsorted(material_ids, np.frombuffer(composition_materials, dtype=np.int64))
+        # 同一配方中重复出现的材料在转换为 CSR 时自动合并
+        matrix = sparse.coo_matrix(
+            (np.frombuffer(percentages, dtype=np.float64), (rows, cols)),
+            shape=(len(recipe_ids), len(material_ids))
+        ).tocsr()
+        return cls(recipe_ids, volumes, material_ids, prices, matrix)
+    
+    @property
+    def recipe_count(self) -> int:
+        """配方数量"""
+        return len(self.recipe_ids)
+    
+    @property
+    def material_count(self) -> int:
+        """材料数量"""
+        return len(self.material_ids)
+    
+    def price_delta_vector(self, price_changes: PriceChanges) -> np.ndarray:
+        """把 {材料ID: 单价变化量} 转换为按 material_ids 排列的稠密向量"""
+        if isinstance(price_changes, np.ndarray):
+            if price_changes.shape != (self.material_count,):
+                raise ValueError(f"价格变化向量长度应为 {self.material_count}")
+            return price_changes.astype(np.float64, copy=False)
+        
+        delta = np.zeros(self.material_count)
+        if price_changes:
+            ids = np.fromiter(price_changes.keys(), dtype=np.int64, count=len(price_changes))
+            index = np.searchsorted(self.material_ids, ids)
+            unknown = self._unknown(ids, index)
+            if unknown.any():
+                raise ValueError(f"未找到材料: {ids[unknown].tolist()}")
+            delta[index] = np.fromiter(price_changes.values(), dtype=np.float64, count=len(price_changes))
+        return delta
+    
+    def _unknown(self, ids: np.ndarray, index: np.ndarray) -> np.ndarray:
+        """searchsorted 结果中不存在的材料ID"""
+        if self.material_count == 0:
+            return np.ones(len(ids), dtype=bool)
+        return (index >= self.material_count) | (self.material_ids[np.minimum(index, self.material_count - 1)] != ids)
+    
+    def simulate(self, price_changes: PriceChanges, batch_size_ml: Optional[float] = None) -> np.ndarray:
+        """返回每个配方（按 recipe_ids 排列）的成本变化
+        
+        默认按各配方自身的 total_volume_ml 计算，指定 batch_size_ml 时按统一的批量规模计算
+        """
+        per_ml = self.percentages @ self.price_delta_vector(price_changes) / 100.0
+        if batch_size_ml is not None:
+            return per_ml * batch_size_ml
+        return per_ml * self.volumes
+    
+    def simulate_prices(self, new_prices: Dict[int, float],
+                        batch_size_ml: Optional[float] = None) -> np.ndarray:
+        """按新单价 {材料ID: 新单价} 模拟成本变化"""
+        delta = self.price_delta_vector(new_prices)
+        index = np.searchsorted(self.material_ids, list(new_prices))
+        delta[index] -= self.prices[index]
+        return self.simulate(delta, batch_size_ml)
+    
+    def impacted(self, price_changes: PriceChanges, batch_size_ml: Optional[float] = None,
+                 threshold: float = 0.0) -> Dict[int, float]:
+        """只返回成本变化绝对值大于 threshold 的配方 {配方ID: 成本变化}"""
+        delta = self.simulate(price_changes, batch_size_ml)
+        index = np.flatnonzero(np.abs(delta) > threshold)
+        return dict(zip(self.recipe_ids[index].tolist(), delta[index].tolist()))
+    
+    def recipes_using(self, material_id: int) -> List[Tuple[int, float]]:
+        """使用某材料的配方列表 [(配方ID, 百分比)]"""
+        if self._by_material is None:
+            self._by_material = self.percentages.tocsc()
+        index = int(np.searchsorted(self.material_ids, material_id))
+        if index >= self.material_count or self.material_ids[index] != material_id:
+            return []
+        start, end = self._by_material.indptr[index], self._by_material.indptr[index + 1]
+        rows = self._by_material.indices[start:end]
+        return list(zip(self.recipe_ids[rows].tolist(),
+                        self._by_material.data[start:end].tolist()))
+    
+    def update_prices(self, new_prices: Dict[int, float]) -> None:
+        """调价生效后更新模拟器中的当前单价"""
+        delta = self.price_delta_vector(new_prices)
+        index = np.searchsorted(self.material_ids, list(new_prices))
+        self.prices[index] = delta[index]
@@ -4,11 +4,17 @@
 配方分析服务 - 提供配方智能分析功能
 """
 
+import copy
+import itertools
 import logging
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 
+from services.flavor_classifier import FlavorClassifier, PERSISTENCE_BASE, PERSISTENCE_TOP
+from services.analysis_metrics import AnalysisMetric, CoreMetric
+from services.cost_engine import material_price_per_ml
+
 
 class FlavorCategory(Enum):
     """香调分类枚举"""
@@ -18,6 +24,13 @@ class FlavorCategory(Enum):
     OTHER = "other"  # 其他
 
 
+# 批量分析中香调分类在数组里的编码顺序
+CATEGORY_ORDER = (FlavorCategory.TOP, FlavorCategory.MIDDLE, FlavorCategory.BASE, FlavorCategory.OTHER)
+
+# 分析算法版本，计算规则改变时递增，使缓存中的旧结果失效
+ANALYSIS_VERSION = 2
+
+
 @dataclass
 class AnalysisResult:
     """分析结果数据类"""
@@ -26,140 +39,291 @@ class AnalysisResult:
     cost_analysis: Dict[str, Any]    # 成本分析
     recommendations: List[str]       # 优化建议
     warnings: List[str]              # 警告信息
+    extra_metrics: Dict[str, Any] = field(default_factory=dict)  # 自定义指标结果
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'flavor_balance': self.flavor_balance,
+            'persistence_score': self.persistence_score,
+            'cost_analysis': self.cost_analysis,
+            'recommendations': self.recommendations,
+            'warnings': self.warnings,
+            'extra_metrics': self.extra_metrics
+        }
+    
+    def copy(self) -> 'AnalysisResult':
+        """复制分析结果（比 copy.deepcopy 快得多，自定义指标结果仍深复制）"""
+        cost_analysis = dict(self.cost_analysis)
+        if 'material_costs' in cost_analysis:
+            cost_analysis['material_costs'] = [dict(item) for item in cost_analysis['material_costs']]
+        return AnalysisResult(
+            flavor_balance=dict(self.flavor_balance),
+            persistence_score=self.persistence_score,
+            cost_analysis=cost_analysis,
+            recommendations=list(self.recommendations),
+            warnings=list(self.warnings),
+            extra_metrics=copy.deepcopy(self.extra_metrics) if self.extra_metrics else {}
+        )
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AnalysisResult':
+        """从字典创建分析结果"""
+        return cls(
+            flavor_balance=data['flavor_balance'],
+            persistence_score=data['persistence_score'],
+            cost_analysis=data['cost_analysis'],
+            recommendations=data['recommendations'],
+            warnings=data['warnings'],
+            extra_metrics=data.get('extra_metrics', {})
+        )
 
 
 class RecipeAnalyzer:
     """配方分析器"""
     
-    def __init__(self):
+    def __init__(self, material_cache: Optional[Any] = None,
+                 classifier: Optional[FlavorClassifier] = None):
         self.logger = logging.getLogger(__name__)
+        # 可选的 MaterialCache，用于补齐组成中缺少的材料名称和单价
+        self.material_cache = material_cache
+        
+        # 关键词分类器：编译一次，按材料名称缓存分类结果，关键词表来自 ProjectConfig 的 analysis 配置
+        if classifier is None:
+            from config.project_config import get_config
+            classifier = FlavorClassifier.from_config(get_config())
+        self.classifier = classifier
         
         # 香调分类映射
         self.flavor_categories = {
-            'citrus': FlavorCategory.TOP,
-            'fruit': FlavorCategory.TOP,
-            'berry': FlavorCategory.TOP,
-            'mint': FlavorCategory.TOP,
-            'floral': FlavorCategory.MIDDLE,
-            'spice': FlavorCategory.MIDDLE,
-            'nut': FlavorCategory.MIDDLE,
-            'cream': FlavorCategory.MIDDLE,
-            'tobacco': FlavorCategory.BASE,
-            'vanilla': FlavorCategory.BASE,
-            'caramel': FlavorCategory.BASE,
-            'chocolate': FlavorCategory.BASE
+            keyword: FlavorCategory(category)
+            for keyword, category in classifier.flavor_keywords.items()
         }
+        self._category_codes = {category.value: i for i, category in enumerate(CATEGORY_ORDER)}
+        
+        # 内置指标与自定义指标在同一次组成遍历中计算
+        self.core_metric = CoreMetric()
+        self.metrics: List[AnalysisMetric] = []
+    
+    def register_metric(self, metric: AnalysisMetric) -> None:
+        """注册自定义指标，结果保存在 AnalysisResult.extra_metrics[metric.name]"""
+        # 缺少方法的指标在注册时报错，而不是分析到一半才失败
+        if not isinstance(metric, AnalysisMetric):
+            raise TypeError(f"指标必须继承 AnalysisMetric: {type(metric).__name__}")
+        if metric.supports_remove and type(metric).remove is AnalysisMetric.remove:
+            raise TypeError(f"指标声明 supports_remove 但未实现 remove: {type(metric).__name__}")
+        if not metric.name or metric.name == self.core_metric.name \
+                or any(m.name == metric.name for m in self.metrics):
+            raise ValueError(f"指标名称无效或重复: {metric.name!r}")
+        self.metrics.append(metric)
     
     def analyze_recipe(self, recipe_data: Dict[str, Any]) -> AnalysisResult:
         """分析配方"""
         try:
-            # 香调平衡分析
-            flavor_balance = self._analyze_flavor_balance(recipe_data)
+            recipe_data = self._fill_material_data(recipe_data)
             
-            # 持久性分析
-            persistence_score = self._analyze_persistence(recipe_data)
-            
-            # 成本分析
-            cost_analysis = self._analyze_cost(recipe_data)
-            
-            # 生成建议和警告
-            recommendations = self._generate_recommendations(flavor_balance, persistence_score)
-            warnings = self._generate_warnings(recipe_data)
+            # 香调平衡、持久性、成本、警告及自定义指标在一次遍历中完成
+            values = self._run_metrics(recipe_data, [self.core_metric] + self.metrics)
+            core = values.pop(self.core_metric.name)
+            flavor_balance = core['flavor_balance']
+            persistence_score = core['persistence_score']
             
             return AnalysisResult(
                 flavor_balance=flavor_balance,
                 persistence_score=persistence_score,
-                cost_analysis=cost_analysis,
-                recommendations=recommendations,
-                warnings=warnings
+                cost_analysis=core['cost_analysis'],
+                recommendations=self._generate_recommendations(flavor_balance, persistence_score),
+                warnings=core['warnings'],
+                extra_metrics=values
             )
             
         except Exception as e:
             self.logger.error(f"配方分析错误: {e}")
             raise
     
-    def _analyze_flavor_balance(self, recipe_data: Dict[str, Any]) -> Dict[str, float]:
-        """分析香调平衡"""
-        category_totals = {
-            FlavorCategory.TOP.value: 0.0,
-            FlavorCategory.MIDDLE.value: 0.0,
-            FlavorCategory.BASE.value: 0.0,
-            FlavorCategory.OTHER.value: 0.0
-        }
+    def analyze_library(self, db_manager: Any, recipe_ids: Optional[Iterable[int]] = None,
+                        batch_size: int = 1000) -> Iterator[Tuple[int, AnalysisResult]]:
+        """流式分析数据库中的配方，逐个产出 (配方ID, 分析结果)，内存占用与配方库大小无关"""
+        recipes = db_manager.iter_recipe_dicts(recipe_ids, batch_size=batch_size)
+        while True:
+            batch = list(itertools.islice(recipes, batch_size))
+            if not batch:
+                break
+            # 每批配方用向量化路径一次分析
+            for recipe_data, result in zip(batch, self.analyze_many(batch)):
+                yield recipe_data['id'], result
+    
+    def analyze_many(self, recipes: Iterable[Dict[str, Any]]) -> List[AnalysisResult]:
+        """批量分析配方，结果与逐个调用 analyze_recipe 完全相同
         
-        compositions = recipe_data.get('compositions', [])
-        for comp in compositions:
-            material_name = comp.get('material_name', '').lower()
-            percentage = comp.get('percentage', 0.0)
+        所有配方的组成展平为 NumPy 数组，香调平衡、持久性和成本在一次向量化计算中完成，
+        材料分类按名称缓存，每个不同的材料名称只分类一次
+        """
+        # NumPy 只在批量分析时需要，避免拖慢模块导入
+        import numpy as np
+        
+        try:
+            recipes = [self._fill_material_data(recipe_data) for recipe_data in recipes]
+            recipe_count = len(recipes)
+            if recipe_count == 0:
+                return []
+            
+            names: List[str] = []
+            percentages: List[Any] = []
+            prices: List[Any] = []
+            counts: List[int] = []
+            volumes: List[Any] = []
+            for recipe_data in recipes:
+                compositions = recipe_data.get('compositions', [])
+                counts.append(len(compositions))
+                volumes.append(recipe_data.get('total_volume_ml', 30.0))
+                for comp in compositions:
+                    names.append(comp.get('material_name', ''))
+                    percentages.append(comp.get('percentage', 0.0))
+                    prices.append(material_price_per_ml(comp))
+            
+            pct = np.array(percentages, dtype=np.float64)
+            price = np.array(prices, dtype=np.float64)
+            volume = np.array(volumes, dtype=np.float64)
+            count = np.array(counts, dtype=np.int64)
+            offsets = np.concatenate(([0], np.cumsum(count)))
+            row_recipe = np.repeat(np.arange(recipe_count), count)
+            
+            classes = [self._classify_material(name) for name in names]
+            flavor_code = np.array([c[0] for c in classes], dtype=np.int8)
+            persistence_code = np.array([c[1] for c in classes], dtype=np.int8)
+            
+            def group_sum(mask: Any) -> Any:
+                # bincount 按输入顺序累加，与逐个相加的浮点结果一致
+                return np.bincount(row_recipe[mask], weights=pct[mask], minlength=recipe_count)
+            
+            # 香调平衡
+            category_totals = np.array([group_sum(flavor_code == i) for i in range(len(CATEGORY_ORDER))])
+            balance_total = category_totals[0] + category_totals[1] + category_totals[2] + category_totals[3]
+            positive = balance_total > 0
+            balance = category_totals.copy()
+            balance[:, positive] = category_totals[:, positive] / balance_total[positive] * 100
+            
+            # 持久性
+            base_pct = group_sum(persistence_code == PERSISTENCE_BASE)
+            top_pct = group_sum(persistence_code == PERSISTENCE_TOP)
+            persistence = np.minimum(10.0, (base_pct - top_pct * 0.5) / 10.0 + 5.0)
+            persistence = np.maximum(0.0, np.minimum(10.0, persistence))
+            
+            # 成本：先求各配方总成本，再按总成本计算各材料的成本占比
+            cost = volume[row_recipe] * pct / 100.0 * price
+            total_cost = np.bincount(row_recipe, weights=cost, minlength=recipe_count)
+            row_total = total_cost[row_recipe]
+            cost_percentage = np.zeros_like(cost)
+            has_cost = row_total > 0
+            cost_percentage[has_cost] = cost[has_cost] / row_total[has_cost] * 100
+            
+            # 警告
+            total_pct = group_sum(slice(None))
+            too_high = (pct > 20.0).tolist()
+            too_low = (pct < 0.1).tolist()
             
-            # 确定香调分类
-            category = FlavorCategory.OTHER
-            for keyword, cat in self.flavor_categories.items():
-                if keyword in material_name:
-                    category = cat
-                    break
+            results = []
+            for i, recipe_data in enumerate(recipes):
+                start, end = int(offsets[i]), int(offsets[i + 1])
+                flavor_balance = {cat.value: float(balance[j, i]) for j, cat in enumerate(CATEGORY_ORDER)}
+                persistence_score = float(persistence[i])
+                total_volume = volumes[i]
+                
+                material_costs = [
+                    {
+                        'material_name': names[row],
+                        'percentage': percentages[row],
+                        'cost': float(cost[row]),
+                        'cost_percentage': float(cost_percentage[row])
+                    } for row in range(start, end)
+                ]
+                recipe_total_cost = float(total_cost[i])
+                cost_analysis = {
+                    'total_cost': recipe_total_cost,
+                    'cost_per_ml': recipe_total_cost / total_volume if total_volume > 0 else 0.0,
+                    'material_costs': material_costs,
+                    'total_volume_ml': total_volume
+                }
+                
+                warnings = []
+                recipe_total_pct = float(total_pct[i])
+                if abs(recipe_total_pct - 100.0) > 0.1:
+                    warnings.append(f"配方总百分比异常: {recipe_total_pct:.2f}% (应为100%)")
+                for row in range(start, end):
+                    if too_high[row]:
+                        warnings.append(f"材料 {names[row]} 比例过高: {percentages[row]:.2f}%")
+                    if too_low[row]:
+                        warnings.append(f"材料 {names[row]} 比例过低: {percentages[row]:.2f}%")
+                
+                results.append(AnalysisResult(
+                    flavor_balance=flavor_balance,
+                    persistence_score=persistence_score,
+                    cost_analysis=cost_analysis,
+                    recommendations=self._generate_recommendations(flavor_balance, persistence_score),
+                    warnings=warnings,
+                    # 自定义指标没有向量化实现，逐个配方单次遍历计算
+                    extra_metrics=self._run_metrics(recipe_data, self.metrics) if self.metrics else {}
+                ))
             
-            category_totals[category.value] += percentage
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"批量配方分析错误: {e}")
+            raise
+    
+    def _classify_material(self, material_name: str) -> Tuple[int, int]:
+        """返回材料的 (香调分类编码, 持久性分类编码)"""
+        material_class = self.classifier.classify(material_name)
+        return self._category_codes[material_class.category], material_class.persistence
+    
+    def _fill_material_data(self, recipe_data: Dict[str, Any]) -> Dict[str, Any]:
+        """从材料缓存补齐组成中缺少的材料名称、单价和密度"""
+        if self.material_cache is None:
+            return recipe_data
         
-        # 计算比例
-        total_percentage = sum(category_totals.values())
-        if total_percentage > 0:
-            for category in category_totals:
-                category_totals[category] = (category_totals[category] / total_percentage) * 100
+        compositions = recipe_data.get('compositions', [])
+        needed = [comp['material_id'] for comp in compositions
+                  if comp.get('material_id') is not None
+                  and ('material_name' not in comp or 'price_per_ml' not in comp)]
+        if not needed:
+            return recipe_data
         
-        return category_totals
+        materials = self.material_cache.get_many(needed)
+        filled = []
+        for comp in compositions:
+            material = materials.get(comp.get('material_id'))
+            if material is not None:
+                comp = dict(comp)
+                comp.setdefault('material_name', material.name)
+                comp.setdefault('price_per_ml', material.price_per_ml)
+                comp.setdefault('density', material.density)
+            filled.append(comp)
+        return dict(recipe_data, compositions=filled)
+    
+    def _run_metrics(self, recipe_data: Dict[str, Any],
+                     metrics: List[AnalysisMetric]) -> Dict[str, Any]:
+        """遍历一次组成，计算给定的全部指标"""
+        states = [(metric.add, metric.create_state(recipe_data)) for metric in metrics]
+        classify = self.classifier.classify
+        for comp in recipe_data.get('compositions', []):
+            material_class = classify(comp.get('material_name', ''))
+            for add, state in states:
+                add(state, comp, material_class)
+        return {metric.name: metric.finalize(state, recipe_data)
+                for metric, (_, state) in zip(metrics, states)}
+    
+    def _analyze_flavor_balance(self, recipe_data: Dict[str, Any]) -> Dict[str, float]:
+        """分析香调平衡"""
+        return self._run_metrics(recipe_data, [self.core_metric])['core']['flavor_balance']
     
     def _analyze_persistence(self, recipe_data: Dict[str, Any]) -> float:
         """分析持久性"""
-        base_percentage = 0.0
-        top_percentage = 0.0
-        
-        compositions = recipe_data.get('compositions', [])
-        for comp in compositions:
-            material_name = comp.get('material_name', '').lower()
-            percentage = comp.get('percentage', 0.0)
-            
-            # 后调材料增加持久性
-            if any(keyword in material_name for keyword in ['tobacco', 'vanilla', 'caramel', 'chocolate']):
-                base_percentage += percentage
-            # 前调材料降低持久性
-            elif any(keyword in material_name for keyword in ['citrus', 'mint']):
-                top_percentage += percentage
-        
-        # 计算持久性评分 (0-10)
-        persistence_score = min(10.0, (base_percentage - top_percentage * 0.5) / 10.0 + 5.0)
-        return max(0.0, min(10.0, persistence_score))
+        return self._run_metrics(recipe_data, [self.core_metric])['core']['persistence_score']
     
     def _analyze_cost(self, recipe_data: Dict[str, Any]) -> Dict[str, Any]:
         """成本分析"""
-        total_cost = 0.0
-        material_costs = []
-        
-        compositions = recipe_data.get('compositions', [])
-        total_volume = recipe_data.get('total_volume_ml', 30.0)
-        
-        for comp in compositions:
-            material_price = comp.get('price_per_ml', 0.0)
-            percentage = comp.get('percentage', 0.0)
-            
-            # 计算材料成本
-            volume_ml = total_volume * percentage / 100.0
-            cost = volume_ml * material_price
-            total_cost += cost
-            
-            material_costs.append({
-                'material_name': comp.get('material_name', ''),
-                'percentage': percentage,
-                'cost': cost,
-                'cost_percentage': (cost / total_cost * 100) if total_cost > 0 else 0.0
-            })
-        
-        return {
-            'total_cost': total_cost,
-            'cost_per_ml': total_cost / total_volume if total_volume > 0 else 0.0,
-            'material_costs': material_costs,
-            'total_volume_ml': total_volume
-        }
+        return self._run_metrics(recipe_data, [self.core_metric])['core']['cost_analysis']
     
     def _generate_recommendations(self, flavor_balance: Dict[str, float], 
                                  persistence_score: float) -> List[str]:
@@ -188,20 +352,4 @@ class RecipeAnalyzer:
     
     def _generate_warnings(self, recipe_data: Dict[str, Any]) -> List[str]:
         """生成警告信息"""
-        warnings = []
-        compositions = recipe_data.get('compositions', [])
-        
-        # 检查总百分比
-        total_percentage = sum(comp.get('percentage', 0.0) for comp in compositions)
-        if abs(total_percentage - 100.0) > 0.1:
-            warnings.append(f"配方总百分比异常: {total_percentage:.2f}% (应为100%)")
-        
-        # 检查单个材料比例
-        for comp in compositions:
-            percentage = comp.get('percentage', 0.0)
-            if percentage > 20.0:
-                warnings.append(f"材料 {comp.get('material_name', '')} 比例过高: {percentage:.2f}%")
-            if percentage < 0.1:
-                warnings.append(f"材料 {comp.get('material_name', '')} 比例过低: {percentage:.2f}%")
-        
-        return warnings
\ No newline at end of file
+        return self._run_metrics(recipe_data, [self.core_metric])['core']['warnings']
\ No newline at end of file
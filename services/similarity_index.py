@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似配方检索 - 把每个配方表示为 材料→百分比 的稀疏向量，在内存中按余弦相似度或 L1 距离查找最相似的配方
+"""
+
+import logging
+import threading
+from array import array
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from database.database_manager import MAX_IN_PARAMS
+
+
+# 支持的相似度度量：cosine - 余弦相似度（越大越相似），l1 - 百分比差值绝对值之和（越小越相似）
+SIMILARITY_METRICS = ('cosine', 'l1')
+
+# 配方向量：{材料ID: 百分比}
+RecipeVector = Dict[int, float]
+
+
+class SimilarityIndex:
+    """相似配方索引
+    
+    全部配方保存在一个 配方×材料 的稀疏矩阵中，查询时只取查询配方所含材料的列计算重叠部分，
+    再用预先计算的向量范数得到每个配方的得分；
+    增量同步时变化的配方先放入覆盖表（矩阵中的原行标记为失效），覆盖表超过 compact_threshold 时重建矩阵
+    """
+    
+    def __init__(self, db_manager: Optional[Any] = None, compact_threshold: int = 1000,
+                 auto_sync: bool = True):
+        self.db_manager = db_manager
+        self.compact_threshold = compact_threshold
+        # 查询前自动同步变化的配方（新插入的组成和 recipe_change_log 中的修改、删除）
+        self.auto_sync = auto_sync
+        self.logger = logging.getLogger(__name__)
+        
+        self._lock = threading.RLock()
+        self._overlay: Dict[int, Optional[RecipeVector]] = {}
+        self._seq = 0
+        # 已读取的最大组成ID：组成ID严格递增，更大的ID就是之后插入的组成
+        self._composition_id = 0
+        self._load_triplets(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    
+    def build(self) -> int:
+        """从数据库加载全部配方组成，返回索引中的配方数量"""
+        # 先读取变更序号和最大组成ID再读取组成：两者之间发生的变更会在下次同步时重新应用
+        seq = self._max_seq()
+        composition_id = self._max_composition_id()
+        recipe_ids = array('q')
+        material_ids = array('q')
+        percentages = array('d')
+        for recipe_id, material_id, percentage in self.db_manager.iter_query(
+            'SELECT recipe_id, material_id, percentage FROM recipe_compositions', row_mode='tuple'
+        ):
+            recipe_ids.append(recipe_id)
+            material_ids.append(material_id)
+            percentages.append(percentage or 0.0)
+        
+        with self._lock:
+            self._overlay.clear()
+            self._load_triplets(np.frombuffer(recipe_ids, dtype=np.int64),
+                                np.frombuffer(material_ids, dtype=np.int64),
+                                np.frombuffer(percentages, dtype=np.float64))
+            self._seq = seq
+            self._composition_id = composition_id
+            self.logger.info(f"相似配方索引已建立: {len(self)} 个配方")
+            return len(self)
+    
+    def sync(self) -> int:
+        """读取新插入的组成和 recipe_change_log 中新的变更，更新变化的配方，返回更新的配方数量
+        
+        插入组成不经过 DatabaseManager 的写入方法（如 execute_insert 或直接执行的 SQL）同样能被识别
+        """
+        if self.db_manager is None:
+            return 0
+        rows = self.db_manager.execute_query(
+            'SELECT recipe_id, seq FROM recipe_change_log WHERE seq > ?', (self._seq,), row_mode='tuple'
+        )
+        inserted = self.db_manager.execute_query(
+            'SELECT recipe_id, MAX(id) FROM recipe_compositions WHERE id > ? GROUP BY recipe_id',
+            (self._composition_id,), row_mode='tuple'
+        )
+        if not rows and not inserted:
+            return 0
+        
+        changed = list(dict.fromkeys([row[0] for row in rows] + [row[0] for row in inserted]))
+        vectors: Dict[int, Optional[RecipeVector]] = dict.fromkeys(changed)
+        for start in range(0, len(changed), MAX_IN_PARAMS):
+            chunk = changed[start:start + MAX_IN_PARAMS]
+            for recipe_id, material_id, percentage in self.db_manager.execute_query(
+                f"SELECT recipe_id, material_id, percentage FROM recipe_compositions "
+                f"WHERE recipe_id IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk), row_mode='tuple'
+            ):
+                vector = vectors[recipe_id]
+                if vector is None:
+                    vector = vectors[recipe_id] = {}
+                vector[material_id] = vector.get(material_id, 0.0) + (percentage or 0.0)
+        
+        with self._lock:
+            for recipe_id, vector in vectors.items():
+                self._set(recipe_id, vector)
+            if rows:
+                self._seq = max(self._seq, max(row[1] for row in rows))
+            if inserted:
+                self._composition_id = max(self._composition_id, max(row[1] for row in inserted))
+            if len(self._overlay) > self.compact_threshold:
+                self.compact()
+        return len(changed)
+    
+    def update_recipe(self, recipe_id: int, vector: Optional[RecipeVector]) -> None:
+        """直接更新一个配方的向量（None 表示删除），用于尚未保存到数据库的修改"""
+        with self._lock:
+            self._set(recipe_id, dict(vector) if vector else None)
+            if len(self._overlay) > self.compact_threshold:
+                self.compact()
+    
+    def vector(self, recipe_id: int) -> Optional[RecipeVector]:
+        """配方的向量，不在索引中时返回 None"""
+        with self._lock:
+            if recipe_id in self._overlay:
+                vector = self._overlay[recipe_id]
+                return dict(vector) if vector else None
+            row = self._row(recipe_id)
+            if row is None:
+                return None
+            start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+            return dict(zip(self._materials[self._matrix.indices[start:end]].tolist(),
+                            self._matrix.data[start:end].tolist()))
+    
+    def most_similar(self, recipe_id: Optional[int] = None, vector: Optional[RecipeVector] = None,
+                     k: int = 20, metric: str = 'cosine') -> List[Tuple[int, float]]:
+        """查找最相似的 k 个配方，返回 [(配方ID, 得分)]
+        
+        按配方ID查询时结果不包含该配方本身；也可以直接传入向量（如设计器中未保存的配方）；
+        cosine 得分为相似度（降序），l1 得分为距离（升序）
+        """
+        if metric not in SIMILARITY_METRICS:
+            raise ValueError(f"不支持的相似度度量: {metric}")
+        if self.auto_sync:
+            self.sync()
+        
+        with self._lock:
+            if vector is None:
+                vector = self.vector(recipe_id)
+                if vector is None:
+                    raise ValueError(f"配方不在索引中: {recipe_id}")
+            if not vector or k <= 0:
+                return []
+            
+            base = self._base_scores(vector, metric)
+            if recipe_id is not None:
+                self._exclude(base, recipe_id, metric)
+            
+            # 矩阵中的候选：只对前 k 个排序
+            count = min(k, len(base))
+            order = -base if metric == 'cosine' else base
+            top = np.argpartition(order, count - 1)[:count] if count else np.zeros(0, dtype=np.int64)
+            candidates = list(zip(self._ids[top].tolist(), base[top].tolist()))
+            
+            # 覆盖表中的配方逐个计算
+            candidates.extend(
+                (other_id, self._score(vector, other, metric))
+                for other_id, other in self._overlay.items()
+                if other and other_id != recipe_id
+            )
+        
+        # 余弦相似度为 0 的配方没有任何共同材料，不算相似
+        if metric == 'cosine':
+            candidates = [item for item in candidates if item[1] > 0.0]
+            candidates.sort(key=lambda item: -item[1])
+        else:
+            candidates = [item for item in candidates if np.isfinite(item[1])]
+            candidates.sort(key=lambda item: item[1])
+        return candidates[:k]
+    
+    def compact(self) -> None:
+        """把覆盖表合并进稀疏矩阵"""
+        with self._lock:
+            coo = self._matrix[self._alive].tocoo()
+            alive_ids = self._ids[self._alive]
+            recipe_ids = [alive_ids[coo.row]]
+            material_ids = [self._materials[coo.col]]
+            percentages = [coo.data]
+            for recipe_id, vector in self._overlay.items():
+                if vector:
+                    recipe_ids.append(np.full(len(vector), recipe_id, dtype=np.int64))
+                    material_ids.append(np.fromiter(vector.keys(), dtype=np.int64, count=len(vector)))
+                    percentages.append(np.fromiter(vector.values(), dtype=np.float64, count=len(vector)))
+            self._overlay.clear()
+            self._load_triplets(np.concatenate(recipe_ids), np.concatenate(material_ids),
+                                np.concatenate(percentages))
+    
+    def __len__(self) -> int:
+        """索引中的配方数量"""
+        with self._lock:
+            # 覆盖表中的配方在矩阵中的旧行已失效，不会重复计数
+            return int(self._alive.sum()) + sum(1 for vector in self._overlay.values() if vector)
+    
+    def _load_triplets(self, recipe_ids: np.ndarray, material_ids: np.ndarray,
+                       percentages: np.ndarray) -> None:
+        """由 (配方ID, 材料ID, 百分比) 三元组重建矩阵和范数"""
+        self._ids, rows = np.unique(recipe_ids, return_inverse=True)
+        self._materials, cols = np.unique(material_ids, return_inverse=True)
+        # 同一配方中重复出现的材料在转换为 CSR 时合并
+        self._matrix = sparse.coo_matrix(
+            (percentages, (rows, cols)), shape=(len(self._ids), len(self._materials))
+        ).tocsr()
+        self._by_material = self._matrix.tocsc()
+        self._norm2 = np.sqrt(np.asarray(self._matrix.multiply(self._matrix).sum(axis=1)).ravel())
+        self._norm1 = np.asarray(abs(self._matrix).sum(axis=1)).ravel()
+        self._alive = np.ones(len(self._ids), dtype=bool)
+    
+    def _row(self, recipe_id: int) -> Optional[int]:
+        """配方在矩阵中的行号"""
+        row = int(np.searchsorted(self._ids, recipe_id))
+        if row < len(self._ids) and self._ids[row] == recipe_id:
+            return row
+        return None
+    
+    def _set(self, recipe_id: int, vector: Optional[RecipeVector]) -> None:
+        """把配方放入覆盖表，并使矩阵中的旧行失效"""
+        row = self._row(recipe_id)
+        if row is not None:
+            self._alive[row] = False
+        self._overlay[recipe_id] = vector
+    
+    def _base_scores(self, vector: RecipeVector, metric: str) -> np.ndarray:
+        """矩阵中每个配方相对查询向量的得分，失效行为 -inf(cosine) 或 inf(l1)"""
+        # 只取查询向量中出现的材料列，计算各配方与查询向量的重叠部分
+        material_ids = np.fromiter(vector.keys(), dtype=np.int64, count=len(vector))
+        values = np.fromiter(vector.values(), dtype=np.float64, count=len(vector))
+        cols = np.searchsorted(self._materials, material_ids)
+        known = cols < len(self._materials)
+        known[known] = self._materials[cols[known]] == material_ids[known]
+        sub = self._by_material[:, cols[known]]
+        query = np.repeat(values[known], np.diff(sub.indptr))
+        
+        if metric == 'cosine':
+            dot = np.bincount(sub.indices, weights=sub.data * query, minlength=len(self._ids))
+            query_norm = float(np.sqrt((values * values).sum()))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = dot / (self._norm2 * query_norm)
+            scores[~np.isfinite(scores)] = 0.0
+            scores[~self._alive] = -np.inf
+        else:
+            # |a - b|_1 = |a|_1 + |b|_1 - 2 * Σ min(a, b)（百分比均非负）
+            overlap = np.bincount(sub.indices, weights=np.minimum(sub.data, query), minlength=len(self._ids))
+            scores = self._norm1 + float(np.abs(values).sum()) - 2.0 * overlap
+            scores[~self._alive] = np.inf
+        return scores
+    
+    def _exclude(self, scores: np.ndarray, recipe_id: int, metric: str) -> None:
+        """从结果中排除查询配方本身"""
+        row = self._row(recipe_id)
+        if row is not None:
+            scores[row] = -np.inf if metric == 'cosine' else np.inf
+    
+    @staticmethod
+    def _score(vector: RecipeVector, other: RecipeVector, metric: str) -> float:
+        """两个向量之间的得分（用于覆盖表中的配方）"""
+        if metric == 'cosine':
+            norm = np.sqrt(sum(v * v for v in vector.values()) * sum(v * v for v in other.values()))
+            dot = sum(value * other.get(material_id, 0.0) for material_id, value in vector.items())
+            return float(dot / norm) if norm > 0 else 0.0
+        materials = vector.keys() | other.keys()
+        return float(sum(abs(vector.get(m, 0.0) - other.get(m, 0.0)) for m in materials))
+    
+    def _max_seq(self) -> int:
+        """当前最大变更序号"""
+        rows = self.db_manager.execute_query('SELECT MAX(seq) FROM recipe_change_log', row_mode='tuple')
+        return rows[0][0] or 0
+    
+    def _max_composition_id(self) -> int:
+        """当前最大组成ID"""
+        rows = self.db_manager.execute_query('SELECT MAX(id) FROM recipe_compositions', row_mode='tuple')
+        return rows[0][0] or 0
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本计算测试 - 配方分析与成本引擎使用同一计价规则
+"""
+
+import pytest
+
+from services.cost_engine import CostEngine
+from services.flavor_classifier import FlavorClassifier
+from services.incremental_analyzer import IncrementalAnalysisSession
+from services.recipe_analyzer import RecipeAnalyzer
+
+
+RECIPE = {
+    'total_volume_ml': 30.0,
+    'compositions': [
+        # 按重量计价的材料：每克 2.0，密度 1.25 g/ml，即每毫升 2.5
+        {'material_name': 'vanilla', 'percentage': 40.0, 'price_per_g': 2.0, 'density': 1.25,
+         'price_per_ml': 0.5},
+        {'material_name': 'citrus', 'percentage': 35.0, 'price_per_ml': 1.5},
+        {'material_name': 'cream', 'percentage': 25.0, 'price_per_ml': 0.8, 'density': 0.9}
+    ]
+}
+
+
+@pytest.fixture
+def analyzer():
+    return RecipeAnalyzer(classifier=FlavorClassifier())
+
+
+@pytest.fixture
+def engine():
+    return CostEngine(currency='CNY', exchange_rates={})
+
+
+def assert_same_cost(actual, expected):
+    """总成本、每毫升成本和各材料成本及占比一致"""
+    assert actual['total_cost'] == pytest.approx(expected['total_cost'])
+    assert actual['cost_per_ml'] == pytest.approx(expected['cost_per_ml'])
+    assert [item['cost'] for item in actual['material_costs']] == pytest.approx(
+        [item['cost'] for item in expected['material_costs']])
+    assert [item['cost_percentage'] for item in actual['material_costs']] == pytest.approx(
+        [item['cost_percentage'] for item in expected['material_costs']])
+
+
+def test_weight_priced_material_uses_density(engine):
+    cost = engine.calculate(RECIPE)
+    assert cost['material_costs'][0]['cost'] == pytest.approx(30.0 * 0.40 * 2.5)
+
+
+def test_analyzer_matches_engine(analyzer, engine):
+    expected = engine.calculate(RECIPE)
+    assert_same_cost(analyzer.analyze_recipe(RECIPE).cost_analysis, expected)
+    assert_same_cost(analyzer.analyze_many([RECIPE])[0].cost_analysis, expected)
+    assert_same_cost(IncrementalAnalysisSession(analyzer, RECIPE).result().cost_analysis, expected)
+
+
+def test_unit_costs_match_calculate(engine):
+    unit = engine.unit_costs([RECIPE])
+    assert unit[0] * RECIPE['total_volume_ml'] == pytest.approx(engine.calculate(RECIPE)['total_cost'])
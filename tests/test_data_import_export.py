@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方导入导出测试 - 导入时材料按名称匹配，不使用来源数据库的材料ID
+"""
+
+import pytest
+
+from database.database_manager import DatabaseManager
+from utils.data_import_export import DataImportExport
+
+
+def create_database(path, material_names):
+    """按给定顺序插入材料，材料ID随插入顺序不同"""
+    db_manager = DatabaseManager(str(path))
+    db_manager.bulk_insert('materials', [{'name': name, 'category': '果香'} for name in material_names])
+    return db_manager
+
+
+@pytest.fixture
+def databases(tmp_path):
+    source = create_database(tmp_path / 'source.db', ['citrus', 'vanilla'])
+    target = create_database(tmp_path / 'target.db', ['vanilla', 'citrus'])
+    yield source, target
+    source.close()
+    target.close()
+
+
+def test_single_recipe_import_matches_materials_by_name(databases, tmp_path):
+    source, target = databases
+    recipe_id = source.insert_recipes([{
+        'name': '柑橘香草',
+        'total_volume_ml': 30.0,
+        'compositions': [{'material_name': 'citrus', 'percentage': 70.0},
+                         {'material_name': 'vanilla', 'percentage': 30.0}]
+    }])[0]
+    recipe_data = next(source.iter_recipe_dicts([recipe_id]))
+    assert all(comp.get('material_id') is not None for comp in recipe_data['compositions'])
+    
+    io = DataImportExport()
+    file_path = str(tmp_path / 'recipe.json')
+    assert io.export_recipe_to_json(recipe_data, file_path)
+    new_id = io.import_recipe_to_database(file_path, target)
+    assert new_id is not None
+    
+    imported = next(target.iter_recipe_dicts([new_id]))
+    assert {comp['material_name']: comp['percentage'] for comp in imported['compositions']} == {
+        'citrus': 70.0, 'vanilla': 30.0
+    }
+
+
+def test_single_recipe_import_rejects_composition_without_name(databases, tmp_path):
+    _, target = databases
+    io = DataImportExport()
+    file_path = str(tmp_path / 'recipe.json')
+    assert io.export_recipe_to_json({
+        'name': '无名组成', 'version': 1,
+        'compositions': [{'material_id': 1, 'percentage': 100.0}]
+    }, file_path)
+    
+    assert io.import_recipe_to_database(file_path, target) is None
+    assert target.execute_query('SELECT COUNT(*) AS n FROM recipes')[0]['n'] == 0
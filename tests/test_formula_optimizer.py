@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方优化测试 - 优化后的配方通过自身的目标检查
+"""
+
+import random
+
+import pytest
+
+from services.flavor_classifier import FlavorClassifier
+from services.formula_optimizer import FormulaOptimizer
+from services.recipe_analyzer import RecipeAnalyzer
+
+
+MATERIAL_NAMES = ['citrus', 'mint', 'berry', 'fruit', 'floral', 'spice', 'cream', 'nut',
+                  'tobacco', 'vanilla', 'caramel', 'chocolate', 'water']
+
+# 默认目标对应的建议：目标全部达到时不应出现
+TARGET_RECOMMENDATIONS = ('前调比例过高', '中调比例不足', '后调比例不足', '持久性较低')
+
+
+@pytest.fixture
+def optimizer():
+    return FormulaOptimizer(RecipeAnalyzer(classifier=FlavorClassifier()))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_optimized_recipe_meets_default_targets(optimizer, seed):
+    rng = random.Random(seed)
+    # 固定包含足够的中调、后调和中性材料，保证默认目标可以达到
+    names = ['citrus', 'floral', 'spice', 'cream', 'nut', 'tobacco', 'water']
+    names += rng.sample([name for name in MATERIAL_NAMES if name not in names], rng.randint(0, 6))
+    rng.shuffle(names)
+    recipe = {
+        'total_volume_ml': 30.0,
+        'compositions': [{'material_name': name, 'percentage': 100.0 / len(names),
+                          'price_per_ml': round(rng.uniform(0.1, 5.0), 2)} for name in names]
+    }
+    
+    result = optimizer.optimize(recipe)
+    assert result.success
+    assert result.target_deviation == 0.0
+    assert not [text for text in result.analysis.recommendations if text.startswith(TARGET_RECOMMENDATIONS)]
+    assert result.analysis.warnings == []
+    assert result.analysis.flavor_balance['top'] <= 40.0
+    assert 5.0 <= result.analysis.persistence_score <= 8.0
+
+
+def test_optimized_recipe_meets_numeric_targets(optimizer):
+    recipe = {
+        'total_volume_ml': 30.0,
+        'compositions': [{'material_name': name, 'percentage': 10.0, 'price_per_ml': 1.0 + i}
+                         for i, name in enumerate(MATERIAL_NAMES[:10])]
+    }
+    
+    result = optimizer.optimize(recipe, balance_targets={'top': 30.0, 'base': 35.0},
+                                persistence_target=7.0, tolerance=2.0)
+    balance = result.analysis.flavor_balance
+    assert result.target_deviation == 0.0
+    assert 28.0 <= balance['top'] <= 32.0
+    assert 33.0 <= balance['base'] <= 37.0
+    assert 5.0 <= result.analysis.persistence_score <= 9.0
+    assert all(0.1 <= value <= 20.0 for value in result.percentages)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量分析会话测试 - 随机增删改组成后，结果与完整分析一致
+"""
+
+import random
+
+import pytest
+
+from services.analysis_metrics import AnalysisMetric
+from services.flavor_classifier import FlavorClassifier
+from services.incremental_analyzer import IncrementalAnalysisSession, composition_key
+from services.recipe_analyzer import RecipeAnalyzer
+
+
+MATERIAL_NAMES = ['citrus', 'mint', 'berry', 'floral', 'spice', 'cream', 'tobacco', 'vanilla',
+                  'caramel', 'water', 'citrus vanilla', 'mint cream']
+
+
+def assert_same_result(actual, expected):
+    """增量结果与完整分析结果一致（允许浮点舍入差异）"""
+    assert actual.flavor_balance == pytest.approx(expected.flavor_balance)
+    assert actual.persistence_score == pytest.approx(expected.persistence_score)
+    assert actual.cost_analysis['total_cost'] == pytest.approx(expected.cost_analysis['total_cost'])
+    assert [item['cost'] for item in actual.cost_analysis['material_costs']] == pytest.approx(
+        [item['cost'] for item in expected.cost_analysis['material_costs']])
+    assert actual.recommendations == expected.recommendations
+    assert actual.warnings == expected.warnings
+
+
+@pytest.fixture
+def analyzer():
+    return RecipeAnalyzer(classifier=FlavorClassifier())
+
+
+def test_remove_all_compositions_resets_totals(analyzer):
+    session = IncrementalAnalysisSession(analyzer, {'total_volume_ml': 30.0})
+    session.add_composition({'material_name': 'citrus', 'percentage': 60.0, 'price_per_ml': 1.0})
+    session.add_composition({'material_name': 'vanilla', 'percentage': 40.0, 'price_per_ml': 2.0})
+    session.remove_composition('citrus')
+    result = session.remove_composition('vanilla')
+    
+    expected = analyzer.analyze_recipe(session.to_recipe_data())
+    assert_same_result(result, expected)
+    assert result.flavor_balance['top'] == 0.0
+    assert result.flavor_balance['base'] == 0.0
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_edits_match_full_analysis(analyzer, seed):
+    rng = random.Random(seed)
+    session = IncrementalAnalysisSession(analyzer, {'total_volume_ml': rng.choice([10.0, 30.0, 60.0])},
+                                         resync_interval=0)
+    
+    for _ in range(60):
+        names = [composition_key(comp) for comp in session.compositions]
+        action = rng.random()
+        if not names or action < 0.45:
+            unused = [name for name in MATERIAL_NAMES if name not in names]
+            if not unused:
+                continue
+            result = session.add_composition({
+                'material_name': rng.choice(unused),
+                'percentage': round(rng.uniform(0.05, 40.0), 2),
+                'price_per_ml': round(rng.uniform(0.0, 5.0), 2)
+            })
+        elif action < 0.75:
+            result = session.update_composition(rng.choice(names),
+                                                percentage=round(rng.uniform(0.05, 40.0), 2))
+        else:
+            result = session.remove_composition(rng.choice(names))
+        assert_same_result(result, analyzer.analyze_recipe(session.to_recipe_data()))
+    
+    # 最后删除全部组成
+    for name in [composition_key(comp) for comp in session.compositions]:
+        result = session.remove_composition(name)
+        assert_same_result(result, analyzer.analyze_recipe(session.to_recipe_data()))
+    assert session.compositions == []
+
+
+def test_duplicate_and_nameless_compositions(analyzer):
+    recipe = {'total_volume_ml': 30.0, 'compositions': [
+        {'material_id': 1, 'material_name': 'citrus', 'percentage': 30.0, 'price_per_ml': 1.0},
+        {'material_id': 1, 'material_name': 'citrus', 'percentage': 20.0, 'price_per_ml': 1.0},
+        {'percentage': 10.0},
+        {'percentage': 5.0},
+        {'material_id': 2, 'material_name': 'vanilla', 'percentage': 35.0, 'price_per_ml': 2.0}
+    ]}
+    session = IncrementalAnalysisSession(analyzer, recipe)
+    assert_same_result(session.result(), analyzer.analyze_recipe(recipe))
+    
+    # 重复的键无法确定组成，唯一的键照常修改
+    with pytest.raises(ValueError):
+        session.remove_composition(1)
+    result = session.update_composition(2, percentage=25.0)
+    assert_same_result(result, analyzer.analyze_recipe(session.to_recipe_data()))
+    assert len(session.compositions) == 5
+
+
+def test_update_material_rekeys_composition(analyzer):
+    session = IncrementalAnalysisSession(analyzer, {'total_volume_ml': 30.0, 'compositions': [
+        {'material_id': 1, 'material_name': 'citrus', 'percentage': 60.0, 'price_per_ml': 1.0},
+        {'material_id': 2, 'material_name': 'vanilla', 'percentage': 40.0, 'price_per_ml': 2.0}
+    ]})
+    session.update_composition(1, material_id=3, material_name='mint')
+    
+    session.add_composition({'material_id': 1, 'material_name': 'citrus', 'percentage': 5.0})
+    with pytest.raises(ValueError):
+        session.add_composition({'material_id': 3, 'material_name': 'mint', 'percentage': 5.0})
+    assert [comp['material_id'] for comp in session.compositions] == [3, 2, 1]
+    
+    result = session.update_composition(3, percentage=55.0)
+    assert_same_result(result, analyzer.analyze_recipe(session.to_recipe_data()))
+    
+    # 改成已存在的材料时拒绝修改，组成保持不变
+    with pytest.raises(ValueError):
+        session.update_composition(3, material_id=2, material_name='vanilla')
+    assert [comp['material_id'] for comp in session.compositions] == [3, 2, 1]
+    assert_same_result(session.result(), analyzer.analyze_recipe(session.to_recipe_data()))
+
+
+def test_update_name_rekeys_named_composition(analyzer):
+    session = IncrementalAnalysisSession(analyzer, {'total_volume_ml': 30.0})
+    session.add_composition({'material_name': 'citrus', 'percentage': 60.0, 'price_per_ml': 1.0})
+    session.update_composition('citrus', material_name='mint')
+    
+    session.add_composition({'material_name': 'citrus', 'percentage': 40.0, 'price_per_ml': 1.0})
+    result = session.remove_composition('mint')
+    assert [comp['material_name'] for comp in session.compositions] == ['citrus']
+    assert_same_result(result, analyzer.analyze_recipe(session.to_recipe_data()))
+
+
+class CountMetric(AnalysisMetric):
+    """组成数量"""
+    
+    name = 'count'
+    supports_remove = True
+    
+    def create_state(self, recipe_data):
+        return [0]
+    
+    def add(self, state, comp, material_class):
+        state[0] += 1
+    
+    def remove(self, state, comp, material_class):
+        state[0] -= 1
+    
+    def finalize(self, state, recipe_data):
+        return state[0]
+
+
+def test_metric_with_remove_is_maintained_incrementally(analyzer):
+    analyzer.register_metric(CountMetric())
+    session = IncrementalAnalysisSession(analyzer, {'total_volume_ml': 30.0})
+    session.add_composition({'material_name': 'citrus', 'percentage': 60.0})
+    session.add_composition({'material_name': 'vanilla', 'percentage': 40.0})
+    result = session.remove_composition('citrus')
+    assert [metric for metric, _ in session._metric_states] == analyzer.metrics
+    assert result.extra_metrics == {'count': 1}
+
+
+def test_incomplete_metric_is_rejected(analyzer):
+    class NoFinalize(AnalysisMetric):
+        name = 'no_finalize'
+        
+        def create_state(self, recipe_data):
+            return None
+        
+        def add(self, state, comp, material_class):
+            pass
+    
+    class NoRemove(CountMetric):
+        name = 'no_remove'
+        remove = AnalysisMetric.remove
+    
+    with pytest.raises(TypeError):
+        NoFinalize()
+    with pytest.raises(TypeError):
+        analyzer.register_metric(object())
+    with pytest.raises(TypeError):
+        analyzer.register_metric(NoRemove())
+    assert analyzer.metrics == []
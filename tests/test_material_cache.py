@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+材料缓存测试 - 同一毫秒内的修改也能使缓存失效
+"""
+
+import pytest
+
+from database.database_manager import DatabaseManager
+from database.material_cache import MaterialCache
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / 'materials.db'))
+    db_manager.bulk_insert('materials', [
+        {'name': 'citrus', 'category': '果香', 'price_per_ml': 1.0},
+        {'name': 'vanilla', 'category': '甜香', 'price_per_ml': 1.0}
+    ])
+    yield db_manager
+    db_manager.close()
+
+
+def test_updates_within_one_millisecond_invalidate(db_manager):
+    cache = MaterialCache(db_manager, validate_interval=0)
+    assert cache.get(1).price_per_ml == 1.0
+    assert cache.get(2).price_per_ml == 1.0
+    
+    # 两次修改的 updated_at 落在同一毫秒（显式写入相同的时间，结果不依赖执行速度）
+    stamp = '2030-01-01 00:00:00.000'
+    db_manager.execute_update('UPDATE materials SET price_per_ml = 5.0, updated_at = ? WHERE id = 1', (stamp,))
+    assert cache.get(1).price_per_ml == 5.0
+    db_manager.execute_update('UPDATE materials SET price_per_ml = 7.0, updated_at = ? WHERE id = 2', (stamp,))
+    assert cache.get(2).price_per_ml == 7.0
+    assert cache.get(1).price_per_ml == 5.0
+
+
+def test_explicit_older_updated_at_invalidates(db_manager):
+    cache = MaterialCache(db_manager, validate_interval=0)
+    db_manager.execute_update("UPDATE materials SET price_per_ml = 2.0 WHERE id = 1")
+    assert cache.get(2).price_per_ml == 1.0
+    
+    # 显式写入的秒级时间排在已有的毫秒级时间之前，MAX(updated_at) 不变
+    db_manager.execute_update(
+        "UPDATE materials SET price_per_ml = 9.0, updated_at = '2000-01-01 00:00:00' WHERE id = 2"
+    )
+    assert cache.get(2).price_per_ml == 9.0
+
+
+def test_deleted_material_is_evicted(db_manager):
+    cache = MaterialCache(db_manager, validate_interval=0)
+    assert cache.get(2) is not None
+    db_manager.execute_update('DELETE FROM materials WHERE id = 2')
+    assert cache.get(2) is None
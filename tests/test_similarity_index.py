@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似配方索引测试 - 任何方式写入的组成变化都能增量同步
+"""
+
+import pytest
+
+from database.database_manager import DatabaseManager
+from services.similarity_index import SimilarityIndex
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    db_manager = DatabaseManager(str(tmp_path / 'similarity.db'))
+    db_manager.bulk_insert('materials', [{'name': 'citrus', 'category': '果香'},
+                                         {'name': 'vanilla', 'category': '甜香'}])
+    yield db_manager
+    db_manager.close()
+
+
+def insert_recipe(db_manager, name, compositions):
+    """只用 execute_insert 写入配方和组成（旧界面代码的写法）"""
+    recipe_id = db_manager.execute_insert('INSERT INTO recipes (name) VALUES (?)', (name,))
+    for material_id, percentage in compositions:
+        db_manager.execute_insert(
+            'INSERT INTO recipe_compositions (recipe_id, material_id, percentage) VALUES (?, ?, ?)',
+            (recipe_id, material_id, percentage)
+        )
+    return recipe_id
+
+
+def test_sync_picks_up_execute_insert(db_manager):
+    a = insert_recipe(db_manager, 'a', [(1, 60.0), (2, 40.0)])
+    index = SimilarityIndex(db_manager)
+    index.build()
+    assert index.most_similar(a) == []
+    
+    b = insert_recipe(db_manager, 'b', [(1, 60.0)])
+    assert [recipe_id for recipe_id, _ in index.most_similar(a)] == [b]
+    
+    # 向已有配方追加组成
+    db_manager.execute_insert(
+        'INSERT INTO recipe_compositions (recipe_id, material_id, percentage) VALUES (?, ?, ?)', (b, 2, 40.0)
+    )
+    score = dict(index.most_similar(a))[b]
+    assert score == pytest.approx(1.0)
+
+
+def test_sync_picks_up_update_and_delete(db_manager):
+    a = insert_recipe(db_manager, 'a', [(1, 100.0)])
+    b = insert_recipe(db_manager, 'b', [(1, 100.0)])
+    index = SimilarityIndex(db_manager)
+    index.build()
+    assert [recipe_id for recipe_id, _ in index.most_similar(a)] == [b]
+    
+    db_manager.execute_update('UPDATE recipe_compositions SET material_id = 2 WHERE recipe_id = ?', (b,))
+    assert dict(index.most_similar(a)).get(b, 0.0) == pytest.approx(0.0)
+    
+    db_manager.execute_update('DELETE FROM recipe_compositions WHERE recipe_id = ?', (b,))
+    assert b not in dict(index.most_similar(a))
@@ -4,13 +4,199 @@
 数据导入导出工具
 """
 
+import csv
+import gzip
+import importlib.util
+import itertools
 import json
 import logging
-import pandas as pd
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterable, Iterator, IO, Tuple, Callable
 from datetime import datetime
 
+from models.recipe import ChangeType
+
+
+# 配方列表表头及对应的配方字段（Excel 配方列表工作表）
+RECIPE_HEADERS = ['配方ID', '配方名称', '版本', '总容量(ml)', '尼古丁浓度(mg)', 'PG比例(%)', 'VG比例(%)',
+                  '香精比例(%)', '设计师', '客户', '创建时间', '更新时间']
+RECIPE_EXPORT_FIELDS = ['id', 'name', 'version', 'total_volume_ml', 'nicotine_strength_mg', 'pg_ratio',
+                        'vg_ratio', 'flavor_ratio', 'designer_name', 'customer_name', 'created_at', 'updated_at']
+
+# 配方组成表头（Excel 配方组成工作表与CSV导出共用）
+COMPOSITION_HEADERS = ['配方ID', '配方名称', '材料ID', '材料名称', '百分比(%)', '重量(g)']
+
+# 按配方顺序流式读取全部配方组成，列顺序与 COMPOSITION_HEADERS 一致
+COMPOSITION_EXPORT_QUERY = """
+    SELECT r.id, r.name, c.material_id, m.name, c.percentage, c.weight_grams
+    FROM recipe_compositions c
+    JOIN recipes r ON r.id = c.recipe_id
+    LEFT JOIN materials m ON m.id = c.material_id
+    ORDER BY c.recipe_id, c.id
+"""
+
+# Excel 写入引擎：auto - 已安装 xlsxwriter 时使用其常量内存模式，否则使用 openpyxl 写入模式
+EXCEL_ENGINES = ('auto', 'openpyxl', 'xlsxwriter')
+
+# 单个工作表的最大行数（含表头），超出时续写到下一个工作表
+EXCEL_MAX_ROWS = 1048576
+
+# 配方组成附带导出格式（Parquet 需要 pyarrow）
+SIDECAR_FORMATS = ('csv', 'parquet')
+
+
+class StreamingWorkbook:
+    """只追加写入的 Excel 工作簿，逐行写出，不在内存中保留单元格"""
+    
+    def __init__(self, file_path: str, engine: str = 'auto'):
+        if engine not in EXCEL_ENGINES:
+            raise ValueError(f"不支持的Excel写入引擎: {engine}")
+        if engine == 'auto':
+            engine = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') else 'openpyxl'
+        self.engine = engine
+        self.file_path = file_path
+        
+        if engine == 'xlsxwriter':
+            import xlsxwriter
+            self._workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+        else:
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+    
+    def add_sheet(self, title: str, headers: List[str]) -> Callable[[Iterable[Any]], None]:
+        """创建工作表并写入表头，返回追加一行的函数"""
+        if self.engine == 'xlsxwriter':
+            sheet = self._workbook.add_worksheet(title)
+            sheet.write_row(0, 0, headers)
+            rows = itertools.count(1)
+            return lambda row: sheet.write_row(next(rows), 0, row)
+        
+        sheet = self._workbook.create_sheet(title)
+        sheet.append(headers)
+        return sheet.append
+    
+    def write_rows(self, title: str, headers: List[str], rows: Iterable[Any],
+                   on_row: Optional[Callable[[Any], None]] = None) -> int:
+        """写入全部行，超过单表行数上限时续写到“标题 (2)”等工作表，返回写入的行数"""
+        count = 0
+        sheet_number = 1
+        append = self.add_sheet(title, headers)
+        for row in rows:
+            if count and count % (EXCEL_MAX_ROWS - 1) == 0:
+                sheet_number += 1
+                append = self.add_sheet(f'{title} ({sheet_number})', headers)
+            append(row)
+            if on_row is not None:
+                on_row(row)
+            count += 1
+        return count
+    
+    def close(self) -> None:
+        """写出文件"""
+        if self.engine == 'xlsxwriter':
+            self._workbook.close()
+        else:
+            self._workbook.save(self.file_path)
+
+
+class CompositionSidecar:
+    """与 Excel 同时写出的配方组成 CSV/Parquet 文件"""
+    
+    def __init__(self, file_path: str, file_format: str, batch_size: int = 50000):
+        if file_format not in SIDECAR_FORMATS:
+            raise ValueError(f"不支持的附带导出格式: {file_format}")
+        self.file_path = file_path
+        self.file_format = file_format
+        self.batch_size = batch_size
+        
+        if file_format == 'csv':
+            self._file = open(file_path, 'w', encoding='utf-8-sig', newline='')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(COMPOSITION_HEADERS)
+            self.append = self._csv.writerow
+        else:
+            # pyarrow 是可选依赖，只在导出 Parquet 时加载
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._pa = pa
+            self._schema = pa.schema([
+                (COMPOSITION_HEADERS[0], pa.int64()), (COMPOSITION_HEADERS[1], pa.string()),
+                (COMPOSITION_HEADERS[2], pa.int64()), (COMPOSITION_HEADERS[3], pa.string()),
+                (COMPOSITION_HEADERS[4], pa.float64()), (COMPOSITION_HEADERS[5], pa.float64())
+            ])
+            self._writer = pq.ParquetWriter(file_path, self._schema)
+            self._rows: List[Any] = []
+            self.append = self._append_parquet
+    
+    def _append_parquet(self, row: Any) -> None:
+        """缓存一行，满一批时写出一个行组"""
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+    
+    def _flush(self) -> None:
+        """把缓存的行按列写出"""
+        if self._rows:
+            columns = [list(column) for column in zip(*self._rows)]
+            self._writer.write_table(self._pa.Table.from_arrays(
+                [self._pa.array(column, type=schema_field.type)
+                 for column, schema_field in zip(columns, self._schema)],
+                schema=self._schema
+            ))
+            self._rows = []
+    
+    def close(self) -> None:
+        """写出剩余数据并关闭文件"""
+        if self.file_format == 'csv':
+            self._file.close()
+        else:
+            self._flush()
+            self._writer.close()
+
+
+# 配方库 NDJSON 格式：第一行为元数据，之后每行一个配方（含组成和版本历史）
+LIBRARY_FORMAT = 'ndjson'
+LIBRARY_FORMAT_VERSION = '1.0'
+
+VERSION_HISTORY_FIELDS = ['version', 'change_type', 'change_description', 'created_by', 'created_at']
+
+# 配方验证标准：总百分比允许的偏差、单个材料的比例上限
+PERCENTAGE_TOLERANCE = 0.1
+MAX_COMPOSITION_PERCENTAGE = 30.0
+
+# 表格导入时 配方列表 表头 → 配方字段（来源站点的配方ID和时间不导入）
+RECIPE_IMPORT_FIELDS = {header: name for header, name in zip(RECIPE_HEADERS, RECIPE_EXPORT_FIELDS)
+                        if name not in ('id', 'created_at', 'updated_at')}
+RECIPE_NUMERIC_FIELDS = ('version', 'total_volume_ml', 'nicotine_strength_mg', 'pg_ratio', 'vg_ratio',
+                         'flavor_ratio')
+
+# 表格导入必需的配方组成列
+REQUIRED_COMPOSITION_HEADERS = ('配方ID', '材料名称', '百分比(%)')
+
+
+@dataclass
+class ImportReport:
+    """表格导入结果数据类"""
+    imported: int = 0                                              # 导入的配方数
+    skipped: int = 0                                               # 因错误跳过的配方数
+    recipe_ids: List[int] = field(default_factory=list)            # 新配方ID
+    errors: List[Dict[str, Any]] = field(default_factory=list)     # 逐行错误 {sheet, row, recipe, message}
+    
+    def add_error(self, sheet: str, row: int, recipe: Any, message: str) -> None:
+        """记录一行的错误"""
+        self.errors.append({'sheet': sheet, 'row': row, 'recipe': recipe, 'message': message})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典格式"""
+        return {
+            'imported': self.imported,
+            'skipped': self.skipped,
+            'recipe_ids': self.recipe_ids,
+            'errors': self.errors
+        }
+
 
 class DataImportExport:
     """数据导入导出工具类"""
@@ -48,21 +234,7 @@ class DataImportExport:
     def import_recipe_from_json(self, file_path: str) -> Optional[Dict[str, Any]]:
         """从JSON文件导入配方"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 验证数据格式
-            if 'recipe' not in data:
-                raise ValueError("无效的配方文件格式")
-            
-            recipe_data = data['recipe']
-            
-            # 基本验证
-            required_fields = ['name', 'version', 'compositions']
-            for field in required_fields:
-                if field not in recipe_data:
-                    raise ValueError(f"缺少必要字段: {field}")
-            
+            recipe_data = self.parse_recipe_file(file_path)
             self.logger.info(f"成功导入配方: {recipe_data['name']}")
             return recipe_data
             
@@ -70,48 +242,62 @@ class DataImportExport:
             self.logger.error(f"导入配方失败: {e}")
             return None
     
+    def parse_recipe_file(self, file_path: str) -> Dict[str, Any]:
+        """读取配方JSON文件并检查格式，返回配方数据；文件无效时抛出异常"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        # 验证数据格式
+        if not isinstance(data, dict) or 'recipe' not in data:
+            raise ValueError("无效的配方文件格式")
+        
+        recipe_data = data['recipe']
+        
+        # 基本验证
+        required_fields = ['name', 'version', 'compositions']
+        for name in required_fields:
+            if name not in recipe_data:
+                raise ValueError(f"缺少必要字段: {name}")
+        return recipe_data
+    
+    def import_recipe_to_database(self, file_path: str, db_manager: Any,
+                                  created_by: Optional[str] = None) -> Optional[int]:
+        """从JSON文件导入配方并写入数据库，配方、组成和版本历史在同一事务中提交"""
+        recipe_data = self.import_recipe_from_json(file_path)
+        if recipe_data is None:
+            return None
+        
+        try:
+            # 与配方库导入相同：来源站点的配方ID和材料ID在本地没有意义，材料只按名称匹配
+            recipe_id = self._insert_library_recipes(db_manager, [recipe_data], created_by,
+                                                     f"从 {Path(file_path).name} 导入", False)[0]
+            
+            self.logger.info(f"配方已写入数据库: {recipe_data['name']} (ID {recipe_id})")
+            return recipe_id
+            
+        except Exception as e:
+            self.logger.error(f"导入配方到数据库失败: {e}")
+            return None
+    
     def export_recipes_to_excel(self, recipes_data: List[Dict[str, Any]], 
-                               file_path: str) -> bool:
-        """导出多个配方到Excel文件"""
+                               file_path: str, engine: str = 'auto') -> bool:
+        """导出多个配方到Excel文件（逐行写出，不构建DataFrame）"""
         try:
-            # 准备数据
-            recipe_rows = []
-            composition_rows = []
-            
-            for recipe in recipes_data:
-                # 配方基本信息
-                recipe_rows.append({
-                    '配方ID': recipe.get('id'),
-                    '配方名称': recipe.get('name'),
-                    '版本': recipe.get('version', 1),
-                    '总容量(ml)': recipe.get('total_volume_ml', 0.0),
-                    '尼古丁浓度(mg)': recipe.get('nicotine_strength_mg', 0.0),
-                    'PG比例(%)': recipe.get('pg_ratio', 0.0),
-                    'VG比例(%)': recipe.get('vg_ratio', 0.0),
-                    '香精比例(%)': recipe.get('flavor_ratio', 0.0),
-                    '设计师': recipe.get('designer_name'),
-                    '客户': recipe.get('customer_name'),
-                    '创建时间': recipe.get('created_at'),
-                    '更新时间': recipe.get('updated_at')
-                })
-                
-                # 配方组成
-                for comp in recipe.get('compositions', []):
-                    composition_rows.append({
-                        '配方ID': recipe.get('id'),
-                        '配方名称': recipe.get('name'),
-                        '材料ID': comp.get('material_id'),
-                        '材料名称': comp.get('material_name', ''),
-                        '百分比(%)': comp.get('percentage', 0.0),
-                        '重量(g)': comp.get('weight_grams', 0.0)
-                    })
-            
-            # 创建Excel文件
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                if recipe_rows:
-                    pd.DataFrame(recipe_rows).to_excel(writer, sheet_name='配方列表', index=False)
-                if composition_rows:
-                    pd.DataFrame(composition_rows).to_excel(writer, sheet_name='配方组成', index=False)
+            workbook = StreamingWorkbook(file_path, engine)
+            workbook.write_rows('配方列表', RECIPE_HEADERS, (
+                [recipe.get('id'), recipe.get('name'), recipe.get('version', 1),
+                 recipe.get('total_volume_ml', 0.0), recipe.get('nicotine_strength_mg', 0.0),
+                 recipe.get('pg_ratio', 0.0), recipe.get('vg_ratio', 0.0), recipe.get('flavor_ratio', 0.0),
+                 recipe.get('designer_name'), recipe.get('customer_name'),
+                 recipe.get('created_at'), recipe.get('updated_at')]
+                for recipe in recipes_data
+            ))
+            workbook.write_rows('配方组成', COMPOSITION_HEADERS, (
+                [recipe.get('id'), recipe.get('name'), comp.get('material_id'), comp.get('material_name', ''),
+                 comp.get('percentage', 0.0), comp.get('weight_grams', 0.0)]
+                for recipe in recipes_data for comp in recipe.get('compositions', [])
+            ))
+            workbook.close()
             
             self.logger.info(f"配方已导出到Excel: {file_path}")
             return True
@@ -120,6 +306,544 @@ class DataImportExport:
             self.logger.error(f"导出到Excel失败: {e}")
             return False
     
+    def export_library_to_excel(self, db_manager: Any, file_path: str, sidecar: Optional[str] = None,
+                                engine: str = 'auto', batch_size: int = 5000) -> Optional[Dict[str, Any]]:
+        """从数据库游标流式导出配方列表和全部配方组成到Excel，返回导出统计（行数、耗时、每秒行数）
+        
+        sidecar 为 'csv' 或 'parquet' 时，在同一次遍历中把配方组成另存为与 Excel 同名的 CSV/Parquet 文件
+        """
+        try:
+            start = time.perf_counter()
+            sidecar_path = str(Path(file_path).with_suffix(f'.{sidecar}')) if sidecar else None
+            workbook = StreamingWorkbook(file_path, engine)
+            extra = CompositionSidecar(sidecar_path, sidecar, batch_size * 10) if sidecar else None
+            try:
+                recipe_count = workbook.write_rows('配方列表', RECIPE_HEADERS, db_manager.iter_query(
+                    f"SELECT {', '.join(RECIPE_EXPORT_FIELDS)} FROM recipes ORDER BY id",
+                    row_mode='tuple', batch_size=batch_size
+                ))
+                composition_count = workbook.write_rows(
+                    '配方组成', COMPOSITION_HEADERS,
+                    db_manager.iter_query(COMPOSITION_EXPORT_QUERY, row_mode='tuple', batch_size=batch_size),
+                    on_row=extra.append if extra else None
+                )
+            finally:
+                if extra is not None:
+                    extra.close()
+            workbook.close()
+            
+            elapsed = time.perf_counter() - start
+            stats = {
+                'recipes': recipe_count,
+                'compositions': composition_count,
+                'seconds': elapsed,
+                'rows_per_sec': (recipe_count + composition_count) / elapsed if elapsed > 0 else 0.0,
+                'engine': workbook.engine,
+                'sidecar_path': sidecar_path
+            }
+            self.logger.info(
+                f"配方库已导出到Excel: {file_path} ({recipe_count} 个配方, {composition_count} 行组成, "
+                f"{elapsed:.1f}s, {stats['rows_per_sec']:.0f} 行/秒)"
+            )
+            return stats
+            
+        except Exception as e:
+            self.logger.error(f"导出配方库到Excel失败: {e}")
+            return None
+    
+    def export_compositions_to_csv(self, db_manager: Any, file_path: str,
+                                   batch_size: int = 1000) -> Optional[int]:
+        """从数据库流式导出全部配方组成到CSV，返回导出的行数"""
+        try:
+            counter = itertools.count()
+            with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(COMPOSITION_HEADERS)
+                rows = db_manager.iter_query(COMPOSITION_EXPORT_QUERY, row_mode='tuple', batch_size=batch_size)
+                writer.writerows(row for row, _ in zip(rows, counter))
+            
+            row_count = next(counter)
+            self.logger.info(f"配方组成已导出到CSV: {file_path} ({row_count} 行)")
+            return row_count
+            
+        except Exception as e:
+            self.logger.error(f"导出配方组成到CSV失败: {e}")
+            return None
+    
+    def export_library_to_ndjson(self, db_manager: Any, file_path: str,
+                                 include_version_history: bool = True,
+                                 batch_size: int = 1000, compresslevel: int = 6) -> Optional[int]:
+        """从数据库流式导出整个配方库到 NDJSON（每行一个配方），返回导出的配方数
+        
+        文件名以 .gz 结尾时使用 gzip 压缩；配方逐个从游标读取并写出，内存占用与配方库大小无关
+        """
+        try:
+            encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+            recipes = db_manager.iter_recipe_dicts(batch_size=batch_size)
+            if include_version_history:
+                recipes = self._attach_version_history(db_manager, recipes, batch_size)
+            
+            recipe_count = 0
+            with self._open_text(file_path, 'w', compresslevel) as f:
+                f.write(encode({
+                    'metadata': {
+                        'export_date': datetime.now().isoformat(),
+                        'tool_version': '2.0.0',
+                        'format': LIBRARY_FORMAT,
+                        'format_version': LIBRARY_FORMAT_VERSION
+                    }
+                }) + '\n')
+                for recipe in recipes:
+                    f.write(encode(recipe) + '\n')
+                    recipe_count += 1
+            
+            self.logger.info(f"配方库已导出到: {file_path} ({recipe_count} 个配方)")
+            return recipe_count
+            
+        except Exception as e:
+            self.logger.error(f"导出配方库失败: {e}")
+            return None
+    
+    def import_library_from_ndjson(self, file_path: str, db_manager: Any,
+                                   created_by: Optional[str] = None, batch_size: int = 500,
+                                   create_missing_materials: bool = True) -> Optional[int]:
+        """流式读取 NDJSON 配方库并分批写入数据库（每批一个事务），返回导入的配方数
+        
+        来源站点的配方ID和材料ID在本地没有意义，配方作为新配方保存，材料按名称匹配，
+        本地不存在的材料默认按文件中的分类、单价和密度创建；无法解析或写入的行记录日志后跳过
+        """
+        try:
+            description = f"从 {Path(file_path).name} 导入"
+            imported = 0
+            failed = 0
+            batch: List[Tuple[int, Dict[str, Any]]] = []
+            
+            with self._open_text(file_path, 'r') as f:
+                # 第一行必须是元数据，格式或版本不符时终止导入
+                header = json.loads(f.readline() or 'null')
+                if not isinstance(header, dict) or 'metadata' not in header:
+                    raise ValueError("缺少配方库元数据，不是配方库文件")
+                self._check_library_metadata(header['metadata'])
+                
+                for line_number, line in enumerate(f, 2):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        if not isinstance(record, dict):
+                            raise ValueError("不是JSON对象")
+                    except ValueError as e:
+                        self.logger.warning(f"第 {line_number} 行无效，已跳过: {e}")
+                        failed += 1
+                        continue
+                    
+                    missing = [field_name for field_name in ('name', 'version', 'compositions')
+                               if field_name not in record]
+                    if missing:
+                        self.logger.warning(f"第 {line_number} 行缺少必要字段，已跳过: {', '.join(missing)}")
+                        failed += 1
+                        continue
+                    
+                    batch.append((f"第 {line_number} 行", record))
+                    if len(batch) >= batch_size:
+                        written = self.write_recipe_batch(db_manager, batch, created_by, description,
+                                                          create_missing_materials)
+                        imported += written
+                        failed += len(batch) - written
+                        batch = []
+            
+            if batch:
+                written = self.write_recipe_batch(db_manager, batch, created_by, description,
+                                                  create_missing_materials)
+                imported += written
+                failed += len(batch) - written
+            
+            self.logger.info(f"配方库导入完成: {file_path} (成功 {imported}, 失败 {failed})")
+            return imported
+            
+        except Exception as e:
+            self.logger.error(f"导入配方库失败: {e}")
+            return None
+    
+    def export_library_to_archive(self, db_manager: Any, file_path: str,
+                                  include_version_history: bool = True, block_size: int = 256,
+                                  codec: str = 'auto', serializer: str = 'auto',
+                                  batch_size: int = 1000) -> Optional[int]:
+        """把整个配方库（配方、组成、材料和版本历史）导出为二进制归档，返回导出的配方数
+        
+        归档按块压缩，可用 RecipeArchive 按配方ID随机读取；codec/serializer 默认在已安装时使用 zstd/msgpack
+        """
+        # 归档模块引用本模块的常量，在此处导入以避免循环导入
+        from utils.recipe_archive import ARCHIVE_MATERIAL_FIELDS, RecipeArchiveWriter
+        
+        try:
+            recipes = db_manager.iter_recipe_dicts(batch_size=batch_size)
+            if include_version_history:
+                recipes = self._attach_version_history(db_manager, recipes, batch_size)
+            
+            with RecipeArchiveWriter(file_path, block_size, codec, serializer) as writer:
+                writer.write_materials(db_manager.iter_query(
+                    f"SELECT {', '.join(ARCHIVE_MATERIAL_FIELDS)} FROM materials ORDER BY id",
+                    row_mode='tuple', batch_size=batch_size
+                ))
+                for recipe in recipes:
+                    writer.write_recipe(recipe)
+            
+            self.logger.info(f"配方库已导出为归档: {file_path} ({len(writer.recipe_ids)} 个配方, "
+                             f"{writer.codec}/{writer.serializer})")
+            return len(writer.recipe_ids)
+            
+        except Exception as e:
+            self.logger.error(f"导出配方库归档失败: {e}")
+            return None
+    
+    def import_library_from_archive(self, file_path: str, db_manager: Any,
+                                    created_by: Optional[str] = None, batch_size: int = 500,
+                                    create_missing_materials: bool = True) -> Optional[int]:
+        """从二进制归档导入配方库（分批写入，每批一个事务），返回导入的配方数
+        
+        与 NDJSON 配方库相同：配方作为新配方保存，材料按名称匹配，本地不存在的材料默认按归档中的信息创建
+        """
+        from utils.recipe_archive import RecipeArchive
+        
+        try:
+            description = f"从 {Path(file_path).name} 导入"
+            imported = 0
+            with RecipeArchive(file_path) as archive:
+                recipes = archive.iter_recipes()
+                while True:
+                    batch = list(itertools.islice(recipes, batch_size))
+                    if not batch:
+                        break
+                    imported += self.write_recipe_batch(
+                        db_manager, [(f"配方 {recipe['id']} ", recipe) for recipe in batch],
+                        created_by, description, create_missing_materials
+                    )
+                total = len(archive)
+            
+            self.logger.info(f"配方库归档导入完成: {file_path} (成功 {imported}, 失败 {total - imported})")
+            return imported
+            
+        except Exception as e:
+            self.logger.error(f"导入配方库归档失败: {e}")
+            return None
+    
+    def import_recipes_from_spreadsheet(self, file_path: str, db_manager: Any,
+                                        created_by: Optional[str] = None, chunk_size: int = 20000,
+                                        batch_size: int = 500,
+                                        create_missing_materials: bool = False) -> Optional[ImportReport]:
+        """从Excel（配方列表/配方组成 工作表）或配方组成CSV分块导入配方，返回含逐行错误的导入报告
+        
+        每块配方组成用 pandas 整列验证（总百分比、单个比例），材料名称每块一次批量查找，
+        通过验证的配方分批写入（每批一个事务）；有任何错误的配方整体跳过。
+        同一配方的组成行需要相邻（导出文件按配方排序），跨块的配方会留到下一块一起处理
+        """
+        import pandas as pd
+        
+        try:
+            description = f"从 {Path(file_path).name} 导入"
+            report = ImportReport()
+            recipes_info = self._read_recipe_sheet(file_path, report)
+            name_to_id: Dict[str, int] = {}
+            done: set = set()
+            pending = None
+            
+            for chunk in self._iter_composition_chunks(file_path, chunk_size):
+                frame = chunk if pending is None else pd.concat([pending, chunk], ignore_index=True)
+                # 最后一个配方的组成可能延续到下一块
+                keys = pd.to_numeric(frame['配方ID'], errors='coerce')
+                tail = keys == keys.iloc[-1]
+                pending = frame[tail]
+                self._import_composition_chunk(frame[~tail], db_manager, recipes_info, name_to_id, done,
+                                               report, created_by, description, batch_size,
+                                               create_missing_materials)
+            if pending is not None:
+                self._import_composition_chunk(pending, db_manager, recipes_info, name_to_id, done,
+                                               report, created_by, description, batch_size,
+                                               create_missing_materials)
+            
+            for recipe_key, info in recipes_info.items():
+                if recipe_key not in done:
+                    report.add_error('配方列表', info['_row'], info.get('name'), "配方没有组成")
+                    report.skipped += 1
+            report.errors.sort(key=lambda error: (error['sheet'], error['row']))
+            
+            self.logger.info(f"表格导入完成: {file_path} (成功 {report.imported}, 跳过 {report.skipped}, "
+                             f"错误 {len(report.errors)} 条)")
+            return report
+            
+        except Exception as e:
+            self.logger.error(f"从表格导入配方失败: {e}")
+            return None
+    
+    def write_recipe_batch(self, db_manager: Any, batch: List[Tuple[str, Dict[str, Any]]],
+                           created_by: Optional[str], description: str,
+                           create_missing_materials: bool,
+                           on_error: Optional[Callable[[str, Exception], None]] = None,
+                           recipe_ids: Optional[List[int]] = None) -> int:
+        """在一个事务中写入一批 (位置, 配方记录)，返回写入的配方数；整批失败时逐个重试以跳过出错的配方
+        
+        on_error 接收出错配方的位置和异常，recipe_ids 收集新配方ID
+        """
+        try:
+            new_ids = self._insert_library_recipes(db_manager, [record for _, record in batch], created_by,
+                                                   description, create_missing_materials)
+            if recipe_ids is not None:
+                recipe_ids.extend(new_ids)
+            return len(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self.logger.warning(f"{batch[0][0]}写入失败，已跳过: {e}")
+                if on_error is not None:
+                    on_error(batch[0][0], e)
+                return 0
+        
+        return sum(self.write_recipe_batch(db_manager, [item], created_by, description,
+                                           create_missing_materials, on_error, recipe_ids)
+                   for item in batch)
+    
+    def _open_text(self, file_path: str, mode: str, compresslevel: int = 6) -> IO[str]:
+        """打开 UTF-8 文本文件，.gz 后缀使用 gzip"""
+        if str(file_path).endswith('.gz'):
+            return gzip.open(file_path, mode + 't', compresslevel=compresslevel, encoding='utf-8')
+        return open(file_path, mode, encoding='utf-8')
+    
+    def _attach_version_history(self, db_manager: Any, recipes: Iterator[Dict[str, Any]],
+                                batch_size: int) -> Iterator[Dict[str, Any]]:
+        """为按ID顺序产出的配方附加版本历史（与按配方ID排序的版本历史流做归并，不逐个查询）"""
+        history = db_manager.iter_query(
+            f"SELECT recipe_id, {', '.join(VERSION_HISTORY_FIELDS)} FROM version_history "
+            f"ORDER BY recipe_id, version, id",
+            row_mode='tuple', batch_size=batch_size
+        )
+        groups = itertools.groupby(history, key=lambda row: row[0])
+        current = next(groups, None)
+        for recipe in recipes:
+            while current is not None and current[0] < recipe['id']:
+                current = next(groups, None)
+            if current is not None and current[0] == recipe['id']:
+                recipe['version_history'] = [dict(zip(VERSION_HISTORY_FIELDS, row[1:])) for row in current[1]]
+                current = next(groups, None)
+            else:
+                recipe['version_history'] = []
+            yield recipe
+    
+    def _check_library_metadata(self, metadata: Dict[str, Any]) -> None:
+        """检查配方库文件的格式版本"""
+        if metadata.get('format') != LIBRARY_FORMAT:
+            raise ValueError(f"不是配方库文件: {metadata.get('format')}")
+        major = str(metadata.get('format_version', '')).split('.')[0]
+        if major != LIBRARY_FORMAT_VERSION.split('.')[0]:
+            raise ValueError(f"不支持的配方库格式版本: {metadata.get('format_version')}")
+    
+    def _insert_library_recipes(self, db_manager: Any, records: List[Dict[str, Any]],
+                                created_by: Optional[str], description: str,
+                                create_missing_materials: bool) -> List[int]:
+        """把配方库记录作为新配方写入（含文件中的版本历史），返回新配方ID
+        
+        文件中的材料ID来自导出方的数据库，一律丢弃，材料只按名称匹配；缺少材料名称的组成视为错误
+        """
+        recipes = []
+        for record in records:
+            compositions = []
+            for position, comp in enumerate(record.get('compositions', []), 1):
+                if not comp.get('material_name'):
+                    raise ValueError(f"配方 {record.get('name')} 的第 {position} 个组成缺少材料名称")
+                compositions.append(dict(comp, material_id=None))
+            recipes.append(dict(record, id=None, parent_recipe_id=None, compositions=compositions))
+        
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with db_manager.transaction():
+            recipe_ids = db_manager.insert_recipes(
+                recipes, created_by=created_by, change_type=ChangeType.IMPORTED,
+                change_description=description, create_missing_materials=create_missing_materials
+            )
+            db_manager.bulk_insert('version_history', (
+                {
+                    'recipe_id': recipe_id,
+                    'version': hist.get('version', 1),
+                    'change_type': hist.get('change_type', ChangeType.UPDATED.value),
+                    'change_description': hist.get('change_description'),
+                    'created_by': hist.get('created_by'),
+                    'created_at': hist.get('created_at') or now
+                }
+                for recipe_id, record in zip(recipe_ids, records)
+                for hist in record.get('version_history') or []
+            ))
+        return recipe_ids
+    
+    def _read_recipe_sheet(self, file_path: str, report: ImportReport) -> Dict[float, Dict[str, Any]]:
+        """读取 配方列表 工作表，返回 {来源配方ID: 配方字段}（CSV 文件没有配方列表，返回空字典）"""
+        if Path(file_path).suffix.lower() == '.csv':
+            return {}
+        
+        from openpyxl import load_workbook
+        import pandas as pd
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            if '配方列表' not in workbook.sheetnames:
+                return {}
+            rows = workbook['配方列表'].iter_rows(values_only=True)
+            headers = list(next(rows, None) or [])
+            frame = pd.DataFrame(list(rows), columns=headers)
+        finally:
+            workbook.close()
+        if frame.empty:
+            return {}
+        if '配方ID' not in frame.columns:
+            raise ValueError("配方列表缺少列: 配方ID")
+        
+        frame['_row'] = frame.index + 2
+        keys = pd.to_numeric(frame['配方ID'], errors='coerce')
+        for row, name in frame.loc[keys.isna(), ['_row', '配方名称']].itertuples(index=False):
+            report.add_error('配方列表', row, name, "缺少配方ID")
+        
+        columns = {header: name for header, name in RECIPE_IMPORT_FIELDS.items() if header in frame.columns}
+        info = frame[list(columns)].rename(columns=columns)
+        for name in RECIPE_NUMERIC_FIELDS:
+            if name in info.columns:
+                info[name] = pd.to_numeric(info[name], errors='coerce')
+        if 'version' in info.columns:
+            info['version'] = info['version'].fillna(1).astype(int)
+        info['_row'] = frame['_row']
+        info = info[keys.notna()].astype(object).where(info.notna(), None)
+        return dict(zip(keys[keys.notna()].tolist(), info.to_dict('records')))
+    
+    def _iter_composition_chunks(self, file_path: str, chunk_size: int) -> Iterator[Any]:
+        """分块读取配方组成，产出带 _sheet（工作表）和 _row（表格行号）列的 DataFrame"""
+        import pandas as pd
+        
+        if Path(file_path).suffix.lower() == '.csv':
+            sheet = Path(file_path).name
+            for chunk in pd.read_csv(file_path, chunksize=chunk_size, encoding='utf-8-sig'):
+                self._check_composition_headers(chunk.columns, sheet)
+                chunk['_sheet'] = sheet
+                chunk['_row'] = chunk.index + 2
+                yield chunk.reset_index(drop=True)
+            return
+        
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            # 超过单表行数上限的导出文件续写在 “配方组成 (2)” 等工作表中
+            sheets = [name for name in workbook.sheetnames if name == '配方组成' or name.startswith('配方组成 (')]
+            if not sheets:
+                raise ValueError("缺少 配方组成 工作表")
+            for sheet in sheets:
+                rows = workbook[sheet].iter_rows(values_only=True)
+                headers = list(next(rows, None) or [])
+                self._check_composition_headers(headers, sheet)
+                first_row = 2
+                while True:
+                    block = list(itertools.islice(rows, chunk_size))
+                    if not block:
+                        break
+                    chunk = pd.DataFrame(block, columns=headers)
+                    chunk['_sheet'] = sheet
+                    chunk['_row'] = range(first_row, first_row + len(block))
+                    first_row += len(block)
+                    yield chunk
+        finally:
+            workbook.close()
+    
+    def _check_composition_headers(self, headers: Iterable[Any], sheet: str) -> None:
+        """检查配方组成的必需列"""
+        missing = [header for header in REQUIRED_COMPOSITION_HEADERS if header not in headers]
+        if missing:
+            raise ValueError(f"{sheet} 缺少列: {', '.join(missing)}")
+    
+    def _import_composition_chunk(self, frame: Any, db_manager: Any, recipes_info: Dict[float, Dict[str, Any]],
+                                  name_to_id: Dict[str, int], done: set, report: ImportReport,
+                                  created_by: Optional[str], description: str, batch_size: int,
+                                  create_missing_materials: bool) -> None:
+        """验证一块配方组成（同一配方的行都在块内），把通过验证的配方分批写入"""
+        import pandas as pd
+        
+        if frame.empty:
+            return
+        keys = pd.to_numeric(frame['配方ID'], errors='coerce')
+        percentages = pd.to_numeric(frame['百分比(%)'], errors='coerce')
+        names = frame['材料名称'].fillna('').astype(str).str.strip()
+        recipe_names = frame['配方名称'] if '配方名称' in frame.columns else frame['配方ID']
+        
+        # 材料名称：只查找本块中新出现的名称，一次批量查询
+        unseen = [name for name in names.unique() if name and name not in name_to_id]
+        if unseen:
+            name_to_id.update(db_manager.find_material_ids(unseen))
+        
+        # 逐行检查（与 validate_recipe_data 的标准一致），全部为整列运算
+        checks = [
+            (keys.isna(), lambda value: "缺少配方ID"),
+            (keys.isin(done), lambda value: "配方组成不相邻，该配方已在前面的行中处理"),
+            (names == '', lambda value: "缺少材料名称"),
+            (percentages.isna(), lambda value: "比例不是数字"),
+            (percentages <= 0.0, lambda value: "比例必须大于0"),
+            (percentages > MAX_COMPOSITION_PERCENTAGE, lambda value: f"比例过高 ({value:.2f}%)")
+        ]
+        if not create_missing_materials:
+            checks.append(((names != '') & ~names.isin(name_to_id.keys()), lambda value: "未找到材料"))
+        invalid = pd.Series(False, index=frame.index)
+        for mask, message in checks:
+            invalid |= mask
+            for sheet, row, recipe, value in zip(frame['_sheet'][mask], frame['_row'][mask],
+                                                 recipe_names[mask], percentages[mask]):
+                report.add_error(sheet, row, recipe, message(value))
+        
+        # 按配方检查总百分比，错误记在配方的第一行
+        fresh = keys.notna() & ~keys.isin(done)
+        totals = percentages[fresh].groupby(keys[fresh], sort=False).sum()
+        firsts = pd.DataFrame({'sheet': frame['_sheet'], 'row': frame['_row'], 'recipe': recipe_names,
+                               'key': keys})[fresh].drop_duplicates('key').set_index('key')
+        wrong_totals = totals[(totals - 100.0).abs() > PERCENTAGE_TOLERANCE]
+        for key, total in wrong_totals.items():
+            first = firsts.loc[key]
+            report.add_error(first['sheet'], int(first['row']), first['recipe'],
+                             f"配方总百分比异常: {total:.2f}% (应为100%)")
+        
+        rejected = set(keys[invalid & fresh]) | set(wrong_totals.index)
+        done.update(totals.index)
+        report.skipped += len(rejected)
+        
+        # 组装通过验证的配方，材料在写入时按名称统一解析为ID
+        accepted = fresh & ~keys.isin(rejected)
+        weights = (pd.to_numeric(frame['重量(g)'], errors='coerce').fillna(0.0) if '重量(g)' in frame.columns
+                   else pd.Series(0.0, index=frame.index))
+        compositions: Dict[float, List[Dict[str, Any]]] = {}
+        for key, name, percentage, weight in zip(keys[accepted], names[accepted],
+                                                 percentages[accepted], weights[accepted]):
+            compositions.setdefault(key, []).append(
+                {'material_name': name, 'percentage': percentage, 'weight_grams': weight}
+            )
+        
+        locations: Dict[str, Tuple[str, int, Any]] = {}
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        for key, comps in compositions.items():
+            first = firsts.loc[key]
+            record = {name: value for name, value in recipes_info.get(key, {}).items()
+                      if name != '_row' and value is not None}
+            if not record.get('name'):
+                if pd.isna(first['recipe']) or not str(first['recipe']).strip():
+                    report.add_error(first['sheet'], int(first['row']), None, "缺少配方名称")
+                    report.skipped += 1
+                    continue
+                record['name'] = str(first['recipe']).strip()
+            record['compositions'] = comps
+            
+            location = f"{first['sheet']} 第 {first['row']} 行"
+            locations[location] = (first['sheet'], int(first['row']), record['name'])
+            batch.append((location, record))
+        
+        def on_error(location: str, error: Exception) -> None:
+            report.add_error(*locations[location], f"写入失败: {error}")
+        
+        for start in range(0, len(batch), batch_size):
+            part = batch[start:start + batch_size]
+            written = self.write_recipe_batch(db_manager, part, created_by, description,
+                                              create_missing_materials, on_error, report.recipe_ids)
+            report.imported += written
+            report.skipped += len(part) - written
+    
     def export_analysis_report(self, recipe_data: Dict[str, Any], 
                               analysis_result: Dict[str, Any], 
                               file_path: str) -> bool:
@@ -153,15 +877,15 @@ class DataImportExport:
         
         # 检查必要字段
         required_fields = ['name', 'version', 'compositions']
-        for field in required_fields:
-            if field not in recipe_data:
-                errors.append(f"缺少必要字段: {field}")
+        for field_name in required_fields:
+            if field_name not in recipe_data:
+                errors.append(f"缺少必要字段: {field_name}")
         
         # 检查配方组成
         compositions = recipe_data.get('compositions', [])
         total_percentage = sum(comp.get('percentage', 0.0) for comp in compositions)
         
-        if abs(total_percentage - 100.0) > 0.1:
+        if abs(total_percentage - 100.0) > PERCENTAGE_TOLERANCE:
             errors.append(f"配方总百分比异常: {total_percentage:.2f}% (应为100%)")
         
         # 检查单个材料比例
@@ -169,7 +893,7 @@ class DataImportExport:
             percentage = comp.get('percentage', 0.0)
             if percentage <= 0.0:
                 errors.append(f"材料 {i+1}: 比例必须大于0")
-            if percentage > 30.0:
+            if percentage > MAX_COMPOSITION_PERCENTAGE:
                 errors.append(f"材料 {comp.get('material_name', '未知')}: 比例过高 ({percentage:.2f}%)")
         
         return errors
\ No newline at end of file
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配方库二进制归档 - 按块压缩的列式容器，包含配方、组成、材料和版本历史，可按配方ID随机读取
+
+文件结构: 文件头(魔数 + JSON 元数据) | 材料块 | 配方块... | 索引 | 尾部(索引位置 + 魔数)
+每个配方块按列保存 block_size 个配方（ID升序），索引保存全部配方ID和各块位置，
+读取单个配方只需解压它所在的块；msgpack / zstandard 已安装时默认使用，否则使用 JSON / zlib
+"""
+
+import bisect
+import importlib.util
+import itertools
+import json
+import struct
+import zlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Iterator, IO, Tuple, Callable
+
+from database.database_manager import RECIPE_COLUMNS
+from utils.data_import_export import VERSION_HISTORY_FIELDS
+
+
+ARCHIVE_FORMAT = 'archive'
+ARCHIVE_FORMAT_VERSION = '1.0'
+
+ARCHIVE_MAGIC = b'FSRECARC'
+# 文件头: 魔数 + 元数据长度；尾部: 索引位置 + 索引长度 + 魔数
+HEADER_STRUCT = struct.Struct('<8sI')
+TRAILER_STRUCT = struct.Struct('<QQ8s')
+
+# 可选的压缩算法和序列化方式（auto 按已安装的模块选择）
+ARCHIVE_CODECS = ('auto', 'zstd', 'zlib')
+ARCHIVE_SERIALIZERS = ('auto', 'msgpack', 'json')
+
+DEFAULT_BLOCK_SIZE = 256
+
+ARCHIVE_RECIPE_FIELDS = ['id'] + list(RECIPE_COLUMNS) + ['created_at', 'updated_at']
+ARCHIVE_COMPOSITION_FIELDS = ['material_id', 'percentage', 'weight_grams']
+ARCHIVE_MATERIAL_FIELDS = ['id', 'name', 'category', 'price_per_ml', 'density']
+
+
+def _codec(name: str, level: Optional[int] = None) -> Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """返回 (压缩算法名, 压缩函数, 解压函数)"""
+    if name not in ARCHIVE_CODECS:
+        raise ValueError(f"不支持的压缩算法: {name}")
+    if name == 'auto':
+        name = 'zstd' if importlib.util.find_spec('zstandard') else 'zlib'
+    if name == 'zstd':
+        # zstandard 是可选依赖，只在读写 zstd 归档时加载
+        import zstandard
+        return (name, zstandard.ZstdCompressor(level=level or 3).compress,
+                zstandard.ZstdDecompressor().decompress)
+    compress_level = 6 if level is None else level
+    return name, lambda data: zlib.compress(data, compress_level), zlib.decompress
+
+
+def _serializer(name: str) -> Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]:
+    """返回 (序列化方式名, 序列化函数, 反序列化函数)"""
+    if name not in ARCHIVE_SERIALIZERS:
+        raise ValueError(f"不支持的序列化方式: {name}")
+    if name == 'auto':
+        name = 'msgpack' if importlib.util.find_spec('msgpack') else 'json'
+    if name == 'msgpack':
+        import msgpack
+        return (name, lambda obj: msgpack.packb(obj, use_bin_type=True),
+                lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False))
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+    return name, lambda obj: encode(obj).encode('utf-8'), json.loads
+
+
+class RecipeArchiveWriter:
+    """配方归档写入器，配方必须按ID升序写入（iter_recipe_dicts 的顺序）"""
+    
+    def __init__(self, file_path: str, block_size: int = DEFAULT_BLOCK_SIZE, codec: str = 'auto',
+                 serializer: str = 'auto', level: Optional[int] = None):
+        self.file_path = file_path
+        self.block_size = max(1, block_size)
+        self.codec, self._compress, _ = _codec(codec, level)
+        self.serializer, self._dumps, _ = _serializer(serializer)
+        self.recipe_ids: List[int] = []
+        self._blocks: List[Tuple[int, int]] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._materials: Optional[Tuple[int, int]] = None
+        
+        self._file: IO[bytes] = open(file_path, 'wb')
+        header = json.dumps({
+            'metadata': {
+                'export_date': datetime.now().isoformat(),
+                'tool_version': '2.0.0',
+                'format': ARCHIVE_FORMAT,
+                'format_version': ARCHIVE_FORMAT_VERSION,
+                'codec': self.codec,
+                'serializer': self.serializer,
+                'block_size': self.block_size
+            }
+        }, ensure_ascii=False).encode('utf-8')
+        self._file.write(HEADER_STRUCT.pack(ARCHIVE_MAGIC, len(header)))
+        self._file.write(header)
+    
+    def write_materials(self, materials: Iterable[Any]) -> None:
+        """写入材料表（行为字典或按 ARCHIVE_MATERIAL_FIELDS 顺序的元组）"""
+        columns: Dict[str, List[Any]] = {name: [] for name in ARCHIVE_MATERIAL_FIELDS}
+        for material in materials:
+            values = ([material.get(name) for name in ARCHIVE_MATERIAL_FIELDS]
+                      if isinstance(material, dict) else material)
+            for name, value in zip(ARCHIVE_MATERIAL_FIELDS, values):
+                columns[name].append(value)
+        self._materials = self._write_block(columns)
+    
+    def write_recipe(self, recipe: Dict[str, Any]) -> None:
+        """追加一个配方（含组成，可含 version_history），组成通过 material_id 引用材料表"""
+        recipe_id = recipe['id']
+        if self.recipe_ids and recipe_id <= self.recipe_ids[-1]:
+            raise ValueError(f"配方必须按ID升序写入: {recipe_id}")
+        self.recipe_ids.append(recipe_id)
+        self._pending.append(recipe)
+        if len(self._pending) >= self.block_size:
+            self._flush()
+    
+    def close(self) -> int:
+        """写出剩余的配方、索引和尾部，返回配方数"""
+        if self._materials is None:
+            self.write_materials([])
+        self._flush()
+        index_offset, index_length = self._write_block({
+            'materials': list(self._materials),
+            'blocks': [list(block) for block in self._blocks],
+            'recipe_ids': self.recipe_ids
+        })
+        self._file.write(TRAILER_STRUCT.pack(index_offset, index_length, ARCHIVE_MAGIC))
+        self._file.close()
+        return len(self.recipe_ids)
+    
+    def __enter__(self) -> 'RecipeArchiveWriter':
+        return self
+    
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+    
+    def _write_block(self, payload: Any) -> Tuple[int, int]:
+        """序列化并压缩写出一个块，返回 (位置, 长度)"""
+        data = self._compress(self._dumps(payload))
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+    
+    def _flush(self) -> None:
+        """把缓存的配方按列写成一个块"""
+        if not self._pending:
+            return
+        recipes = {name: [recipe.get(name) for recipe in self._pending] for name in ARCHIVE_RECIPE_FIELDS}
+        compositions: Dict[str, List[Any]] = {name: [] for name in ['count'] + ARCHIVE_COMPOSITION_FIELDS}
+        history: Dict[str, List[Any]] = {name: [] for name in ['count'] + VERSION_HISTORY_FIELDS}
+        for recipe in self._pending:
+            comps = recipe.get('compositions') or []
+            compositions['count'].append(len(comps))
+            for name in ARCHIVE_COMPOSITION_FIELDS:
+                compositions[name].extend(comp.get(name) for comp in comps)
+            entries = recipe.get('version_history') or []
+            history['count'].append(len(entries))
+            for name in VERSION_HISTORY_FIELDS:
+                history[name].extend(entry.get(name) for entry in entries)
+        
+        self._blocks.append(self._write_block({
+            'recipes': recipes,
+            'compositions': compositions,
+            'version_history': history
+        }))
+        self._pending = []
+
+
+class RecipeArchive:
+    """配方归档读取器：打开时只读取元数据和索引，按配方ID读取时只解压所在的块"""
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file: IO[bytes] = open(file_path, 'rb')
+        try:
+            magic, header_length = HEADER_STRUCT.unpack(self._file.read(HEADER_STRUCT.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError("不是配方归档文件")
+            self.metadata: Dict[str, Any] = json.loads(self._file.read(header_length))['metadata']
+            major = str(self.metadata.get('format_version', '')).split('.')[0]
+            if major != ARCHIVE_FORMAT_VERSION.split('.')[0]:
+                raise ValueError(f"不支持的配方归档格式版本: {self.metadata.get('format_version')}")
+            
+            _, _, self._decompress = _codec(self.metadata['codec'])
+            _, _, self._loads = _serializer(self.metadata['serializer'])
+            self.block_size: int = self.metadata['block_size']
+            
+            self._file.seek(-TRAILER_STRUCT.size, 2)
+            index_offset, index_length, magic = TRAILER_STRUCT.unpack(self._file.read(TRAILER_STRUCT.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError("配方归档文件不完整")
+            index = self._read_block(index_offset, index_length)
+        except Exception:
+            self._file.close()
+            raise
+        
+        self.recipe_ids: List[int] = index['recipe_ids']
+        self._blocks: List[List[int]] = index['blocks']
+        self._materials_location: List[int] = index['materials']
+        self._materials: Optional[Dict[int, Tuple[Any, ...]]] = None
+        self._cached_block: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+    
+    def __len__(self) -> int:
+        return len(self.recipe_ids)
+    
+    def __contains__(self, recipe_id: int) -> bool:
+        return self._position(recipe_id) is not None
+    
+    def __enter__(self) -> 'RecipeArchive':
+        return self
+    
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        """关闭文件"""
+        self._file.close()
+    
+    def materials(self) -> List[Dict[str, Any]]:
+        """归档中的材料表"""
+        return [dict(zip(ARCHIVE_MATERIAL_FIELDS, (material_id,) + values))
+                for material_id, values in self._material_table().items()]
+    
+    def get(self, recipe_id: int) -> Optional[Dict[str, Any]]:
+        """按配方ID读取配方（与 iter_recipe_dicts 的字典结构相同），不存在时返回 None"""
+        position = self._position(recipe_id)
+        if position is None:
+            return None
+        block_number, offset = divmod(position, self.block_size)
+        if self._cached_block is None or self._cached_block[0] != block_number:
+            self._cached_block = (block_number, self._decode_block(block_number))
+        return self._cached_block[1][offset]
+    
+    def iter_recipes(self) -> Iterator[Dict[str, Any]]:
+        """按配方ID顺序逐块读取全部配方"""
+        for block_number in range(len(self._blocks)):
+            yield from self._decode_block(block_number)
+    
+    def _position(self, recipe_id: int) -> Optional[int]:
+        """配方在归档中的序号"""
+        position = bisect.bisect_left(self.recipe_ids, recipe_id)
+        if position < len(self.recipe_ids) and self.recipe_ids[position] == recipe_id:
+            return position
+        return None
+    
+    def _read_block(self, offset: int, length: int) -> Any:
+        """读取、解压并反序列化一个块"""
+        self._file.seek(offset)
+        return self._loads(self._decompress(self._file.read(length)))
+    
+    def _material_table(self) -> Dict[int, Tuple[Any, ...]]:
+        """{材料ID: (名称, 分类, 单价, 密度)}，首次使用时读取"""
+        if self._materials is None:
+            columns = self._read_block(*self._materials_location)
+            self._materials = {row[0]: tuple(row[1:])
+                               for row in zip(*(columns[name] for name in ARCHIVE_MATERIAL_FIELDS))}
+        return self._materials
+    
+    def _decode_block(self, block_number: int) -> List[Dict[str, Any]]:
+        """把一个列式块还原为配方字典列表"""
+        block = self._read_block(*self._blocks[block_number])
+        materials = self._material_table()
+        unknown = (None, None, None, None)
+        
+        recipes = [dict(zip(ARCHIVE_RECIPE_FIELDS, values))
+                   for values in zip(*(block['recipes'][name] for name in ARCHIVE_RECIPE_FIELDS))]
+        compositions = zip(*(block['compositions'][name] for name in ARCHIVE_COMPOSITION_FIELDS))
+        history = block['version_history']
+        history_rows = zip(*(history[name] for name in VERSION_HISTORY_FIELDS))
+        for recipe, composition_count, history_count in zip(recipes, block['compositions']['count'],
+                                                            history['count']):
+            recipe['compositions'] = []
+            for material_id, percentage, weight_grams in itertools.islice(compositions, composition_count):
+                name, category, price_per_ml, density = materials.get(material_id, unknown)
+                recipe['compositions'].append({
+                    'material_id': material_id,
+                    'material_name': name,
+                    'category': category,
+                    'percentage': percentage,
+                    'weight_grams': weight_grams,
+                    'price_per_ml': price_per_ml,
+                    'density': density
+                })
+            recipe['version_history'] = [dict(zip(VERSION_HISTORY_FIELDS, row))
+                                         for row in itertools.islice(history_rows, history_count)]
+        return recipes